@@ -0,0 +1,218 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Both services ship their code as a package named ``src``, so the helpers load
+each one under its own alias (``micro_one`` / ``micro_two``) to allow a single
+benchmark process to import from both.
+"""
+
+import gc
+import importlib
+import importlib.util
+import json
+import logging
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import structlog
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_service(name: str, alias: Optional[str] = None, root: Path = REPO_ROOT):
+    """
+    Import a service package under an importable alias
+
+    Args:
+        name: Service directory name, e.g. ``"micro-one"``
+        alias: Module name to load it as; a second alias gives an independent
+            copy, e.g. one imported with different environment settings
+        root: Tree holding the service directories, e.g. an exported revision
+
+    Returns:
+        The service's top-level package module
+    """
+    alias = alias or name.replace("-", "_")
+    if alias in sys.modules:
+        return sys.modules[alias]
+
+    package_dir = root / name / "src"
+    spec = importlib.util.spec_from_file_location(
+        alias,
+        package_dir / "__init__.py",
+        submodule_search_locations=[str(package_dir)],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[alias] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_from_service(
+    name: str, module: str, alias: Optional[str] = None, root: Path = REPO_ROOT
+):
+    """Import ``module`` (e.g. ``"services.message_service"``) from a service"""
+    package = load_service(name, alias, root).__name__
+    return importlib.import_module(f"{package}.{module}")
+
+
+def free_port() -> int:
+    """A local TCP port nothing is listening on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    """Poll ``url`` until it answers, failing early if ``process`` exits"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def quiet_logging() -> None:
+    """Drop service log output below WARNING so it does not skew timings"""
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING),
+        cache_logger_on_first_use=True,
+    )
+
+
+async def measure_cpu_us(call: Callable[[], Awaitable[Any]], calls: int) -> float:
+    """
+    CPU microseconds per awaited ``call()``
+
+    A few warm-up calls run first, and the garbage collector is paused while
+    timing so that a collection does not land in one variant's round only.
+    """
+    for _ in range(min(calls, 20)):
+        await call()
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.process_time()
+        for _ in range(calls):
+            await call()
+        elapsed = time.process_time() - started
+    finally:
+        gc.enable()
+    return elapsed / calls * 1e6
+
+
+async def measure_asgi_post(app, path: str, body: dict, requests: int) -> float:
+    """CPU microseconds per JSON POST, driving the ASGI app without a client"""
+    payload = json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    cost = await measure_cpu_us(lambda: app(dict(scope), receive, send), requests)
+    assert set(statuses) == {200}, statuses
+    return cost
+
+
+_WORDS = (
+    "order customer invoice shipment delivered pending status region warehouse "
+    "account payment refund total item quantity price discount north south east "
+    "west priority standard express note the a of to and for with on at by from"
+).split()
+
+
+def sample_text(size: int, seed: int = 0) -> str:
+    """
+    ``size`` characters of word-like text
+
+    Compresses roughly like real message text, unlike a repeated character.
+    """
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        if rng.random() < 0.1:
+            word = f"{word}-{rng.randrange(100000)}"
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    """Print benchmark rows as an aligned text table"""
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = {
+        column: max(len(column), *(len(_format(row[column])) for row in rows))
+        for column in columns
+    }
+    print("  ".join(column.ljust(widths[column]) for column in columns).rstrip())
+    for row in rows:
+        cells = (_format(row[column]).ljust(widths[column]) for column in columns)
+        print("  ".join(cells).rstrip())
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/max of latency samples given in seconds, in milliseconds"""
+    if not samples:
+        return {"p50_ms": 0.0, "p90_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples)
+
+    def percentile(fraction: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+        return ordered[index] * 1000
+
+    return {
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def write_json(path: str, payload: Dict[str, Any]) -> None:
+    """Write machine-readable benchmark results"""
+    with open(path, "w") as handle:
+        json.dump(payload, handle, indent=2)
+        handle.write("\n")
+
+
+def _format(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
@@ -0,0 +1,85 @@
+"""
+Size and CPU cost of compressing message payloads and state values.
+
+For each message size, encodes the JSON state record micro-two stores for a
+message (the text appears twice: as the message and inside the response) and
+reports per codec the compressed size and the CPU microseconds to compress and
+decompress it. Message text is word-like, so it compresses roughly like real
+text rather than like a repeated character.
+
+Usage:
+    python benchmarks/bench_compression.py [--sizes 1024 16384 131072 524288]
+"""
+
+import argparse
+import time
+
+from _common import import_from_service, print_table, sample_text, write_json
+
+compression = import_from_service("micro-two", "compression")
+serialization = import_from_service("micro-two", "serialization")
+
+
+def state_record(size: int) -> bytes:
+    text = sample_text(size)
+    return serialization.dumps(
+        {
+            "message_id": "3f2b6c1e-8d7a-4e55-9b0c-2a1d4e6f8a90",
+            "original_message": text,
+            "sender": "micro-one",
+            "processed_at": "2024-01-01T00:00:00.000000",
+            "response": f"Hello micro-one! I received your message: '{text}'. "
+            "Processed at 2024-01-01T00:00:00.000000",
+            "processor": "micro-two",
+        }
+    )
+
+
+def cpu_us(call, repeat: int) -> float:
+    """Best per-call CPU time of five rounds of ``repeat`` calls"""
+    best = float("inf")
+    for _ in range(5):
+        started = time.process_time()
+        for _ in range(repeat):
+            call()
+        best = min(best, (time.process_time() - started) / repeat)
+    return best * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1024, 16384, 131072, 524288]
+    )
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        plain = state_record(size)
+        repeat = max(1, 2_000_000 // len(plain))
+        for codec in compression.CODECS:
+            packed = compression.compress(plain, codec)
+            rows.append(
+                {
+                    "message_bytes": size,
+                    "codec": codec,
+                    "plain_bytes": len(plain),
+                    "compressed_bytes": len(packed),
+                    "ratio": len(plain) / len(packed),
+                    "compress_us": cpu_us(
+                        lambda: compression.compress(plain, codec), repeat
+                    ),
+                    "decompress_us": cpu_us(
+                        lambda: compression.decompress(packed, codec), repeat
+                    ),
+                }
+            )
+
+    print_table(rows)
+    if args.json:
+        write_json(args.json, {"benchmark": "compression", "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Dapr client calls over the gRPC API vs. the pooled HTTP API client.
+
+Starts the fake Dapr sidecar and micro-two as separate processes, then drives
+MessageService in this process with each transport:
+
+    grpc  the SDK's DaprGrpcClient, called on MessageService's thread pool
+    http  DaprHttpClient, awaited directly over kept-alive connections
+
+for each operation and number of calls in flight:
+
+    invoke     send_message -> sidecar -> micro-two /receive-message
+    get_state  a state read answered by the sidecar alone
+
+Reports throughput, latency percentiles and the CPU this process spent per
+call, which is where the two clients differ; the sidecar and micro-two do the
+same work either way.
+
+Usage:
+    python benchmarks/bench_dapr_transport.py [--calls 2000] [--concurrency 1 16 64]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from _common import (
+    REPO_ROOT,
+    free_port,
+    import_from_service,
+    print_table,
+    quiet_logging,
+    summarize_latencies,
+    wait_ready,
+    write_json,
+)
+
+message_service = import_from_service("micro-one", "services.message_service")
+dapr_http = import_from_service("micro-one", "dapr_http")
+MessageService = message_service.MessageService
+
+SIDECAR = REPO_ROOT / "benchmarks" / "fake_sidecar.py"
+
+
+def make_client(transport: str, grpc_port: int, http_port: int, args):
+    if transport == "http":
+        return dapr_http.DaprHttpClient(
+            f"http://127.0.0.1:{http_port}",
+            max_connections=args.max_connections,
+            max_keepalive_connections=args.max_connections,
+        )
+    from dapr.clients.grpc.client import DaprGrpcClient
+    from dapr.conf import settings
+
+    # The SDK client waits for the sidecar's HTTP health endpoint
+    settings.DAPR_HTTP_PORT = http_port
+    return DaprGrpcClient(f"127.0.0.1:{grpc_port}")
+
+
+async def run(service: MessageService, operation: str, calls: int, concurrency: int):
+    """Make ``calls`` calls with at most ``concurrency`` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def call(index: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            if operation == "invoke":
+                await service.send_message("micro-two", "benchmark", f"msg-{index}")
+            else:
+                await service._call_dapr("get_state", store_name="bench", key="key")
+            latencies.append(time.perf_counter() - started)
+
+    # Warm up connections and the executor before measuring
+    await asyncio.gather(*(call(i) for i in range(concurrency)))
+    latencies.clear()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    return calls / elapsed, cpu / calls * 1e6, latencies
+
+
+async def measure(transport: str, ports, args) -> List[dict]:
+    client = make_client(transport, ports["grpc"], ports["sidecar"], args)
+    service = MessageService(client, max_workers=args.max_workers)
+    await service._call_dapr("save_state", store_name="bench", key="key", value=b"{}")
+    rows = []
+    try:
+        for operation in args.operations:
+            for concurrency in args.concurrency:
+                throughput, cpu_us, latencies = await run(
+                    service, operation, args.calls, concurrency
+                )
+                rows.append(
+                    {
+                        "transport": transport,
+                        "operation": operation,
+                        "in_flight": concurrency,
+                        "calls_per_s": throughput,
+                        "client_cpu_us": cpu_us,
+                        **summarize_latencies(latencies),
+                    }
+                )
+    finally:
+        service.close()
+        if transport == "http":
+            await client.aclose()
+        else:
+            client.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--operations", nargs="+", default=["invoke", "get_state"])
+    parser.add_argument("--transports", nargs="+", default=["grpc", "http"])
+    parser.add_argument(
+        "--max-workers", type=int, default=32, help="Threads for the gRPC client"
+    )
+    parser.add_argument(
+        "--max-connections", type=int, default=100, help="HTTP connection pool size"
+    )
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    quiet_logging()
+    ports = {name: free_port() for name in ("grpc", "sidecar", "two")}
+    env = dict(
+        os.environ,
+        DAPR_GRPC_PORT=str(ports["grpc"]),
+        DAPR_HTTP_PORT=str(ports["sidecar"]),
+        LOG_LEVEL="WARNING",
+        METRICS_ENABLED="false",
+    )
+    sidecar_cmd = [
+        sys.executable,
+        str(SIDECAR),
+        "--grpc-port",
+        str(ports["grpc"]),
+        "--http-port",
+        str(ports["sidecar"]),
+        "--app",
+        f"micro-two=http://127.0.0.1:{ports['two']}",
+    ]
+    app_cmd = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "src.main:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(ports["two"]),
+        "--log-level",
+        "warning",
+        "--no-access-log",
+    ]
+
+    rows = []
+    with tempfile.TemporaryFile() as log:
+        sidecar = subprocess.Popen(sidecar_cmd, stdout=log, stderr=log)
+        app = None
+        try:
+            wait_ready(f"http://127.0.0.1:{ports['sidecar']}/v1.0/healthz", sidecar)
+            app = subprocess.Popen(
+                app_cmd,
+                cwd=REPO_ROOT / "micro-two",
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=log,
+            )
+            wait_ready(f"http://127.0.0.1:{ports['two']}/healthz", app)
+            for transport in args.transports:
+                rows.extend(asyncio.run(measure(transport, ports, args)))
+        except RuntimeError:
+            log.seek(0)
+            sys.stderr.write(log.read().decode(errors="replace")[-4000:])
+            raise
+        finally:
+            for process in (app, sidecar):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+    print_table(rows)
+    if args.json:
+        write_json(args.json, {"benchmark": "dapr_transport", "results": rows})
+
+
+if __name__ == "__main__":
+    main()
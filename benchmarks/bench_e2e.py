@@ -0,0 +1,350 @@
+"""
+End-to-end throughput and latency of the send -> receive path.
+
+Starts the fake Dapr sidecar and both services as separate processes, drives
+HTTP load at one endpoint and reports throughput, p50/p90/p99 latency and CPU
+time per message of each process, per concurrency level:
+
+    send     micro-one /send-message -> sidecar -> micro-two /receive-message
+    receive  micro-two /receive-message on its own (MessageProcessor only)
+
+Sidecar latency and errors are injected with the ``--sidecar-*`` options, and
+service settings can be changed with ``--env NAME=VALUE``. ``--workers`` runs
+each app as several uvicorn worker processes, started by the uvicorn command
+line or, with ``--launcher serve``, by the services' production launcher
+(``python -m app.serve``). ``--invoke-protocol grpc`` makes
+micro-one send protobuf to micro-two's gRPC app callback server instead of
+JSON to its HTTP route.
+
+Usage:
+    python benchmarks/bench_e2e.py [--messages 2000] [--concurrency 1 16 64]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from _common import (
+    REPO_ROOT,
+    free_port,
+    print_table,
+    sample_text,
+    summarize_latencies,
+    wait_ready,
+    write_json,
+)
+
+SIDECAR = REPO_ROOT / "benchmarks" / "fake_sidecar.py"
+
+
+def _cpu_seconds(pid: int) -> Optional[float]:
+    """User and system CPU of a process and its direct children, from /proc"""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0
+    for stat in proc.glob("[0-9]*/stat"):
+        try:
+            # Fields after the parenthesised command name: state, ppid, ...
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(stat.parent.name) == pid or int(fields[1]) == pid:
+            total += int(fields[11]) + int(fields[12])
+    return total / ticks
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident memory so far of a process and its direct children"""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    total = 0
+    for status in proc.glob("[0-9]*/status"):
+        try:
+            fields = dict(
+                line.split(":", 1) for line in status.read_text().splitlines()
+            )
+        except (OSError, ValueError):
+            continue
+        if int(status.parent.name) == pid or int(fields["PPid"]) == pid:
+            total += int(fields.get("VmHWM", "0 kB").split()[0])
+    return total / 1024
+
+
+@contextmanager
+def running_stack(args: argparse.Namespace):
+    """
+    Run the sidecar, micro-two and micro-one for the duration of the block
+
+    Yields:
+        Mappings of ``sidecar``, ``micro-one`` and ``micro-two`` to their base
+        URLs and to their process ids
+    """
+    ports = {
+        name: free_port() for name in ("grpc", "sidecar", "one", "two", "two_grpc")
+    }
+    urls = {
+        "sidecar": f"http://127.0.0.1:{ports['sidecar']}",
+        "micro-one": f"http://127.0.0.1:{ports['one']}",
+        "micro-two": f"http://127.0.0.1:{ports['two']}",
+    }
+    env = dict(
+        os.environ,
+        DAPR_GRPC_PORT=str(ports["grpc"]),
+        DAPR_HTTP_PORT=str(ports["sidecar"]),
+        LOG_LEVEL="WARNING",
+    )
+    target = urls["micro-two"]
+    if args.invoke_protocol == "grpc":
+        target = f"grpc://127.0.0.1:{ports['two_grpc']}"
+        env.update(INVOKE_PROTOCOL="grpc", GRPC_APP_PORT=str(ports["two_grpc"]))
+    env.update(item.split("=", 1) for item in args.env)
+
+    sidecar_cmd = [
+        sys.executable,
+        str(SIDECAR),
+        "--grpc-port",
+        str(ports["grpc"]),
+        "--http-port",
+        str(ports["sidecar"]),
+        "--app",
+        f"micro-two={target}",
+        "--latency-ms",
+        str(args.sidecar_latency_ms),
+        "--jitter-ms",
+        str(args.sidecar_jitter_ms),
+        "--error-rate",
+        str(args.sidecar_error_rate),
+    ]
+
+    def app_cmd(port: int) -> List[str]:
+        if args.launcher == "serve":
+            return [sys.executable, "-m", "src.serve"]
+        return [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+            "--workers",
+            str(args.workers),
+        ]
+
+    processes: List[subprocess.Popen] = []
+    pids: Dict[str, int] = {}
+    with tempfile.TemporaryFile() as log:
+        try:
+            sidecar = subprocess.Popen(sidecar_cmd, stdout=log, stderr=log)
+            processes.append(sidecar)
+            pids["sidecar"] = sidecar.pid
+            wait_ready(f"{urls['sidecar']}/v1.0/healthz", sidecar)
+
+            for name, port in (
+                ("micro-two", ports["two"]),
+                ("micro-one", ports["one"]),
+            ):
+                app = subprocess.Popen(
+                    app_cmd(port),
+                    cwd=REPO_ROOT / name,
+                    env=dict(
+                        env,
+                        SERVER_HOST="127.0.0.1",
+                        SERVER_PORT=str(port),
+                        SERVER_WORKERS=str(args.workers),
+                    ),
+                    stdout=subprocess.DEVNULL,
+                    stderr=log,
+                )
+                processes.append(app)
+                pids[name] = app.pid
+                wait_ready(f"{urls[name]}/healthz", app)
+
+            yield urls, pids
+        except RuntimeError:
+            log.seek(0)
+            sys.stderr.write(log.read().decode(errors="replace")[-4000:])
+            raise
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+def _request_factory(target: str, size: int, duplicate_rate: float = 0.0):
+    text = sample_text(size)
+    rng = random.Random(0)
+    recent: List[str] = []
+    if target == "send":
+        body = json.dumps({"message": text, "recipient_id": "micro-two"}).encode()
+        return "micro-one", "/send-message", lambda: body
+
+    def receive_body() -> bytes:
+        # Redeliveries reuse one of the last 100 ids, like a retry after a timeout
+        if recent and rng.random() < duplicate_rate:
+            message_id = rng.choice(recent)
+        else:
+            message_id = str(uuid.uuid4())
+            recent.append(message_id)
+            del recent[:-100]
+        return json.dumps(
+            {
+                "message": text,
+                "message_id": message_id,
+                "sender": "bench",
+                "timestamp": "2024-01-01T00:00:00Z",
+            }
+        ).encode()
+
+    return "micro-two", "/receive-message", receive_body
+
+
+async def run_load(
+    url: str, make_body, messages: int, concurrency: int
+) -> Tuple[List[float], Dict[int, int], float]:
+    """
+    Post ``messages`` requests to ``url`` from ``concurrency`` workers
+
+    Returns:
+        Latencies of successful requests in seconds, status code counts and
+        elapsed wall time
+    """
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    pending = iter(range(messages))
+    headers = {"content-type": "application/json"}
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+
+        async def worker() -> None:
+            for _ in pending:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        url, content=make_body(), headers=headers
+                    )
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = 0
+                elapsed = time.perf_counter() - started
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, statuses, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", choices=("send", "receive"), default="send")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--size", type=int, default=256, help="Message bytes")
+    parser.add_argument("--workers", type=int, default=1, help="Processes per app")
+    parser.add_argument(
+        "--launcher",
+        choices=("uvicorn", "serve"),
+        default="uvicorn",
+        help="Start the apps with the uvicorn command or the production launcher",
+    )
+    parser.add_argument(
+        "--duplicate-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of receive requests repeating a recent message_id",
+    )
+    parser.add_argument("--invoke-protocol", choices=("http", "grpc"), default="http")
+    parser.add_argument("--sidecar-latency-ms", type=float, default=0.0)
+    parser.add_argument("--sidecar-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--sidecar-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        help="NAME=VALUE setting passed to both services",
+    )
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    service, path, make_body = _request_factory(
+        args.target, args.size, args.duplicate_rate
+    )
+    rows = []
+    with running_stack(args) as (urls, pids):
+        url = urls[service] + path
+        asyncio.run(run_load(url, make_body, args.warmup, max(args.concurrency)))
+
+        for concurrency in args.concurrency:
+            cpu_before = {name: _cpu_seconds(pid) for name, pid in pids.items()}
+            latencies, statuses, elapsed = asyncio.run(
+                run_load(url, make_body, args.messages, concurrency)
+            )
+            cpu_ms = {
+                f"cpu_ms_{name}": (
+                    (_cpu_seconds(pid) - cpu_before[name]) * 1000 / args.messages
+                    if cpu_before[name] is not None
+                    else None
+                )
+                for name, pid in pids.items()
+            }
+            rows.append(
+                {
+                    "target": args.target,
+                    "protocol": args.invoke_protocol,
+                    "concurrency": concurrency,
+                    "ok": len(latencies),
+                    "errors": args.messages - len(latencies),
+                    "throughput_rps": len(latencies) / elapsed,
+                    **summarize_latencies(latencies),
+                    **cpu_ms,
+                    "peak_rss_mb_micro-two": _peak_rss_mb(pids["micro-two"]),
+                }
+            )
+            rows[-1]["statuses"] = {str(k): v for k, v in sorted(statuses.items())}
+
+        sidecar_stats = httpx.get(f"{urls['sidecar']}/stats").json()
+
+    print_table([{k: v for k, v in row.items() if k != "statuses"} for row in rows])
+    if args.json:
+        write_json(
+            args.json,
+            {
+                "benchmark": "e2e",
+                "config": {
+                    key: value for key, value in vars(args).items() if key != "json"
+                },
+                "results": rows,
+                "sidecar": sidecar_stats,
+            },
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Latency of sending one message to several recipients with MessageService.
+
+Compares sending to each recipient in turn (as separate client requests would)
+with a concurrent fan-out waiting for every recipient, and with fan-outs that
+return after the first K recipients have the message. Each recipient answers
+after its own base latency plus exponential jitter, so some are consistently
+slower and every one of them occasionally is.
+
+Usage:
+    python benchmarks/bench_fanout.py [--latencies-ms 5 10 20 40 80] [--rounds 50]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from _common import (
+    import_from_service,
+    print_table,
+    quiet_logging,
+    summarize_latencies,
+    write_json,
+)
+
+message_service = import_from_service("micro-one", "services.message_service")
+MessageService = message_service.MessageService
+
+
+class FakeDaprClient:
+    """Async client answering each app after its latency plus random jitter"""
+
+    def __init__(self, latencies: dict, jitter: float):
+        self.latencies = latencies
+        self.jitter = jitter
+        self.rng = random.Random(0)
+
+    async def invoke_method(self, app_id, **kwargs):
+        delay = self.latencies[app_id] + self.rng.expovariate(1 / self.jitter)
+        await asyncio.sleep(delay)
+        return SimpleNamespace(data=b'{"status": "received"}')
+
+
+async def run(service: MessageService, recipients, mode: str, first_k, rounds: int):
+    samples = []
+    for round_index in range(rounds):
+        targets = [
+            {"recipient_service": name, "message_id": f"msg-{round_index}-{name}"}
+            for name in recipients
+        ]
+        started = time.perf_counter()
+        if mode == "sequential":
+            for target in targets:
+                await service.send_message(
+                    target["recipient_service"], "benchmark", target["message_id"]
+                )
+        else:
+            await service.send_fanout("benchmark", targets, first_k=first_k)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--latencies-ms", type=float, nargs="+", default=[5, 10, 20, 40, 80]
+    )
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    quiet_logging()
+    latencies = {f"recipient-{i}": ms / 1000 for i, ms in enumerate(args.latencies_ms)}
+    recipients = list(latencies)
+    modes = [("sequential", None), ("fanout", None)] + [
+        ("fanout", k) for k in (1, len(recipients) // 2 + 1) if k < len(recipients)
+    ]
+
+    rows = []
+    for mode, first_k in modes:
+        client = FakeDaprClient(latencies, args.jitter_ms / 1000)
+        service = MessageService(client)
+        samples = asyncio.run(run(service, recipients, mode, first_k, args.rounds))
+        service.close()
+        rows.append(
+            {
+                "mode": mode,
+                "recipients": len(recipients),
+                "first_k": first_k or len(recipients),
+                **summarize_latencies(samples),
+            }
+        )
+
+    print_table(rows)
+    if args.json:
+        write_json(args.json, {"benchmark": "fanout", "results": rows})
+
+
+if __name__ == "__main__":
+    main()
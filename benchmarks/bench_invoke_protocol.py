@@ -0,0 +1,193 @@
+"""
+CPU per message of JSON-over-HTTP vs. protobuf-over-gRPC service invocation.
+
+Runs both sides of one invocation in-process against an instant fake Dapr
+client, so the measured CPU is the services' own work. Transport I/O is left
+out on both sides; what remains is what differs between the protocols:
+
+    micro-one  MessageService.send_message: build the request, encode it as the
+               Dapr client would put it on the wire, decode the reply
+    micro-two  POST /receive-message through the ASGI app (routing, JSON body
+               parsing, Pydantic validation, JSON response) vs. the gRPC app
+               callback OnInvoke (protobuf decode, handler, protobuf encode)
+
+Short rounds alternate between the two protocols and the median round of each
+is reported, along with the request and reply sizes on the wire.
+
+Usage:
+    python benchmarks/bench_invoke_protocol.py [--requests 100] [--rounds 100]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+
+from _common import (
+    import_from_service,
+    measure_asgi_post,
+    measure_cpu_us,
+    print_table,
+    quiet_logging,
+    write_json,
+)
+from google.protobuf import any_pb2
+
+from dapr.clients.grpc._response import InvokeMethodResponse
+from dapr.proto import common_v1
+
+
+class InstantDaprClient:
+    """Async Dapr client whose calls complete immediately"""
+
+    def __init__(self, reply: InvokeMethodResponse):
+        self.reply = reply
+        self.request_bytes = 0
+
+    async def invoke_method(
+        self, app_id, method_name, data, content_type=None, http_verb=None
+    ):
+        # Encode the request the way DaprGrpcClient.invoke_method does
+        payload = any_pb2.Any()
+        if isinstance(data, bytes):
+            payload.value = data
+        else:
+            payload.Pack(data)
+        request = common_v1.InvokeRequest(
+            method=method_name, data=payload, content_type=content_type or ""
+        )
+        if http_verb:
+            request.http_extension.verb = common_v1.HTTPExtension.Verb.Value(http_verb)
+        self.request_bytes = len(request.SerializeToString())
+        return self.reply
+
+    async def save_state(self, **kwargs):
+        return None
+
+
+def sender_variants(reply_fields):
+    """micro-one MessageService per protocol, with a matching canned reply"""
+    service_module = import_from_service("micro-one", "services.message_service")
+    messages_pb2 = import_from_service("micro-one", "protos.messages_pb2")
+
+    json_reply = InvokeMethodResponse(data=json.dumps(reply_fields).encode())
+    proto_reply = InvokeMethodResponse()
+    proto_reply.set_data(messages_pb2.MessageResponse(**reply_fields))
+
+    return {
+        protocol: service_module.MessageService(
+            InstantDaprClient(reply), invoke_protocol=protocol
+        )
+        for protocol, reply in (("http", json_reply), ("grpc", proto_reply))
+    }
+
+
+def receiver(message: dict):
+    """micro-two's main module and a wire-encoded gRPC invocation"""
+    os.environ["METRICS_ENABLED"] = "false"
+    main = import_from_service("micro-two", "main")
+    grpc_server = import_from_service("micro-two", "grpc_server")
+    main.message_processor = main.MessageProcessor(InstantDaprClient(None))
+
+    data = any_pb2.Any()
+    data.Pack(main.messages_pb2.IncomingMessage(**message))
+    request = common_v1.InvokeRequest(
+        method="receive-message", data=data
+    ).SerializeToString()
+    servicer = grpc_server._AppCallbackServicer(main._receive_grpc_message, None)
+    sizes = {}
+
+    async def on_invoke():
+        # Decode and encode as the gRPC server does around the servicer
+        response = await servicer.OnInvoke(
+            common_v1.InvokeRequest.FromString(request), None
+        )
+        sizes["reply"] = len(response.SerializeToString())
+
+    return main.app, on_invoke, len(request), sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=100, help="Per round")
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--size", type=int, default=256, help="Message bytes")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.environ["LOG_LEVEL"] = "WARNING"
+    message = {
+        "message": "x" * args.size,
+        "message_id": "3f2b6c1e-8d7a-4e55-9b0c-2a1d4e6f8a90",
+        "sender": "micro-one",
+        "timestamp": "2024-01-01T00:00:00Z",
+    }
+    reply_fields = {
+        "status": "received",
+        "message_id": message["message_id"],
+        "processed_at": "2024-01-01T00:00:00.000000",
+        "response_message": "Hello micro-one! I received your message: "
+        f"'{message['message']}'. Processed at 2024-01-01T00:00:00.000000",
+    }
+
+    senders = sender_variants(reply_fields)
+    app, on_invoke, grpc_request_bytes, grpc_sizes = receiver(message)
+    quiet_logging()
+
+    async def send(protocol):
+        return await senders[protocol].send_message(
+            "micro-two", message["message"], message["message_id"]
+        )
+
+    measurements = {
+        ("micro-one", "http"): lambda: measure_cpu_us(
+            lambda: send("http"), args.requests
+        ),
+        ("micro-one", "grpc"): lambda: measure_cpu_us(
+            lambda: send("grpc"), args.requests
+        ),
+        ("micro-two", "http"): lambda: measure_asgi_post(
+            app, "/receive-message", message, args.requests
+        ),
+        ("micro-two", "grpc"): lambda: measure_cpu_us(on_invoke, args.requests),
+    }
+    costs = {key: [] for key in measurements}
+    for _ in range(args.rounds):
+        for key, measure in measurements.items():
+            costs[key].append(asyncio.run(measure()))
+
+    http_reply = len(json.dumps(reply_fields).encode())
+    sizes = {
+        "http": (senders["http"].dapr_client.request_bytes, http_reply),
+        "grpc": (grpc_request_bytes, grpc_sizes["reply"]),
+    }
+    rows = []
+    for service in ("micro-one", "micro-two"):
+        http = statistics.median(costs[(service, "http")])
+        grpc = statistics.median(costs[(service, "grpc")])
+        rows.append(
+            {
+                "service": service,
+                "http_us": http,
+                "grpc_us": grpc,
+                "saved_pct": (http - grpc) / http * 100,
+            }
+        )
+    wire = [
+        {"protocol": protocol, "request_bytes": request, "reply_bytes": reply}
+        for protocol, (request, reply) in sizes.items()
+    ]
+
+    print_table(rows)
+    print()
+    print_table(wire)
+    if args.json:
+        write_json(
+            args.json,
+            {"benchmark": "invoke_protocol", "results": rows, "wire": wire},
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Per-request cost of the metrics instrumentation.
+
+Loads each service twice, with METRICS_ENABLED on and off, and drives its hot
+endpoint in-process against an instant fake Dapr client, so the measured CPU is
+the service's own work. Short rounds alternate between the two copies so that
+CPU frequency drift affects both equally; the median round of each is compared:
+
+    micro-one  POST /send-message
+    micro-two  POST /receive-message
+
+It also reports the cost of the individual metric operations.
+
+Usage:
+    python benchmarks/bench_metrics.py [--requests 100] [--rounds 200]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from types import SimpleNamespace
+
+from _common import (
+    import_from_service,
+    measure_asgi_post,
+    print_table,
+    quiet_logging,
+    write_json,
+)
+
+
+class InstantDaprClient:
+    """Async Dapr client whose calls complete immediately"""
+
+    async def invoke_method(self, **kwargs):
+        return SimpleNamespace(data=b'{"status": "received"}')
+
+    async def save_state(self, **kwargs):
+        return None
+
+
+def load_variant(service: str, enabled: bool):
+    """Import a service's main module with metrics switched on or off"""
+    os.environ["METRICS_ENABLED"] = "true" if enabled else "false"
+    alias = f"{service.replace('-', '_')}_{'metrics' if enabled else 'plain'}"
+    main = import_from_service(service, "main", alias=alias)
+    client = InstantDaprClient()
+
+    if service == "micro-one":
+        main.message_service = main.MessageService(client, metrics=main.metrics)
+        path = "/send-message"
+        body = {"message": "x" * 256, "recipient_id": "micro-two"}
+    else:
+        main.message_processor = main.MessageProcessor(client, metrics=main.metrics)
+        path = "/receive-message"
+        body = {
+            "message": "x" * 256,
+            "message_id": "bench",
+            "sender": "micro-one",
+            "timestamp": "2024-01-01T00:00:00Z",
+        }
+    return main.app, path, body
+
+
+def operation_costs(iterations: int):
+    """Nanoseconds per metric operation"""
+    metrics_module = import_from_service(
+        "micro-two", "metrics", alias="micro_two_metrics"
+    )
+    metrics = metrics_module.ServiceMetrics()
+    child = metrics.stage_seconds.labels("store_state")
+    counter = metrics.messages_total.labels("invoke")
+
+    operations = {
+        "histogram child observe": lambda: child.observe(0.0004),
+        "stage() by name": lambda: metrics.stage("store_state", 0.0004),
+        "counter labels().inc": lambda: metrics.messages_total.labels("invoke").inc(),
+        "counter child inc": counter.inc,
+        "perf_counter pair": lambda: time.perf_counter() - time.perf_counter(),
+    }
+    rows = []
+    for name, operation in operations.items():
+        started = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        elapsed = time.perf_counter() - started
+        rows.append({"operation": name, "ns_per_op": elapsed / iterations * 1e9})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=100, help="Per round")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    os.environ["LOG_LEVEL"] = "WARNING"
+    rows = []
+    for service in ("micro-one", "micro-two"):
+        variants = {
+            enabled: load_variant(service, enabled) for enabled in (False, True)
+        }
+        quiet_logging()
+        costs = {False: [], True: []}
+        for _ in range(args.rounds):
+            for enabled, (app, path, body) in variants.items():
+                costs[enabled].append(
+                    asyncio.run(measure_asgi_post(app, path, body, args.requests))
+                )
+        median = {enabled: statistics.median(costs[enabled]) for enabled in costs}
+
+        rows.append(
+            {
+                "service": service,
+                "disabled_us": median[False],
+                "enabled_us": median[True],
+                "overhead_us": median[True] - median[False],
+                "overhead_pct": (median[True] - median[False]) / median[False] * 100,
+            }
+        )
+
+    operations = operation_costs(args.iterations)
+    print_table(rows)
+    print()
+    print_table(operations)
+    if args.json:
+        write_json(
+            args.json,
+            {"benchmark": "metrics", "results": rows, "operations": operations},
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Cost of accepting a send into the micro-one outbox, and how fast it drains.
+
+Compares the time to acknowledge a send delivered directly by
+MessageService.send_message (against a blocking fake Dapr client with a fixed
+per-call latency) with the time to log it to the outbox, with and without an
+fsync per send. Then logs sends while the recipient is unreachable, stops the
+outbox, and measures a fresh outbox recovering them from the log and
+delivering them through MessageService with each number of workers.
+
+Usage:
+    python benchmarks/bench_outbox.py [--latency-ms 5] [--messages 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from _common import (
+    import_from_service,
+    print_table,
+    quiet_logging,
+    summarize_latencies,
+    write_json,
+)
+
+message_service = import_from_service("micro-one", "services.message_service")
+outbox_module = import_from_service("micro-one", "services.outbox")
+MessageService = message_service.MessageService
+Outbox = outbox_module.Outbox
+
+
+class FakeDaprClient:
+    """Blocking client that sleeps for ``latency`` seconds per invocation"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke_method(self, **kwargs):
+        time.sleep(self.latency)
+        return SimpleNamespace(data=b'{"status": "received"}')
+
+
+async def unreachable(entry):
+    raise ConnectionError("sidecar unavailable")
+
+
+async def accept_direct(latency: float, messages: int):
+    service = MessageService(FakeDaprClient(latency))
+    samples = []
+    for i in range(messages):
+        started = time.perf_counter()
+        await service.send_message("micro-two", "benchmark", f"msg-{i}")
+        samples.append(time.perf_counter() - started)
+    service.close()
+    return samples
+
+
+async def accept_outbox(path: str, messages: int, fsync: bool):
+    """Log ``messages`` sends while none can be delivered, then stop"""
+    outbox = Outbox(path, unreachable, concurrency=1, fsync=fsync)
+    await outbox.start()
+    samples = []
+    for i in range(messages):
+        started = time.perf_counter()
+        await outbox.add(f"msg-{i}", "micro-two", "benchmark")
+        samples.append(time.perf_counter() - started)
+    await outbox.close()
+    return samples
+
+
+async def drain(path: str, latency: float, concurrency: int):
+    """Recover the log at ``path`` and deliver everything in it"""
+    service = MessageService(FakeDaprClient(latency), max_workers=concurrency)
+    outbox = Outbox(
+        path,
+        lambda entry: service.send_message(
+            entry["recipient_service"], entry["message"], entry["message_id"]
+        ),
+        concurrency=concurrency,
+    )
+    started = time.perf_counter()
+    await outbox.start()
+    recovered = time.perf_counter() - started
+    while len(outbox):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    await outbox.close()
+    service.close()
+    return outbox.stats()["recovered"], recovered, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    quiet_logging()
+    latency = args.latency_ms / 1000
+    accept_rows = [
+        {
+            "mode": "direct",
+            **summarize_latencies(
+                asyncio.run(accept_direct(latency, args.messages // 10))
+            ),
+        }
+    ]
+    drain_rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for fsync in (False, True):
+            path = os.path.join(directory, f"accept-{fsync}.log")
+            samples = asyncio.run(accept_outbox(path, args.messages, fsync))
+            accept_rows.append(
+                {
+                    "mode": "outbox+fsync" if fsync else "outbox",
+                    **summarize_latencies(samples),
+                }
+            )
+
+        for concurrency in args.concurrency:
+            path = os.path.join(directory, f"drain-{concurrency}.log")
+            asyncio.run(accept_outbox(path, args.messages, fsync=False))
+            size = os.path.getsize(path)
+            recovered, recovery_s, elapsed = asyncio.run(
+                drain(path, latency, concurrency)
+            )
+            drain_rows.append(
+                {
+                    "workers": concurrency,
+                    "messages": recovered,
+                    "log_bytes": size,
+                    "recovery_ms": recovery_s * 1000,
+                    "msgs_per_s": recovered / elapsed,
+                }
+            )
+
+    print_table(accept_rows)
+    print()
+    print_table(drain_rows)
+    if args.json:
+        write_json(
+            args.json,
+            {"benchmark": "outbox", "accept": accept_rows, "drain": drain_rows},
+        )
+
+
+if __name__ == "__main__":
+    main()
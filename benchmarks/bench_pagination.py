@@ -0,0 +1,101 @@
+"""
+Offset vs. cursor paging and export memory for micro-two's MessageStore.
+
+Fills a store and reports the time to read one page at increasing depths with
+``page(offset=...)`` and ``after(cursor=...)``, then the peak memory allocated
+while exporting every record as NDJSON in one list vs. batch by batch as
+GET /messages/export does.
+
+Usage:
+    python benchmarks/bench_pagination.py [--records 100000] [--limit 100]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from _common import import_from_service, print_table, quiet_logging, write_json
+
+quiet_logging()
+message_store = import_from_service("micro-two", "services.message_store")
+serialization = import_from_service("micro-two", "serialization")
+
+
+def fill(records: int):
+    store = message_store.MessageStore(max_messages=0, max_bytes=0)
+    for i in range(records):
+        store.add(
+            {
+                "message_id": f"msg-{i}",
+                "sender": "micro-one",
+                "message": "x" * 256,
+                "received_at": "2024-01-01T00:00:00",
+                "processed": True,
+                "response": "ok",
+            }
+        )
+    return store
+
+
+def per_call_us(call, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def export_peak_kib(store, batched: bool) -> float:
+    dumps = serialization.dumps
+    tracemalloc.start()
+    if batched:
+        cursor = 0
+        while batch := store.after(cursor, 100):
+            cursor = batch[-1]["seq"]
+            b"".join(dumps(record) + b"\n" for record in batch)
+    else:
+        b"".join(dumps(record) + b"\n" for record in store.page(0, len(store)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    store = fill(args.records)
+    rows = []
+    for fraction in (0.0, 0.25, 0.5, 0.9):
+        depth = int(args.records * fraction)
+        cursor = store.page(depth, 1)[0]["seq"] - 1
+        offset_us = per_call_us(lambda: store.page(offset=depth, limit=args.limit))
+        cursor_us = per_call_us(lambda: store.after(cursor=cursor, limit=args.limit))
+        rows.append(
+            {
+                "depth": depth,
+                "offset_us": offset_us,
+                "cursor_us": cursor_us,
+                "speedup": offset_us / cursor_us,
+            }
+        )
+
+    export = [
+        {"export": "single list", "peak_kib": export_peak_kib(store, batched=False)},
+        {"export": "batched", "peak_kib": export_peak_kib(store, batched=True)},
+    ]
+
+    print_table(rows)
+    print()
+    print_table(export)
+    if args.json:
+        write_json(
+            args.json,
+            {"benchmark": "pagination", "results": rows, "export": export},
+        )
+
+
+if __name__ == "__main__":
+    main()
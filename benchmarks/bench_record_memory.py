@@ -0,0 +1,115 @@
+"""
+Memory held per stored message record, dict versus compact layout.
+
+For each message size, builds ``--records`` records the way micro-two's
+receive path does (fields parsed from a JSON body, so each sender string is a
+separate object) and reports the bytes each record holds, measured with
+tracemalloc, in the original dict layout (without ``processed_at``) and as a
+MessageRecord. The CPU cost of turning a MessageRecord back into a dict, which
+rebuilds its response, is reported as ``read_us``.
+
+Usage:
+    python benchmarks/bench_record_memory.py [--sizes 64 256 1024 4096]
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from _common import import_from_service, print_table, sample_text, write_json
+
+message_processor = import_from_service("micro-two", "services.message_processor")
+message_record = import_from_service("micro-two", "services.message_record")
+
+MessageProcessor = message_processor.MessageProcessor
+MessageRecord = message_record.MessageRecord
+
+
+def request_bodies(size: int, count: int) -> list:
+    text = sample_text(size)
+    start = datetime(2024, 1, 1)
+    return [
+        json.dumps(
+            {
+                "message_id": f"{i:08x}-8d7a-4e55-9b0c-2a1d4e6f8a90",
+                "sender": "micro-one",
+                "message": text,
+                "received_at": (start + timedelta(microseconds=i)).isoformat(),
+                "processed_at": (start + timedelta(microseconds=i + 7)).isoformat(),
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def dict_record(body: str) -> dict:
+    """The record dict the receive path stores, response included"""
+    fields = json.loads(body)
+    fields["processed"] = True
+    fields["response"] = MessageProcessor.response_text(
+        fields["sender"], fields["message"], fields["processed_at"]
+    )
+    return fields
+
+
+def old_dict_record(body: str) -> dict:
+    """The record dict as stored before it carried processed_at"""
+    fields = dict_record(body)
+    del fields["processed_at"]
+    return fields
+
+
+def bytes_per_record(build, bodies: list) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [build(body) for body in bodies]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del records
+    return held / len(bodies)
+
+
+def read_us(records: list) -> float:
+    started = time.process_time()
+    for record in records:
+        record.to_dict()
+    return (time.process_time() - started) / len(records) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 256, 1024, 4096])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        bodies = request_bodies(size, args.records)
+        old = bytes_per_record(old_dict_record, bodies)
+        new = bytes_per_record(
+            lambda body: MessageRecord.from_dict(dict_record(body)), bodies
+        )
+        compact = [MessageRecord.from_dict(dict_record(body)) for body in bodies]
+        rows.append(
+            {
+                "message_bytes": size,
+                "dict_bytes": round(old),
+                "compact_bytes": round(new),
+                "saved": 1 - new / old,
+                "estimated_bytes": compact[0].size(),
+                "read_us": read_us(compact),
+            }
+        )
+
+    print_table(rows)
+    if args.json:
+        write_json(args.json, {"benchmark": "record_memory", "results": rows})
+
+
+if __name__ == "__main__":
+    main()
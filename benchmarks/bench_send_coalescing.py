@@ -0,0 +1,110 @@
+"""
+Throughput and latency of MessageService.send_message with send coalescing.
+
+Drives send_message against a blocking fake Dapr client with a fixed per-call
+latency, as in bench_send_concurrency.py, for each coalescing window and
+number of in-flight sends. The client answers batched calls with a result per
+message, so a call costs the same however many messages it carries; calls are
+limited by the executor's threads as with the real client.
+
+Usage:
+    python benchmarks/bench_send_coalescing.py [--latency-ms 5] [--windows-ms 0 1 5]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from _common import (
+    import_from_service,
+    print_table,
+    quiet_logging,
+    summarize_latencies,
+    write_json,
+)
+
+message_service = import_from_service("micro-one", "services.message_service")
+MessageService = message_service.MessageService
+
+
+class FakeDaprClient:
+    """Blocking client that sleeps for ``latency`` seconds per invocation"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def invoke_method(self, **kwargs):
+        time.sleep(self.latency)
+        self.calls += 1
+        messages = json.loads(kwargs["data"]).get("messages")
+        if messages is None:
+            return SimpleNamespace(data=b'{"status": "received"}')
+        results = [
+            {"status": "received", "message_id": message["message_id"]}
+            for message in messages
+        ]
+        return SimpleNamespace(data=json.dumps({"results": results}).encode())
+
+
+async def run(service: MessageService, messages: int, concurrency: int):
+    """Send ``messages`` with at most ``concurrency`` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def send(index: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await service.send_message("micro-two", "benchmark", f"msg-{index}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(messages)))
+    return messages / (time.perf_counter() - started), latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--messages", type=int, default=4000)
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--windows-ms", type=float, nargs="+", default=[0.0, 1.0, 5.0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    quiet_logging()
+    rows = []
+    for window_ms in args.windows_ms:
+        for concurrency in args.concurrency:
+            client = FakeDaprClient(args.latency_ms / 1000)
+            service = MessageService(
+                client,
+                max_workers=args.max_workers,
+                coalesce_window=window_ms / 1000,
+                coalesce_max_batch=args.max_batch,
+            )
+            throughput, latencies = asyncio.run(
+                run(service, args.messages, concurrency)
+            )
+            service.close()
+            rows.append(
+                {
+                    "window_ms": window_ms,
+                    "in_flight": concurrency,
+                    "msgs_per_s": throughput,
+                    "msgs_per_call": args.messages / client.calls,
+                    **summarize_latencies(latencies),
+                }
+            )
+
+    print_table(rows)
+    if args.json:
+        write_json(args.json, {"benchmark": "send_coalescing", "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Concurrency benchmark for MessageService.send_message.
+
+Drives send_message against a blocking fake Dapr client with a fixed per-call
+latency and reports throughput for increasing numbers of in-flight sends. The
+"blocking" rows call the client directly on the event loop, as the service did
+before invocations were moved onto the executor.
+
+Usage:
+    python benchmarks/bench_send_concurrency.py [--latency-ms 20] [--messages 256]
+"""
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from _common import import_from_service, print_table, quiet_logging, write_json
+
+message_service = import_from_service("micro-one", "services.message_service")
+MessageService = message_service.MessageService
+
+
+class FakeDaprClient:
+    """Blocking client that sleeps for ``latency`` seconds per invocation"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke_method(self, **kwargs):
+        time.sleep(self.latency)
+        return SimpleNamespace(data=b'{"status": "received"}')
+
+
+class BlockingMessageService(MessageService):
+    """Calls the client inline on the event loop (the pre-executor behaviour)"""
+
+    async def _call_dapr(self, client_method, /, **kwargs):
+        return getattr(self.dapr_client, client_method)(**kwargs)
+
+
+async def run(service: MessageService, messages: int, concurrency: int) -> float:
+    """Send ``messages`` with at most ``concurrency`` in flight; return msgs/s"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(index: int) -> None:
+        async with semaphore:
+            await service.send_message("micro-two", "benchmark", f"msg-{index}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(messages)))
+    return messages / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--messages", type=int, default=256)
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32]
+    )
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    quiet_logging()
+    client = FakeDaprClient(args.latency_ms / 1000)
+    rows = []
+    for name, service_cls in (
+        ("blocking", BlockingMessageService),
+        ("executor", MessageService),
+    ):
+        for concurrency in args.concurrency:
+            service = service_cls(client, max_workers=args.max_workers)
+            throughput = asyncio.run(run(service, args.messages, concurrency))
+            service.close()
+            rows.append(
+                {
+                    "mode": name,
+                    "in_flight": concurrency,
+                    "msgs_per_s": throughput,
+                }
+            )
+
+    print_table(rows)
+    if args.json:
+        write_json(args.json, {"benchmark": "send_concurrency", "results": rows})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Serialization CPU per request, before and after the serialization layer.
+
+Exports both services at two git revisions: by default, the commit that added
+the ``serialization`` module and its parent. It then drives each revision's own
+handlers through its ASGI app, with a fake Dapr client answering at once, and
+reports CPU microseconds per request:
+
+    micro-one  POST /send-message     (encodes the invocation, parses the reply)
+    micro-two  POST /receive-message  (encodes the state record)
+
+The two revisions differ only in how JSON is encoded and rendered, so the
+difference is the cost the serialization layer removes. Pass other revisions
+with ``--before`` and ``--after``, e.g. ``--after HEAD``. Later revisions carry
+later features too.
+
+It also reports the cost of parsing a request body with ``json.loads`` and then
+validating the dict, against pydantic validating the JSON bytes directly.
+
+Usage:
+    python benchmarks/bench_serialization.py [--requests 2000] [--size 256]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import subprocess
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from _common import (
+    REPO_ROOT,
+    import_from_service,
+    measure_asgi_post,
+    print_table,
+    quiet_logging,
+    write_json,
+)
+
+
+class FakeDaprClient:
+    """Answers invocations and state writes at once"""
+
+    def __init__(self, reply: bytes = b""):
+        self.reply = reply
+
+    def invoke_method(self, **kwargs):
+        return SimpleNamespace(
+            data=self.reply, content_type="application/json", headers={}
+        )
+
+    def save_state(self, **kwargs):
+        return None
+
+    def close(self):
+        pass
+
+
+def serialization_commit() -> str:
+    """The commit that added micro-one's serialization module"""
+    return subprocess.check_output(
+        [
+            "git",
+            "log",
+            "--diff-filter=A",
+            "--format=%h",
+            "--",
+            "micro-one/src/serialization.py",
+        ],
+        cwd=REPO_ROOT,
+        text=True,
+    ).split()[-1]
+
+
+def export(revision: str, directory: Path) -> Path:
+    """Write both services' code at ``revision`` under ``directory``"""
+    archive = subprocess.check_output(
+        ["git", "archive", "--format=tar", revision, "micro-one/src", "micro-two/src"],
+        cwd=REPO_ROOT,
+    )
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+    return directory
+
+
+def load_apps(label: str, root: Path):
+    """Import both services from ``root`` with fake Dapr clients wired in"""
+    sender = import_from_service("micro-one", "main", f"one_{label}", root)
+    receiver = import_from_service("micro-two", "main", f"two_{label}", root)
+    sender_service = import_from_service(
+        "micro-one", "services.message_service", f"one_{label}", root
+    )
+    processor = import_from_service(
+        "micro-two", "services.message_processor", f"two_{label}", root
+    )
+    sender.message_service = sender_service.MessageService(
+        FakeDaprClient(),
+        circuit_breakers=sender.circuit_breakers,
+        status_tracker=sender.status_tracker,
+    )
+    receiver.message_processor = processor.MessageProcessor(
+        FakeDaprClient(), state_cache=receiver.state_cache
+    )
+    return sender, receiver
+
+
+def measure_parse(model, size: int, calls: int):
+    body = json.dumps(
+        {
+            "message": "x" * size,
+            "message_id": "0f8fad5b-d9cb-469f-a165-70867728950e",
+            "sender": "micro-one",
+            "timestamp": "2024-01-01T00:00:00Z",
+        }
+    ).encode()
+
+    def per_call(parse) -> float:
+        started = time.process_time()
+        for _ in range(calls):
+            parse()
+        return (time.process_time() - started) / calls * 1e6
+
+    return (
+        per_call(lambda: model.model_validate(json.loads(body))),
+        per_call(lambda: model.model_validate_json(body)),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--size", type=int, nargs="+", default=[64, 1024, 16384], help="Bytes"
+    )
+    parser.add_argument("--before", help="Revision without the serialization layer")
+    parser.add_argument("--after", help="Revision with it")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    after_rev = args.after or serialization_commit()
+    before_rev = args.before or f"{after_rev}~1"
+
+    rows = []
+    parse_rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        apps = {
+            label: load_apps(label, export(revision, Path(directory) / label))
+            for label, revision in (("before", before_rev), ("after", after_rev))
+        }
+        quiet_logging()
+
+        for size in args.size:
+            reply = json.dumps(
+                {
+                    "status": "received",
+                    "message_id": "0f8fad5b-d9cb-469f-a165-70867728950e",
+                    "processed_at": "2024-01-01T00:00:00",
+                    "response_message": "x" * size,
+                }
+            ).encode()
+            send = {"message": "x" * size, "recipient_id": "micro-two"}
+            receive = {
+                "message": "x" * size,
+                "message_id": "0f8fad5b-d9cb-469f-a165-70867728950e",
+                "sender": "micro-one",
+                "timestamp": "2024-01-01T00:00:00Z",
+            }
+            for service, index, path, body in (
+                ("micro-one", 0, "/send-message", send),
+                ("micro-two", 1, "/receive-message", receive),
+            ):
+                costs = {"before": [], "after": []}
+                # Alternate the revisions and keep each one's quietest round
+                for _ in range(args.rounds):
+                    for label in costs:
+                        sender, receiver = apps[label]
+                        sender.message_service.dapr_client.reply = reply
+                        app = (sender, receiver)[index].app
+                        costs[label].append(
+                            asyncio.run(
+                                measure_asgi_post(app, path, body, args.requests)
+                            )
+                        )
+                before, after = min(costs["before"]), min(costs["after"])
+                rows.append(
+                    {
+                        "service": service,
+                        "message_bytes": size,
+                        "before_us": before,
+                        "after_us": after,
+                        "saved_us": before - after,
+                    }
+                )
+
+            loads_then_validate, validate_json = measure_parse(
+                apps["after"][1].IncomingMessage, size, args.requests * 10
+            )
+            parse_rows.append(
+                {
+                    "message_bytes": size,
+                    "loads_then_validate_us": loads_then_validate,
+                    "validate_json_us": validate_json,
+                }
+            )
+
+    print(f"before={before_rev} after={after_rev}")
+    print_table(rows)
+    print()
+    print_table(parse_rows)
+    if args.json:
+        write_json(
+            args.json,
+            {
+                "benchmark": "serialization",
+                "before": before_rev,
+                "after": after_rev,
+                "results": rows,
+                "request_parsing": parse_rows,
+            },
+        )
+
+
+if __name__ == "__main__":
+    main()
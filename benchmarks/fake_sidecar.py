@@ -0,0 +1,539 @@
+"""
+Local stand-in for the Dapr sidecar.
+
+Serves the parts of the Dapr gRPC API the services use, so both apps can run
+and be load tested without a cluster:
+
+    InvokeService  forwarded to the target app (``--app id=url``): over HTTP,
+                   or to its gRPC app callback for ``grpc://host:port`` urls
+    Save/Get/DeleteState, GetBulkState, ExecuteStateTransaction
+                   in-memory state store with etags and first-write saves
+    PublishEvent   accepted and counted
+
+The HTTP port serves the same operations through the Dapr HTTP API
+(``/v1.0/invoke``, ``/v1.0/state`` and ``/v1.0/publish``; invocation of HTTP
+apps only) with keep-alive connections, answers the SDK's ``/v1.0/healthz``
+probes and reports call counters at ``/stats``.
+
+Every call can be slowed down (``--latency-ms``, ``--jitter-ms``) or made to
+fail (``--error-rate``), per operation group with ``--invoke-*``/``--state-*``.
+
+Usage:
+    python benchmarks/fake_sidecar.py --app micro-two=http://127.0.0.1:8002
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import grpc
+import httpx
+import uvicorn
+from google.protobuf import any_pb2, empty_pb2
+
+from dapr.proto.common.v1 import common_pb2
+from dapr.proto.runtime.v1 import appcallback_pb2_grpc, dapr_pb2_grpc, state_pb2
+
+# Headers passed between caller and app in both directions
+FORWARDED_HEADERS = ("accept-encoding", "content-encoding")
+
+
+@dataclass
+class Faults:
+    """Latency and error injection for one group of sidecar calls"""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+
+    async def inject(self) -> bool:
+        """Wait out the injected latency; True when the call should fail"""
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    async def apply(self, context: grpc.aio.ServicerContext) -> None:
+        if await self.inject():
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "injected fault")
+
+
+class FakeDapr(dapr_pb2_grpc.DaprServicer):
+    """Dapr runtime API backed by HTTP forwarding and dictionaries"""
+
+    def __init__(
+        self,
+        apps: Dict[str, str],
+        invoke_faults: Optional[Faults] = None,
+        state_faults: Optional[Faults] = None,
+    ):
+        self.apps = apps
+        self.invoke_faults = invoke_faults or Faults()
+        self.state_faults = state_faults or Faults()
+        # store name -> key -> (value, etag)
+        self.stores: Dict[str, Dict[str, Tuple[bytes, int]]] = {}
+        self.calls: Counter = Counter()
+        self._http = httpx.AsyncClient(
+            timeout=30.0, limits=httpx.Limits(max_connections=None)
+        )
+        self._channels: Dict[str, grpc.aio.Channel] = {}
+
+    async def close(self) -> None:
+        await self._http.aclose()
+        for channel in self._channels.values():
+            await channel.close()
+
+    def _app_callback(self, url: str) -> appcallback_pb2_grpc.AppCallbackStub:
+        address = url[len("grpc://") :]
+        channel = self._channels.get(address)
+        if channel is None:
+            channel = self._channels[address] = grpc.aio.insecure_channel(address)
+        return appcallback_pb2_grpc.AppCallbackStub(channel)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "calls": dict(self.calls),
+            "state_keys": {name: len(keys) for name, keys in self.stores.items()},
+            "state_bytes": {
+                name: sum(len(value) for value, _ in keys.values())
+                for name, keys in self.stores.items()
+            },
+        }
+
+    async def InvokeService(self, request, context):
+        self.calls["invoke"] += 1
+        await self.invoke_faults.apply(context)
+
+        app_id = request.id
+        base_url = self.apps.get(app_id)
+        if base_url is None:
+            self.calls["invoke_errors"] += 1
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"app {app_id} unknown")
+
+        message = request.message
+        if base_url.startswith("grpc://"):
+            try:
+                return await self._app_callback(base_url).OnInvoke(message)
+            except grpc.aio.AioRpcError as e:
+                self.calls["invoke_errors"] += 1
+                context.set_trailing_metadata(tuple(e.trailing_metadata() or ()))
+                await context.abort(e.code(), e.details() or "")
+
+        verb = common_pb2.HTTPExtension.Verb.Name(message.http_extension.verb)
+        headers = {"content-type": message.content_type or "application/json"}
+        # Dapr forwards invocation metadata as headers; keep bodies as sent
+        headers["accept-encoding"] = "identity"
+        for key, value in context.invocation_metadata():
+            if key in FORWARDED_HEADERS:
+                headers[key] = value
+        try:
+            response, body = await self.forward(
+                f"{base_url}/{message.method}",
+                verb if verb != "NONE" else "POST",
+                message.data.value,
+                headers,
+                message.http_extension.querystring,
+            )
+        except httpx.HTTPError as e:
+            self.calls["invoke_errors"] += 1
+            await context.abort(grpc.StatusCode.UNAVAILABLE, str(e))
+
+        if response.status_code == 429:
+            # Like Dapr: a shedding app is RESOURCE_EXHAUSTED, headers included
+            self.calls["invoke_shed"] += 1
+            await context.send_initial_metadata(
+                [("retry-after", response.headers.get("retry-after", "1"))]
+            )
+            await context.abort(
+                grpc.StatusCode.RESOURCE_EXHAUSTED, f"app {app_id} returned 429"
+            )
+        if response.status_code >= 400:
+            self.calls["invoke_errors"] += 1
+            await context.abort(
+                grpc.StatusCode.UNKNOWN,
+                f"app {app_id} returned {response.status_code}",
+            )
+        await context.send_initial_metadata(
+            [
+                (key, response.headers[key])
+                for key in FORWARDED_HEADERS
+                if key in response.headers
+            ]
+        )
+        return common_pb2.InvokeResponse(
+            data=any_pb2.Any(value=body),
+            content_type=response.headers.get("content-type", ""),
+        )
+
+    async def forward(
+        self, url: str, verb: str, body: bytes, headers: Dict[str, str], params
+    ) -> Tuple[httpx.Response, bytes]:
+        """Send an invocation on to an HTTP app; its response and raw body"""
+        request = self._http.build_request(
+            verb, url, content=body, params=params or None, headers=headers
+        )
+        response = await self._http.send(request, stream=True)
+        try:
+            data = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        self.calls["invoke_bytes_in"] += len(body)
+        self.calls["invoke_bytes_out"] += len(data)
+        return response, data
+
+    def etag_conflict(
+        self, store, key: str, etag: str, first_write: bool
+    ) -> Optional[str]:
+        """Why a write fails Dapr's etag or first-write check, if it does"""
+        current = store.get(key)
+        if etag:
+            if current is None or str(current[1]) != etag:
+                self.calls["etag_mismatches"] += 1
+                return f"etag mismatch for {key}"
+        elif current is not None and first_write:
+            self.calls["etag_mismatches"] += 1
+            return f"{key} already exists"
+        return None
+
+    async def _check_etag(self, store, item, context) -> None:
+        """Abort like Dapr when an item's etag or first-write check fails"""
+        conflict = self.etag_conflict(
+            store,
+            item.key,
+            item.etag.value if item.HasField("etag") else "",
+            item.options.concurrency
+            == common_pb2.StateOptions.StateConcurrency.CONCURRENCY_FIRST_WRITE,
+        )
+        if conflict:
+            await context.abort(grpc.StatusCode.ABORTED, conflict)
+
+    def put(self, store, key: str, value: bytes) -> None:
+        current = store.get(key)
+        etag = current[1] + 1 if current is not None else 1
+        store[key] = (value, etag)
+
+    async def SaveState(self, request, context):
+        self.calls["save_state"] += len(request.states)
+        await self.state_faults.apply(context)
+
+        store = self.stores.setdefault(request.store_name, {})
+        for item in request.states:
+            await self._check_etag(store, item, context)
+            self.put(store, item.key, item.value)
+        return empty_pb2.Empty()
+
+    async def ExecuteStateTransaction(self, request, context):
+        self.calls["transactions"] += 1
+        await self.state_faults.apply(context)
+
+        # All checks pass before anything is written; state.redis would apply
+        # the operations that pass even when one fails
+        store = self.stores.setdefault(request.storeName, {})
+        for operation in request.operations:
+            await self._check_etag(store, operation.request, context)
+        for operation in request.operations:
+            if operation.operationType == "delete":
+                store.pop(operation.request.key, None)
+            else:
+                self.put(store, operation.request.key, operation.request.value)
+        return empty_pb2.Empty()
+
+    async def GetState(self, request, context):
+        self.calls["get_state"] += 1
+        await self.state_faults.apply(context)
+
+        entry = self.stores.get(request.store_name, {}).get(request.key)
+        if entry is None:
+            return state_pb2.GetStateResponse()
+        return state_pb2.GetStateResponse(data=entry[0], etag=str(entry[1]))
+
+    async def GetBulkState(self, request, context):
+        self.calls["get_state"] += len(request.keys)
+        await self.state_faults.apply(context)
+
+        store = self.stores.get(request.store_name, {})
+        items = []
+        for key in request.keys:
+            entry = store.get(key)
+            if entry is None:
+                items.append(state_pb2.BulkStateItem(key=key))
+            else:
+                items.append(
+                    state_pb2.BulkStateItem(key=key, data=entry[0], etag=str(entry[1]))
+                )
+        return state_pb2.GetBulkStateResponse(items=items)
+
+    async def DeleteState(self, request, context):
+        self.calls["delete_state"] += 1
+        await self.state_faults.apply(context)
+
+        store = self.stores.setdefault(request.store_name, {})
+        await self._check_etag(store, request, context)
+        store.pop(request.key, None)
+        return empty_pb2.Empty()
+
+    async def PublishEvent(self, request, context):
+        self.calls["publish"] += 1
+        await self.invoke_faults.apply(context)
+        return empty_pb2.Empty()
+
+
+def _error(status: int, code: str, message: str):
+    body = json.dumps({"errorCode": code, "message": message}).encode()
+    return status, [("content-type", "application/json")], body
+
+
+def _compact(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+class HttpApi:
+    """ASGI app serving the Dapr HTTP API from the same apps and state"""
+
+    def __init__(self, sidecar: FakeDapr):
+        self.sidecar = sidecar
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+        }
+        query = parse_qsl(scope["query_string"].decode("latin-1"))
+        status, response_headers, content = await self.route(
+            scope["method"], scope["path"].strip("/").split("/"), headers, query, body
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (key.encode("latin-1"), value.encode("latin-1"))
+                    for key, value in response_headers
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": content})
+
+    async def route(self, verb: str, parts: List[str], headers, query, body: bytes):
+        if parts[:2] == ["v1.0", "healthz"]:
+            return 204, [], b""
+        if parts == ["stats"]:
+            stats = json.dumps(self.sidecar.stats()).encode()
+            return 200, [("content-type", "application/json")], stats
+        if len(parts) >= 5 and parts[:2] == ["v1.0", "invoke"] and parts[3] == "method":
+            return await self.invoke(
+                parts[2], "/".join(parts[4:]), verb, headers, query, body
+            )
+        if len(parts) >= 3 and parts[:2] == ["v1.0", "state"]:
+            return await self.state(verb, parts[2], parts[3:], headers, body)
+        if len(parts) == 4 and parts[:2] == ["v1.0", "publish"]:
+            self.sidecar.calls["publish"] += 1
+            if await self.sidecar.invoke_faults.inject():
+                return _error(500, "ERR_PUBSUB_PUBLISH_MESSAGE", "injected fault")
+            return 204, [], b""
+        return _error(404, "ERR_NOT_FOUND", "/".join(parts))
+
+    async def invoke(self, app_id, method, verb, headers, query, body: bytes):
+        sidecar = self.sidecar
+        sidecar.calls["invoke"] += 1
+        if await sidecar.invoke_faults.inject():
+            return _error(500, "ERR_DIRECT_INVOKE", "injected fault")
+
+        base_url = sidecar.apps.get(app_id)
+        if base_url is None or base_url.startswith("grpc://"):
+            sidecar.calls["invoke_errors"] += 1
+            return _error(500, "ERR_DIRECT_INVOKE", f"app {app_id} unknown over HTTP")
+        forwarded = {
+            "content-type": headers.get("content-type", "application/json"),
+            "accept-encoding": "identity",
+        }
+        for key in FORWARDED_HEADERS:
+            if key in headers:
+                forwarded[key] = headers[key]
+        try:
+            response, data = await sidecar.forward(
+                f"{base_url}/{method}", verb, body, forwarded, query
+            )
+        except httpx.HTTPError as e:
+            sidecar.calls["invoke_errors"] += 1
+            return _error(500, "ERR_DIRECT_INVOKE", str(e))
+
+        # Like Dapr, the app's status and headers are passed back unchanged
+        if response.status_code == 429:
+            sidecar.calls["invoke_shed"] += 1
+        elif response.status_code >= 400:
+            sidecar.calls["invoke_errors"] += 1
+        passed = ("content-type", "retry-after") + FORWARDED_HEADERS
+        return (
+            response.status_code,
+            [(key, response.headers[key]) for key in passed if key in response.headers],
+            data,
+        )
+
+    async def state(self, verb, store_name, rest, headers, body: bytes):
+        sidecar = self.sidecar
+        store = sidecar.stores.setdefault(store_name, {})
+        if verb == "POST" and rest in ([], ["transaction"]):
+            transaction = bool(rest)
+            if transaction:
+                sidecar.calls["transactions"] += 1
+                operations = json.loads(body)["operations"]
+                items = [operation["request"] for operation in operations]
+            else:
+                items = json.loads(body)
+                sidecar.calls["save_state"] += len(items)
+            if await sidecar.state_faults.inject():
+                return _error(500, "ERR_STATE_SAVE", "injected fault")
+            conflicts = (
+                sidecar.etag_conflict(
+                    store,
+                    item["key"],
+                    item.get("etag", ""),
+                    item.get("options", {}).get("concurrency") == "first-write",
+                )
+                for item in items
+            )
+            conflict = next((reason for reason in conflicts if reason), None)
+            if conflict:
+                return _error(409, "ERR_STATE_SAVE", conflict)
+            for index, item in enumerate(items):
+                if transaction and operations[index]["operation"] == "delete":
+                    store.pop(item["key"], None)
+                else:
+                    sidecar.put(store, item["key"], _compact(item["value"]))
+            return 204, [], b""
+
+        if verb == "POST" and rest == ["bulk"]:
+            keys = json.loads(body)["keys"]
+            sidecar.calls["get_state"] += len(keys)
+            if await sidecar.state_faults.inject():
+                return _error(500, "ERR_STATE_BULK_GET", "injected fault")
+            items = []
+            for key in keys:
+                entry = store.get(key)
+                if entry is None:
+                    items.append({"key": key})
+                else:
+                    value = json.loads(entry[0])
+                    items.append({"key": key, "data": value, "etag": str(entry[1])})
+            return 200, [("content-type", "application/json")], _compact(items)
+
+        if len(rest) != 1:
+            return _error(404, "ERR_NOT_FOUND", "/".join(rest))
+        key = rest[0]
+        if verb == "GET":
+            sidecar.calls["get_state"] += 1
+            if await sidecar.state_faults.inject():
+                return _error(500, "ERR_STATE_GET", "injected fault")
+            entry = store.get(key)
+            if entry is None:
+                return 204, [], b""
+            headers = [("content-type", "application/json"), ("etag", str(entry[1]))]
+            return 200, headers, entry[0]
+        if verb == "DELETE":
+            sidecar.calls["delete_state"] += 1
+            if await sidecar.state_faults.inject():
+                return _error(500, "ERR_STATE_DELETE", "injected fault")
+            conflict = sidecar.etag_conflict(
+                store, key, headers.get("if-match", ""), False
+            )
+            if conflict:
+                return _error(409, "ERR_STATE_DELETE", conflict)
+            store.pop(key, None)
+            return 204, [], b""
+        return _error(405, "ERR_METHOD_NOT_ALLOWED", verb)
+
+
+async def serve(
+    grpc_port: int,
+    http_port: int,
+    apps: Dict[str, str],
+    invoke_faults: Optional[Faults] = None,
+    state_faults: Optional[Faults] = None,
+) -> None:
+    """Run the fake sidecar until cancelled"""
+    sidecar = FakeDapr(apps, invoke_faults, state_faults)
+    server = grpc.aio.server()
+    dapr_pb2_grpc.add_DaprServicer_to_server(sidecar, server)
+    server.add_insecure_port(f"127.0.0.1:{grpc_port}")
+    await server.start()
+    http_server = uvicorn.Server(
+        uvicorn.Config(
+            HttpApi(sidecar),
+            host="127.0.0.1",
+            port=http_port,
+            lifespan="off",
+            log_level="warning",
+            access_log=False,
+        )
+    )
+    http_task = asyncio.create_task(http_server.serve())
+
+    try:
+        await server.wait_for_termination()
+    finally:
+        http_server.should_exit = True
+        await http_task
+        await server.stop(grace=None)
+        await sidecar.close()
+
+
+def _parse_apps(values) -> Dict[str, str]:
+    apps = {}
+    for value in values:
+        app_id, _, url = value.partition("=")
+        apps[app_id] = url.rstrip("/")
+    return apps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--grpc-port", type=int, default=50001)
+    parser.add_argument("--http-port", type=int, default=3500)
+    parser.add_argument(
+        "--app", action="append", default=[], help="Invocation target as id=url"
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    for group in ("invoke", "state"):
+        for option in ("latency-ms", "jitter-ms", "error-rate"):
+            parser.add_argument(f"--{group}-{option}", type=float)
+    args = parser.parse_args()
+
+    def faults(group: str) -> Faults:
+        def pick(option: str) -> float:
+            value = getattr(args, f"{group}_{option}")
+            return value if value is not None else getattr(args, option)
+
+        return Faults(pick("latency_ms"), pick("jitter_ms"), pick("error_rate"))
+
+    try:
+        asyncio.run(
+            serve(
+                args.grpc_port,
+                args.http_port,
+                _parse_apps(args.app),
+                invoke_faults=faults("invoke"),
+                state_faults=faults("state"),
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Payload compression helpers
+Codecs are named as in HTTP Content-Encoding. gzip uses the standard library;
+zstd is available when the zstandard package is installed.
+"""
+
+import zlib
+from typing import Iterable, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised only without zstandard
+    zstandard = None
+
+# Usable codecs, preferred first
+CODECS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+# Leading bytes of each codec's frames; JSON text never starts with these
+_MAGIC = {"gzip": b"\x1f\x8b", "zstd": b"\x28\xb5\x2f\xfd"}
+
+_CHUNK = 64 * 1024
+
+
+class PayloadTooLarge(ValueError):
+    """Data decompresses to more than the allowed size"""
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """Compress ``data`` with ``codec`` at a speed-oriented level"""
+    if codec == "gzip":
+        # Level 1 keeps most of level 6's size reduction at a fraction of its CPU
+        encoder = zlib.compressobj(1, zlib.DEFLATED, 31)
+        return encoder.compress(data) + encoder.flush()
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unsupported codec {codec!r}")
+
+
+def decompress(data: bytes, codec: str, max_size: Optional[int] = None) -> bytes:
+    """
+    Decompress one ``codec`` frame
+
+    Args:
+        data: The compressed bytes
+        codec: Codec the bytes were compressed with
+        max_size: Largest decompressed size accepted (None for no limit)
+
+    Returns:
+        The decompressed bytes
+
+    Raises:
+        PayloadTooLarge: The data decompresses to more than ``max_size`` bytes
+        ValueError: The codec is unknown or the data is corrupt or truncated
+    """
+    limit = max_size + 1 if max_size is not None else 0
+    try:
+        if codec == "gzip":
+            decoder = zlib.decompressobj(31)
+            result = decoder.decompress(data, limit)
+            if not decoder.eof and not decoder.unconsumed_tail:
+                raise ValueError("Truncated gzip data")
+        elif codec == "zstd" and zstandard is not None:
+            chunks: List[bytes] = []
+            size = 0
+            with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+                while chunk := reader.read(_CHUNK):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if limit and size >= limit:
+                        break
+            result = b"".join(chunks)
+        else:
+            raise ValueError(f"Unsupported codec {codec!r}")
+    except zlib.error as e:
+        raise ValueError(f"Corrupt {codec} data: {e}") from None
+    except Exception as e:
+        if zstandard is not None and isinstance(e, zstandard.ZstdError):
+            raise ValueError(f"Corrupt {codec} data: {e}") from None
+        raise
+    if max_size is not None and len(result) > max_size:
+        raise PayloadTooLarge(f"Decompressed data exceeds {max_size} bytes")
+    return result
+
+
+def sniff(data: bytes) -> Optional[str]:
+    """The codec ``data`` was compressed with, or None for plain data"""
+    for codec, magic in _MAGIC.items():
+        if data.startswith(magic):
+            return codec
+    return None
+
+
+def accepted(accept_encoding: str) -> List[str]:
+    """The codecs an Accept-Encoding value allows, in the order listed"""
+    codecs = []
+    wildcard = False
+    refused = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = params.strip()
+        if quality.startswith("q=") and _quality(quality[2:]) == 0:
+            refused.add(name)
+        elif name == "*":
+            wildcard = True
+        elif name:
+            codecs.append(name)
+    if wildcard:
+        codecs.extend(codec for codec in CODECS if codec not in codecs)
+    return [codec for codec in codecs if codec not in refused]
+
+
+def _quality(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 1.0
+
+
+def negotiate(accept_encoding: str, preferred: Iterable[str]) -> Optional[str]:
+    """The first of ``preferred`` that an Accept-Encoding value allows"""
+    allowed = accepted(accept_encoding)
+    return next((codec for codec in preferred if codec in allowed), None)
@@ -0,0 +1,179 @@
+"""
+Runtime settings for Micro-One
+Values are read from environment variables so they can be tuned per deployment.
+"""
+
+import os
+from dataclasses import dataclass
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.getenv(name) or default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Service settings resolved from the environment"""
+
+    # Logging: level, background rendering, and per-event info sampling
+    # ("event name=rate,..."; "*" applies to every unlisted info event)
+    log_level: str = "INFO"
+    log_async: bool = True
+    log_queue_size: int = 10000
+    log_sample_rates: str = ""
+    # Prometheus metrics on /metrics, including per-stage latency histograms
+    metrics_enabled: bool = True
+    # Size of the thread pool used for blocking Dapr client calls
+    dapr_invoke_max_workers: int = 32
+    # Dapr API the client speaks: "grpc" (the SDK client, run on that pool) or
+    # "http" (async calls over a pool of kept-alive connections, optionally
+    # multiplexed over HTTP/2)
+    dapr_transport: str = "grpc"
+    dapr_http_max_connections: int = 100
+    dapr_http_max_keepalive: int = 20
+    dapr_http_keepalive_expiry: float = 5.0
+    dapr_http2: bool = False
+    # Fan-out limits for POST /send-messages
+    send_batch_max_items: int = 1000
+    send_batch_concurrency: int = 16
+    send_batch_item_timeout: float = 10.0
+    # Fan-out limits for POST /send-message/fanout; the timeout applies to
+    # each recipient unless the request sets its own
+    fanout_max_recipients: int = 64
+    fanout_recipient_timeout: float = 10.0
+    # Default delivery: "invoke" (service invocation) or "pubsub" (topic publish)
+    delivery_mode: str = "invoke"
+    pubsub_name: str = "pubsub"
+    pubsub_topic: str = "messages"
+    # Framing of invoked sends: "http" (JSON POST) or "grpc" (protobuf, served
+    # by the recipient's gRPC app callback)
+    invoke_protocol: str = "http"
+    # Compression of JSON invocation bodies of at least threshold bytes, once
+    # the recipient advertises the codec (threshold 0 disables it)
+    compression_codec: str = "gzip"
+    compression_threshold: int = 1024
+    # Concurrent sends to one recipient collected for up to window seconds and
+    # sent as one call to its /receive-messages route (window 0 disables it)
+    send_coalesce_window: float = 0.0
+    send_coalesce_max_batch: int = 64
+    # Durable outbox for invoked sends from /send-message: accepted sends are
+    # logged to this file and delivered in the background (unset disables it)
+    outbox_path: str = ""
+    outbox_concurrency: int = 8
+    outbox_max_pending: int = 100000
+    outbox_max_attempts: int = 0
+    outbox_fsync: bool = False
+    # Retries for invoked sends: exponential backoff with jitter under a deadline
+    send_max_retries: int = 0
+    retry_base_delay: float = 0.1
+    retry_max_delay: float = 5.0
+    retry_deadline: float = 10.0
+    # Message status tracking; set STATUS_STATE_STORE to persist final statuses
+    status_max_entries: int = 10000
+    status_state_store: str = ""
+    # Per-recipient circuit breaker
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+    # Production launcher (python -m app.serve): listening address, worker
+    # processes (0 sizes them to the container's CPU quota) and seconds
+    # in-flight requests get to finish on shutdown
+    server_host: str = "0.0.0.0"
+    server_port: int = 8001
+    server_workers: int = 0
+    server_graceful_timeout: float = 15.0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from environment variables, falling back to defaults"""
+        return cls(
+            log_level=_env_str("LOG_LEVEL", cls.log_level),
+            log_async=_env_bool("LOG_ASYNC", cls.log_async),
+            log_queue_size=_env_int("LOG_QUEUE_SIZE", cls.log_queue_size),
+            log_sample_rates=_env_str("LOG_SAMPLE_RATES", cls.log_sample_rates),
+            metrics_enabled=_env_bool("METRICS_ENABLED", cls.metrics_enabled),
+            dapr_invoke_max_workers=_env_int(
+                "DAPR_INVOKE_MAX_WORKERS", cls.dapr_invoke_max_workers
+            ),
+            dapr_transport=_env_str("DAPR_TRANSPORT", cls.dapr_transport),
+            dapr_http_max_connections=_env_int(
+                "DAPR_HTTP_MAX_CONNECTIONS", cls.dapr_http_max_connections
+            ),
+            dapr_http_max_keepalive=_env_int(
+                "DAPR_HTTP_MAX_KEEPALIVE", cls.dapr_http_max_keepalive
+            ),
+            dapr_http_keepalive_expiry=_env_float(
+                "DAPR_HTTP_KEEPALIVE_EXPIRY", cls.dapr_http_keepalive_expiry
+            ),
+            dapr_http2=_env_bool("DAPR_HTTP2", cls.dapr_http2),
+            send_batch_max_items=_env_int(
+                "SEND_BATCH_MAX_ITEMS", cls.send_batch_max_items
+            ),
+            send_batch_concurrency=_env_int(
+                "SEND_BATCH_CONCURRENCY", cls.send_batch_concurrency
+            ),
+            send_batch_item_timeout=_env_float(
+                "SEND_BATCH_ITEM_TIMEOUT", cls.send_batch_item_timeout
+            ),
+            fanout_max_recipients=_env_int(
+                "FANOUT_MAX_RECIPIENTS", cls.fanout_max_recipients
+            ),
+            fanout_recipient_timeout=_env_float(
+                "FANOUT_RECIPIENT_TIMEOUT", cls.fanout_recipient_timeout
+            ),
+            delivery_mode=_env_str("DELIVERY_MODE", cls.delivery_mode),
+            pubsub_name=_env_str("PUBSUB_NAME", cls.pubsub_name),
+            pubsub_topic=_env_str("PUBSUB_TOPIC", cls.pubsub_topic),
+            invoke_protocol=_env_str("INVOKE_PROTOCOL", cls.invoke_protocol),
+            compression_codec=_env_str("COMPRESSION_CODEC", cls.compression_codec),
+            compression_threshold=_env_int(
+                "COMPRESSION_THRESHOLD", cls.compression_threshold
+            ),
+            send_coalesce_window=_env_float(
+                "SEND_COALESCE_WINDOW", cls.send_coalesce_window
+            ),
+            send_coalesce_max_batch=_env_int(
+                "SEND_COALESCE_MAX_BATCH", cls.send_coalesce_max_batch
+            ),
+            outbox_path=_env_str("OUTBOX_PATH", cls.outbox_path),
+            outbox_concurrency=_env_int("OUTBOX_CONCURRENCY", cls.outbox_concurrency),
+            outbox_max_pending=_env_int("OUTBOX_MAX_PENDING", cls.outbox_max_pending),
+            outbox_max_attempts=_env_int(
+                "OUTBOX_MAX_ATTEMPTS", cls.outbox_max_attempts
+            ),
+            outbox_fsync=_env_bool("OUTBOX_FSYNC", cls.outbox_fsync),
+            send_max_retries=_env_int("SEND_MAX_RETRIES", cls.send_max_retries),
+            retry_base_delay=_env_float("RETRY_BASE_DELAY", cls.retry_base_delay),
+            retry_max_delay=_env_float("RETRY_MAX_DELAY", cls.retry_max_delay),
+            retry_deadline=_env_float("RETRY_DEADLINE", cls.retry_deadline),
+            status_max_entries=_env_int("STATUS_MAX_ENTRIES", cls.status_max_entries),
+            status_state_store=_env_str("STATUS_STATE_STORE", cls.status_state_store),
+            breaker_failure_threshold=_env_int(
+                "BREAKER_FAILURE_THRESHOLD", cls.breaker_failure_threshold
+            ),
+            breaker_reset_timeout=_env_float(
+                "BREAKER_RESET_TIMEOUT", cls.breaker_reset_timeout
+            ),
+            server_host=_env_str("SERVER_HOST", cls.server_host),
+            server_port=_env_int("SERVER_PORT", cls.server_port),
+            server_workers=_env_int("SERVER_WORKERS", cls.server_workers),
+            server_graceful_timeout=_env_float(
+                "SERVER_GRACEFUL_TIMEOUT", cls.server_graceful_timeout
+            ),
+        )
@@ -0,0 +1,442 @@
+"""
+Dapr HTTP API client
+An asyncio client for the sidecar's HTTP API over a pooled httpx.AsyncClient,
+with the method signatures and response types of the SDK's DaprGrpcClient.
+"""
+
+import importlib.util
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+
+import grpc
+import httpx
+from dapr.clients.grpc._request import TransactionalStateOperation
+from dapr.clients.grpc._response import (
+    BulkStateItem,
+    BulkStatesResponse,
+    DaprResponse,
+    InvokeMethodResponse,
+    StateResponse,
+)
+from dapr.clients.grpc._state import Concurrency, Consistency, StateItem, StateOptions
+from dapr.conf import settings as dapr_settings
+
+from .serialization import dumps, loads
+
+MetadataTuple = Tuple[Tuple[str, Union[str, bytes]], ...]
+
+# gRPC status codes the runtime would have answered with, so callers can
+# handle errors from either client alike
+_STATUS_CODES = {
+    400: grpc.StatusCode.INVALID_ARGUMENT,
+    401: grpc.StatusCode.UNAUTHENTICATED,
+    403: grpc.StatusCode.PERMISSION_DENIED,
+    404: grpc.StatusCode.NOT_FOUND,
+    409: grpc.StatusCode.ABORTED,
+    412: grpc.StatusCode.FAILED_PRECONDITION,
+    429: grpc.StatusCode.RESOURCE_EXHAUSTED,
+    501: grpc.StatusCode.UNIMPLEMENTED,
+    503: grpc.StatusCode.UNAVAILABLE,
+    504: grpc.StatusCode.DEADLINE_EXCEEDED,
+}
+
+# First byte of each kind of JSON value
+_JSON_STARTS = frozenset(b'{["-0123456789tfn')
+
+
+class DaprHttpError(Exception):
+    """
+    A non-2xx answer from the sidecar, or from an invoked app through it
+
+    Mirrors the parts of ``grpc.RpcError`` that callers inspect: ``code()``
+    maps the HTTP status to the gRPC status Dapr uses for it, and the response
+    headers are the initial metadata.
+    """
+
+    def __init__(self, status_code: int, message: str, headers: httpx.Headers):
+        super().__init__(f"Dapr returned {status_code}: {message}")
+        self.status_code = status_code
+        self.headers = headers
+
+    def code(self) -> grpc.StatusCode:
+        return _STATUS_CODES.get(self.status_code, grpc.StatusCode.UNKNOWN)
+
+    def details(self) -> str:
+        return str(self)
+
+    def initial_metadata(self) -> List[Tuple[str, str]]:
+        return list(self.headers.multi_items())
+
+    def trailing_metadata(self) -> List[Tuple[str, str]]:
+        return []
+
+
+def _json_value(value: Union[bytes, str]) -> bytes:
+    """A state value as the raw JSON the HTTP API stores"""
+    if isinstance(value, str):
+        value = value.encode()
+    stripped = value.lstrip()
+    if not stripped or stripped[0] not in _JSON_STARTS:
+        raise ValueError(
+            "The Dapr HTTP API stores JSON state values; "
+            "binary values need the gRPC transport"
+        )
+    return value
+
+
+def _options(options: Optional[StateOptions]) -> Dict[str, str]:
+    if options is None:
+        return {}
+    names = {
+        Concurrency.first_write: "first-write",
+        Concurrency.last_write: "last-write",
+        Consistency.eventual: "eventual",
+        Consistency.strong: "strong",
+    }
+    chosen = {
+        "concurrency": names.get(options.concurrency),
+        "consistency": names.get(options.consistency),
+    }
+    return {name: value for name, value in chosen.items() if value}
+
+
+class DaprHttpClient:
+    """
+    Async client for the Dapr HTTP API sharing one connection pool
+
+    Connections to the sidecar are kept alive between calls, so a call only
+    pays for a new connection when all pooled ones are busy. Offers the
+    methods of DaprGrpcClient used by the services, as coroutines, returning
+    the same response types.
+    """
+
+    def __init__(
+        self,
+        address: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        http2: bool = False,
+        timeout: Optional[float] = None,
+        api_token: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Args:
+            address: Base URL of the sidecar (defaults to DAPR_HTTP_ENDPOINT,
+                or DAPR_RUNTIME_HOST and DAPR_HTTP_PORT)
+            max_connections: Connections open to the sidecar at once; further
+                calls wait for one to be free
+            max_keepalive_connections: Idle connections kept for reuse
+            keepalive_expiry: Seconds an idle connection is kept
+            http2: Multiplex calls over HTTP/2 connections (needs the ``h2``
+                package, from the ``http2`` extra; plain-text addresses are
+                spoken to in HTTP/2 directly)
+            timeout: Seconds allowed per call (defaults to
+                DAPR_HTTP_TIMEOUT_SECONDS)
+            api_token: Sent as ``dapr-api-token`` (defaults to DAPR_API_TOKEN)
+            transport: httpx transport to send calls through instead of the
+                pooled one, e.g. ``httpx.MockTransport`` in tests
+
+        Raises:
+            ValueError: ``http2`` is set but ``h2`` is not installed
+        """
+        if http2 and importlib.util.find_spec("h2") is None:
+            raise ValueError(
+                "DAPR_HTTP2 needs the h2 package: install the http2 extra "
+                "(httpx[http2]) or turn DAPR_HTTP2 off"
+            )
+        address = address or dapr_settings.DAPR_HTTP_ENDPOINT
+        if not address:
+            address = (
+                f"http://{dapr_settings.DAPR_RUNTIME_HOST}:"
+                f"{dapr_settings.DAPR_HTTP_PORT}"
+            )
+        self.base_url = f"{address.rstrip('/')}/{dapr_settings.DAPR_API_VERSION}"
+        headers = {}
+        api_token = api_token or dapr_settings.DAPR_API_TOKEN
+        if api_token:
+            headers["dapr-api-token"] = api_token
+        self._client = httpx.AsyncClient(
+            headers=headers,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            # Without TLS there is no ALPN to agree on HTTP/2
+            http1=not (http2 and address.startswith("http://")),
+            http2=http2,
+            timeout=timeout or dapr_settings.DAPR_HTTP_TIMEOUT_SECONDS,
+            transport=transport,
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled connections"""
+        await self._client.aclose()
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        content: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        params: Any = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        """
+        Raises:
+            DaprHttpError: The response status is not 2xx
+        """
+        response = await self._client.request(
+            method,
+            f"{self.base_url}/{path}",
+            content=content,
+            headers=headers,
+            params=params,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+        )
+        if response.status_code >= 400:
+            raise DaprHttpError(
+                response.status_code,
+                response.text[:200] or response.reason_phrase,
+                response.headers,
+            )
+        return response
+
+    async def invoke_method(
+        self,
+        app_id: str,
+        method_name: str,
+        data: Union[bytes, str] = "",
+        content_type: Optional[str] = None,
+        metadata: Optional[MetadataTuple] = None,
+        http_verb: Optional[str] = None,
+        http_querystring: Optional[MetadataTuple] = None,
+        timeout: Optional[int] = None,
+    ) -> InvokeMethodResponse:
+        """
+        Invoke a method on another app; metadata is sent as request headers
+
+        Raises:
+            TypeError: ``data`` is a protobuf message, which only the gRPC
+                API can deliver
+            DaprHttpError: The sidecar or the app answered with an error
+        """
+        if not isinstance(data, (bytes, str)):
+            raise TypeError("Invoking with a protobuf message needs the gRPC API")
+        headers = {key: value for key, value in metadata or ()}
+        if content_type:
+            headers["content-type"] = content_type
+        response = await self._request(
+            http_verb or "POST",
+            f"invoke/{quote(app_id, safe='')}/method/{method_name}",
+            content=data.encode() if isinstance(data, str) else data,
+            headers=headers,
+            params=list(http_querystring) if http_querystring else None,
+            timeout=timeout,
+        )
+        return InvokeMethodResponse(
+            response.content,
+            response.headers.get("content-type"),
+            headers=tuple(response.headers.multi_items()),
+            status_code=response.status_code,
+        )
+
+    async def publish_event(
+        self,
+        pubsub_name: str,
+        topic_name: str,
+        data: Union[bytes, str],
+        publish_metadata: Optional[Dict[str, str]] = None,
+        metadata: Optional[MetadataTuple] = None,
+        data_content_type: Optional[str] = None,
+    ) -> DaprResponse:
+        """Publish an event to a topic"""
+        headers = {key: value for key, value in metadata or ()}
+        if data_content_type:
+            headers["content-type"] = data_content_type
+        response = await self._request(
+            "POST",
+            f"publish/{pubsub_name}/{topic_name}",
+            content=data.encode() if isinstance(data, str) else data,
+            headers=headers,
+            params={
+                f"metadata.{key}": value
+                for key, value in (publish_metadata or {}).items()
+            },
+        )
+        return DaprResponse(headers=tuple(response.headers.multi_items()))
+
+    @staticmethod
+    def _state_item(
+        key: str,
+        value: Union[bytes, str],
+        etag: Optional[str] = None,
+        options: Optional[StateOptions] = None,
+        state_metadata: Optional[Dict[str, str]] = None,
+    ) -> bytes:
+        """One state item, with its value embedded as raw JSON"""
+        fields = {"key": key}
+        if etag:
+            fields["etag"] = etag
+        chosen = _options(options)
+        if chosen:
+            fields["options"] = chosen
+        if state_metadata:
+            fields["metadata"] = state_metadata
+        return dumps(fields)[:-1] + b',"value":' + _json_value(value) + b"}"
+
+    async def save_state(
+        self,
+        store_name: str,
+        key: str,
+        value: Union[bytes, str],
+        etag: Optional[str] = None,
+        options: Optional[StateOptions] = None,
+        state_metadata: Optional[Dict[str, str]] = None,
+        metadata: Optional[MetadataTuple] = None,
+    ) -> DaprResponse:
+        """
+        Save a JSON value, optionally only if its etag still matches
+
+        Raises:
+            ValueError: The value is not JSON
+            DaprHttpError: The etag or first-write check failed (code ABORTED)
+                or the store refused the write
+        """
+        item = self._state_item(key, value, etag, options, state_metadata)
+        response = await self._request(
+            "POST", f"state/{store_name}", content=b"[" + item + b"]"
+        )
+        return DaprResponse(headers=tuple(response.headers.multi_items()))
+
+    async def save_bulk_state(
+        self,
+        store_name: str,
+        states: List[StateItem],
+        metadata: Optional[MetadataTuple] = None,
+    ) -> DaprResponse:
+        """Save several JSON values in one call"""
+        if not states:
+            raise ValueError("States to save cannot be empty")
+        items = b",".join(
+            self._state_item(
+                state.key, state.value, state.etag, state.options, state.metadata
+            )
+            for state in states
+        )
+        response = await self._request(
+            "POST", f"state/{store_name}", content=b"[" + items + b"]"
+        )
+        return DaprResponse(headers=tuple(response.headers.multi_items()))
+
+    async def get_state(
+        self,
+        store_name: str,
+        key: str,
+        state_metadata: Optional[Dict[str, str]] = None,
+        metadata: Optional[MetadataTuple] = None,
+    ) -> StateResponse:
+        """A stored value and its etag; empty data when the key does not exist"""
+        response = await self._request(
+            "GET",
+            f"state/{store_name}/{quote(key, safe='')}",
+            params={
+                f"metadata.{name}": value
+                for name, value in (state_metadata or {}).items()
+            },
+        )
+        return StateResponse(
+            data=response.content,
+            etag=response.headers.get("etag", ""),
+            headers=tuple(response.headers.multi_items()),
+        )
+
+    async def get_bulk_state(
+        self,
+        store_name: str,
+        keys: Sequence[str],
+        parallelism: int = 1,
+        states_metadata: Optional[Dict[str, str]] = None,
+        metadata: Optional[MetadataTuple] = None,
+    ) -> BulkStatesResponse:
+        """Stored values and etags of several keys, in one call"""
+        response = await self._request(
+            "POST",
+            f"state/{store_name}/bulk",
+            content=dumps({"keys": list(keys), "parallelism": parallelism}),
+            params={
+                f"metadata.{name}": value
+                for name, value in (states_metadata or {}).items()
+            },
+        )
+        items = [
+            BulkStateItem(
+                key=item["key"],
+                data=dumps(item["data"]) if "data" in item else b"",
+                etag=item.get("etag", ""),
+                error=item.get("error", ""),
+            )
+            for item in loads(response.content)
+        ]
+        return BulkStatesResponse(
+            items=items, headers=tuple(response.headers.multi_items())
+        )
+
+    async def delete_state(
+        self,
+        store_name: str,
+        key: str,
+        etag: Optional[str] = None,
+        options: Optional[StateOptions] = None,
+        state_metadata: Optional[Dict[str, str]] = None,
+        metadata: Optional[MetadataTuple] = None,
+    ) -> DaprResponse:
+        """Delete a key, optionally only if its etag still matches"""
+        headers = {"if-match": etag} if etag else {}
+        params = {
+            f"metadata.{name}": value for name, value in (state_metadata or {}).items()
+        }
+        params.update(_options(options))
+        response = await self._request(
+            "DELETE",
+            f"state/{store_name}/{quote(key, safe='')}",
+            headers=headers,
+            params=params,
+        )
+        return DaprResponse(headers=tuple(response.headers.multi_items()))
+
+    async def execute_state_transaction(
+        self,
+        store_name: str,
+        operations: Sequence[TransactionalStateOperation],
+        transactional_metadata: Optional[Dict[str, str]] = None,
+        metadata: Optional[MetadataTuple] = None,
+    ) -> DaprResponse:
+        """
+        Apply upserts and deletes in one state transaction
+
+        Raises:
+            DaprHttpError: An etag check failed (code ABORTED). Whether the
+                other operations were applied depends on the state store;
+                ``state.redis`` applies them.
+        """
+        encoded = []
+        for operation in operations:
+            kind = operation.operation_type.value
+            if kind == "delete":
+                request = {"key": operation.key}
+                if operation.etag:
+                    request["etag"] = operation.etag
+                encoded.append(dumps({"operation": kind, "request": request}))
+            else:
+                item = self._state_item(operation.key, operation.data, operation.etag)
+                encoded.append(b'{"operation":"upsert","request":' + item + b"}")
+        body = b'{"operations":[' + b",".join(encoded) + b"]"
+        if transactional_metadata:
+            body += b',"metadata":' + dumps(transactional_metadata)
+        response = await self._request(
+            "POST", f"state/{store_name}/transaction", content=body + b"}"
+        )
+        return DaprResponse(headers=tuple(response.headers.multi_items()))
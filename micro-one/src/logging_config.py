@@ -0,0 +1,199 @@
+"""
+Structured logging setup
+Keeps the per-call cost on the event loop small: events are sampled and
+handed to a queue, and a background thread adds timestamps and renders JSON.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+import structlog
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Event dict key carrying the time an event entered the processor chain
+_EMIT_STARTED = "_emit_started"
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Parse ``"event name=rate,other event=rate"`` into a mapping
+
+    The key ``*`` sets the rate for every info/debug event not listed.
+    """
+    rates = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        event, rate = item.rsplit("=", 1)
+        rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class EventSampler:
+    """Drop a fraction of success-path events; warnings and errors always pass"""
+
+    SAMPLED_LEVELS = ("debug", "info")
+
+    def __init__(self, rates: Dict[str, float]):
+        self.rates = dict(rates)
+        self.default_rate = self.rates.pop("*", 1.0)
+
+    def __call__(self, logger: Any, method_name: str, event_dict: Dict[str, Any]):
+        if method_name not in self.SAMPLED_LEVELS:
+            return event_dict
+        rate = self.rates.get(event_dict.get("event"), self.default_rate)
+        if rate < 1.0 and random.random() >= rate:
+            raise structlog.DropEvent
+        return event_dict
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records untouched so that formatting happens on the listener
+
+    While the queue is full, info and debug records are dropped, and warnings
+    and errors are written by ``fallback`` on the caller's thread instead.
+    """
+
+    def __init__(
+        self,
+        log_queue: queue.Queue,
+        fallback: logging.Handler,
+        on_emit: Optional[Callable[[float], None]] = None,
+        on_drop: Optional[Callable[[], None]] = None,
+    ):
+        super().__init__(log_queue)
+        self.fallback = fallback
+        self.dropped = 0
+        self.on_emit = on_emit
+        self.on_drop = on_drop
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Take the marker out before the listener thread can see the dict
+        started = None
+        if isinstance(record.msg, dict):
+            started = record.msg.pop(_EMIT_STARTED, None)
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                # Never shed these; write it now, ahead of the queued lines
+                self.fallback.handle(record)
+            else:
+                # Shed success-path lines rather than block the event loop
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop()
+
+        if started is not None and self.on_emit is not None:
+            self.on_emit(time.perf_counter() - started)
+
+
+def _mark_emit_start(logger: Any, method_name: str, event_dict: Dict[str, Any]):
+    event_dict[_EMIT_STARTED] = time.perf_counter()
+    return event_dict
+
+
+def _add_timestamp(logger: Any, method_name: str, event_dict: Dict[str, Any]):
+    """ISO timestamp taken from the record's creation time"""
+    record = event_dict.get("_record")
+    created = record.created if record is not None else datetime.now().timestamp()
+    event_dict["timestamp"] = datetime.fromtimestamp(created, timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%S.%fZ"
+    )
+    return event_dict
+
+
+def configure_logging(
+    level: str = "INFO",
+    use_queue: bool = True,
+    queue_size: int = 10000,
+    sample_rates: Optional[Dict[str, float]] = None,
+    on_emit: Optional[Callable[[float], None]] = None,
+    on_drop: Optional[Callable[[], None]] = None,
+) -> None:
+    """
+    Configure structlog and the stdlib root logger
+
+    Args:
+        level: Root log level name
+        use_queue: Render and write log lines on a background thread
+        queue_size: Records buffered for the background thread before dropping
+        sample_rates: Event name to the fraction of info/debug events kept
+        on_emit: Called with the seconds each event spent on the caller's
+            thread, from entering structlog to being queued (queued mode only)
+        on_drop: Called for each info/debug record dropped because the queue
+            was full (queued mode only)
+    """
+    global _listener
+    stop_logging()
+
+    formatter = structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=[
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+        ],
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            _add_timestamp,
+            structlog.processors.UnicodeDecoder(),
+            structlog.processors.JSONRenderer(),
+        ],
+    )
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    if use_queue:
+        handler = _RecordQueueHandler(
+            queue.Queue(maxsize=queue_size), stream_handler, on_emit, on_drop
+        )
+        _listener = logging.handlers.QueueListener(handler.queue, stream_handler)
+        _listener.start()
+    else:
+        handler = stream_handler
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            *([_mark_emit_start] if use_queue and on_emit is not None else []),
+            EventSampler(sample_rates or {}),
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            structlog.processors.StackInfoRenderer(),
+            # Tracebacks must be captured on the thread that raised them
+            structlog.processors.format_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+
+def stop_logging() -> None:
+    """Write out queued log records and stop the background thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -6,32 +6,42 @@ A FastAPI microservice that sends messages to micro-two using Dapr.
 import logging
 import uuid
 from contextlib import asynccontextmanager
-from typing import Dict, Any
+from typing import Dict, Any, List, Literal, Optional
 
 import structlog
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
 from dapr.clients.grpc.client import DaprGrpcClient
 
+from .config import Settings
+from .dapr_http import DaprHttpClient
+from .logging_config import configure_logging, parse_sample_rates
+from .metrics import CONTENT_TYPE, MetricsMiddleware, ServiceMetrics, timed_handler
+from .serialization import FastJSONResponse
 from .services.message_service import MessageService
+from .services.outbox import Outbox, OutboxFull
+from .services.status_tracker import MessageStatusTracker
+from .services.resilience import (
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    RecipientOverloadedError,
+    RetryPolicy,
+)
+
+settings = Settings.from_env()
+metrics = ServiceMetrics() if settings.metrics_enabled else None
 
 # Configure structured logging
-structlog.configure(
-    processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer(),
-    ],
-    context_class=dict,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    wrapper_class=structlog.stdlib.BoundLogger,
-    cache_logger_on_first_use=True,
+configure_logging(
+    level=settings.log_level,
+    use_queue=settings.log_async,
+    queue_size=settings.log_queue_size,
+    sample_rates=parse_sample_rates(settings.log_sample_rates),
+    on_emit=(
+        (lambda seconds: metrics.stage("log", seconds)) if metrics is not None else None
+    ),
+    on_drop=metrics.log_records_dropped_total.inc if metrics is not None else None,
 )
 
 logger = structlog.get_logger(__name__)
@@ -41,6 +51,8 @@ logger = structlog.get_logger(__name__)
 class MessageRequest(BaseModel):
     message: str
     recipient_id: str = "micro-two"
+    # Overrides the configured DELIVERY_MODE for this message
+    delivery_mode: Optional[Literal["invoke", "pubsub"]] = None
 
 
 class MessageResponse(BaseModel):
@@ -49,33 +61,151 @@ class MessageResponse(BaseModel):
     sent_to: str
 
 
+class BatchItemResult(BaseModel):
+    status: str
+    message_id: str
+    sent_to: str
+    error: Optional[str] = None
+
+
+class BatchMessageResponse(BaseModel):
+    results: List[BatchItemResult]
+    sent: int
+    failed: int
+
+
+class FanoutRequest(BaseModel):
+    message: str
+    recipient_ids: List[str] = Field(min_length=1)
+    # Seconds to wait for each recipient (defaults to FANOUT_RECIPIENT_TIMEOUT)
+    recipient_timeout: Optional[float] = Field(default=None, gt=0)
+    # Answer once this many recipients have the message instead of waiting for all
+    first_k: Optional[int] = Field(default=None, ge=1)
+
+
+class FanoutItemResult(BaseModel):
+    # "sent", "failed", or "cancelled" when no longer awaited with first_k
+    status: str
+    message_id: str
+    sent_to: str
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+class FanoutResponse(BaseModel):
+    results: List[FanoutItemResult]
+    sent: int
+    failed: int
+    cancelled: int
+    # Whether first_k (or every) recipient has the message
+    complete: bool
+
+
+class OutboxStats(BaseModel):
+    pending: int
+    accepted: int
+    delivered: int
+    given_up: int
+    recovered: int
+
+
 class HealthResponse(BaseModel):
     status: str
     service: str
     version: str
+    # Present when OUTBOX_PATH is set
+    outbox: Optional[OutboxStats] = None
 
 
 # Global variables
 message_service: MessageService = None
+outbox: Optional[Outbox] = None
+status_tracker = MessageStatusTracker(max_entries=settings.status_max_entries)
+circuit_breakers = CircuitBreakerRegistry(
+    failure_threshold=settings.breaker_failure_threshold,
+    reset_timeout=settings.breaker_reset_timeout,
+)
+
+
+def _dapr_client():
+    """The Dapr client for the configured transport"""
+    if settings.dapr_transport == "grpc":
+        return DaprGrpcClient()
+    if settings.dapr_transport != "http":
+        raise ValueError(f"Unknown Dapr transport {settings.dapr_transport!r}")
+    if settings.invoke_protocol == "grpc":
+        raise ValueError("The grpc invoke protocol needs the grpc Dapr transport")
+    return DaprHttpClient(
+        max_connections=settings.dapr_http_max_connections,
+        max_keepalive_connections=settings.dapr_http_max_keepalive,
+        keepalive_expiry=settings.dapr_http_keepalive_expiry,
+        http2=settings.dapr_http2,
+    )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global message_service
+    global message_service, outbox
 
     logger.info("Starting micro-one service")
 
     # Initialize Dapr client and message service
-    dapr_client = DaprGrpcClient()
-    message_service = MessageService(dapr_client)
+    dapr_client = _dapr_client()
+    message_service = MessageService(
+        dapr_client,
+        max_workers=settings.dapr_invoke_max_workers,
+        retry_policy=RetryPolicy(
+            max_retries=settings.send_max_retries,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+            deadline=settings.retry_deadline,
+        ),
+        circuit_breakers=circuit_breakers,
+        status_tracker=status_tracker,
+        status_store_name=settings.status_state_store or None,
+        metrics=metrics,
+        invoke_protocol=settings.invoke_protocol,
+        compression_codec=(
+            settings.compression_codec if settings.compression_threshold > 0 else None
+        ),
+        compression_threshold=settings.compression_threshold,
+        coalesce_window=settings.send_coalesce_window,
+        coalesce_max_batch=settings.send_coalesce_max_batch,
+    )
+    if settings.outbox_path:
+        outbox = Outbox(
+            settings.outbox_path,
+            deliver=lambda entry: message_service.send_message(
+                entry["recipient_service"], entry["message"], entry["message_id"]
+            ),
+            concurrency=settings.outbox_concurrency,
+            max_pending=settings.outbox_max_pending,
+            max_attempts=settings.outbox_max_attempts,
+            fsync=settings.outbox_fsync,
+            retry_policy=RetryPolicy(
+                base_delay=settings.retry_base_delay,
+                max_delay=settings.retry_max_delay,
+            ),
+            on_give_up=lambda entry, error: message_service.record_failed(
+                entry["message_id"], error
+            ),
+            metrics=metrics,
+        )
+        await outbox.start()
 
     yield
 
     # Cleanup
     logger.info("Shutting down micro-one service")
-    if dapr_client:
-        await dapr_client.close()
+    if outbox is not None:
+        await outbox.close()
+    await message_service.flush_status_writes()
+    message_service.close()
+    if isinstance(dapr_client, DaprHttpClient):
+        await dapr_client.aclose()
+    elif dapr_client:
+        dapr_client.close()
 
 
 # Create FastAPI app
@@ -84,13 +214,21 @@ app = FastAPI(
     description="Sender microservice for Dapr demo",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
+if metrics is not None:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
 
 
 @app.get("/healthz", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    return HealthResponse(status="healthy", service="micro-one", version="1.0.0")
+    return HealthResponse(
+        status="healthy",
+        service="micro-one",
+        version="1.0.0",
+        outbox=OutboxStats(**outbox.stats()) if outbox is not None else None,
+    )
 
 
 @app.get("/")
@@ -102,30 +240,63 @@ async def root():
         "endpoints": {
             "health": "/healthz",
             "send_message": "/send-message",
+            "send_messages": "/send-messages",
+            "fanout": "/send-message/fanout",
+            "circuit_breakers": "/circuit-breakers",
+            "metrics": "/metrics",
             "docs": "/docs",
         },
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/send-message", response_model=MessageResponse)
-async def send_message(request: MessageRequest):
+@timed_handler
+async def send_message(request: MessageRequest, http_response: Response):
     """Send a message to another microservice via Dapr"""
     message_id = str(uuid.uuid4())
+    delivery_mode = request.delivery_mode or settings.delivery_mode
 
     logger.info(
         "Received message send request",
         message_id=message_id,
         recipient=request.recipient_id,
         message_length=len(request.message),
+        delivery_mode=delivery_mode,
     )
+    status_tracker.queued(message_id, request.recipient_id)
 
     try:
-        # Send message using Dapr service invocation
-        response = await message_service.send_message(
-            recipient_service=request.recipient_id,
-            message=request.message,
-            message_id=message_id,
-        )
+        if delivery_mode == "pubsub":
+            # Publish to the topic; micro-two consumes it asynchronously
+            response = await message_service.publish_message(
+                message=request.message,
+                message_id=message_id,
+                recipient_service=request.recipient_id,
+                pubsub_name=settings.pubsub_name,
+                topic=settings.pubsub_topic,
+            )
+        elif outbox is not None:
+            # Acknowledge once logged; the outbox delivers it in the background
+            await outbox.add(message_id, request.recipient_id, request.message)
+            http_response.status_code = 202
+            return MessageResponse(
+                status="queued", message_id=message_id, sent_to=request.recipient_id
+            )
+        else:
+            # Send message using Dapr service invocation
+            response = await message_service.send_message_with_retry(
+                recipient_service=request.recipient_id,
+                message=request.message,
+                message_id=message_id,
+            )
 
         logger.info(
             "Message sent successfully",
@@ -135,9 +306,28 @@ async def send_message(request: MessageRequest):
         )
 
         return MessageResponse(
-            status="sent", message_id=message_id, sent_to=request.recipient_id
+            status="published" if delivery_mode == "pubsub" else "sent",
+            message_id=message_id,
+            sent_to=request.recipient_id,
         )
 
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
+    except OutboxFull as e:
+        message_service.record_failed(message_id, str(e))
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
+    except RecipientOverloadedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
     except Exception as e:
         logger.error(
             "Failed to send message",
@@ -149,16 +339,133 @@ async def send_message(request: MessageRequest):
         raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
 
 
+@app.post("/send-messages", response_model=BatchMessageResponse)
+@timed_handler
+async def send_messages(requests: List[MessageRequest]):
+    """Send a batch of messages, reporting the outcome of each item"""
+    if len(requests) > settings.send_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.send_batch_max_items} messages",
+        )
+
+    items = [
+        {
+            "recipient_service": request.recipient_id,
+            "message": request.message,
+            "message_id": str(uuid.uuid4()),
+            "delivery_mode": request.delivery_mode or settings.delivery_mode,
+        }
+        for request in requests
+    ]
+
+    logger.info("Received batch send request", batch_size=len(items))
+    for item in items:
+        status_tracker.queued(item["message_id"], item["recipient_service"])
+
+    results = await message_service.send_batch(
+        items,
+        max_concurrency=settings.send_batch_concurrency,
+        item_timeout=settings.send_batch_item_timeout,
+        pubsub_name=settings.pubsub_name,
+        topic=settings.pubsub_topic,
+        max_retries=settings.send_max_retries,
+    )
+
+    item_results = [
+        BatchItemResult(
+            status=result["status"],
+            message_id=result["message_id"],
+            sent_to=result["recipient_service"],
+            error=result.get("error"),
+        )
+        for result in results
+    ]
+    sent = sum(1 for result in item_results if result.status != "failed")
+
+    return BatchMessageResponse(
+        results=item_results, sent=sent, failed=len(item_results) - sent
+    )
+
+
+@app.post("/send-message/fanout", response_model=FanoutResponse)
+@timed_handler
+async def send_message_fanout(request: FanoutRequest):
+    """Send one message to several recipients concurrently, with partial results"""
+    recipients = list(dict.fromkeys(request.recipient_ids))
+    if len(recipients) > settings.fanout_max_recipients:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Fan-out exceeds {settings.fanout_max_recipients} recipients",
+        )
+    if request.first_k is not None and request.first_k > len(recipients):
+        raise HTTPException(
+            status_code=422,
+            detail=f"first_k {request.first_k} exceeds {len(recipients)} recipients",
+        )
+
+    targets = [
+        {"recipient_service": recipient, "message_id": str(uuid.uuid4())}
+        for recipient in recipients
+    ]
+    logger.info(
+        "Received fan-out send request",
+        recipients=len(targets),
+        first_k=request.first_k,
+        message_length=len(request.message),
+    )
+    for target in targets:
+        status_tracker.queued(target["message_id"], target["recipient_service"])
+
+    results = await message_service.send_fanout(
+        request.message,
+        targets,
+        recipient_timeout=request.recipient_timeout
+        or settings.fanout_recipient_timeout,
+        first_k=request.first_k,
+        max_retries=settings.send_max_retries,
+    )
+
+    item_results = [
+        FanoutItemResult(
+            status=result["status"],
+            message_id=result["message_id"],
+            sent_to=result["recipient_service"],
+            latency_ms=result.get("latency_ms"),
+            error=result.get("error"),
+        )
+        for result in results
+    ]
+    counts = {"sent": 0, "failed": 0, "cancelled": 0}
+    for result in item_results:
+        counts[result.status] += 1
+
+    return FanoutResponse(
+        results=item_results,
+        **counts,
+        complete=counts["sent"] >= (request.first_k or len(item_results)),
+    )
+
+
+@app.get("/circuit-breakers")
+async def get_circuit_breakers():
+    """Current circuit breaker state for each recipient"""
+    return circuit_breakers.snapshot()
+
+
 @app.get("/messages/status/{message_id}")
 async def get_message_status(message_id: str):
-    """Get the status of a sent message"""
-    # In a real application, you might store message status in a database
-    # For this demo, we'll return a simple response
-    return {
-        "message_id": message_id,
-        "status": "delivered",
-        "timestamp": "2024-01-01T00:00:00Z",
-    }
+    """Get the delivery status of a sent message"""
+    status = status_tracker.get(message_id)
+    if status is None and settings.status_state_store and message_service:
+        # Fall back to statuses persisted before a restart
+        status = await message_service.load_status(message_id)
+
+    if status is None:
+        raise HTTPException(
+            status_code=404, detail=f"No status recorded for message {message_id}"
+        )
+    return status
 
 
 if __name__ == "__main__":
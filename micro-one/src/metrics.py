@@ -0,0 +1,381 @@
+"""
+Metrics for Micro-One
+In-process counters, gauges and histograms exposed in the Prometheus text format.
+"""
+
+import functools
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; sub-millisecond buckets resolve in-process stages
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds spent inside @timed_handler endpoints during the current request
+_handler_seconds: ContextVar[Optional[List[float]]] = ContextVar(
+    "handler_seconds", default=None
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from ``function`` whenever the gauge is rendered"""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # One slot per bucket plus the implicit +Inf bucket
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    """
+    A named metric with optional labels
+
+    Updates are plain attribute arithmetic and are only made from the event
+    loop thread, so no locking is needed.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values: str):
+        """Return the child for one combination of label values"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} "
+            f"{_format_value(child.value)}"
+            for values, child in self._children.items()
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._default.set_function(function)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} "
+            f"{_format_value(child.get())}"
+            for values, child in self._children.items()
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        bucket_labels = self.labelnames + ("le",)
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(bucket_labels, values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self, namespace: str = ""):
+        self.namespace = namespace
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self._register(Counter(self._full_name(name), documentation, labelnames))
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        return self._register(Gauge(self._full_name(name), documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(
+            Histogram(self._full_name(name), documentation, labelnames, buckets)
+        )
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed_handler(endpoint: Callable) -> Callable:
+    """
+    Attribute an async endpoint's own run time to the "handler" stage
+
+    The rest of the request, measured by MetricsMiddleware, is reported as the
+    "framework" stage: routing, body parsing, validation and response rendering.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = perf_counter()
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            spent = _handler_seconds.get()
+            if spent is not None:
+                spent[0] += perf_counter() - started
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request duration by route and status"""
+
+    def __init__(self, app: Callable, metrics: "ServiceMetrics"):
+        self.app = app
+        self.metrics = metrics
+        self._requests: Dict[Tuple[str, str, int], _HistogramChild] = {}
+        self._handler = metrics.stage_seconds.labels("handler")
+        self._framework = metrics.stage_seconds.labels("framework")
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        spent = [0.0]
+        token = _handler_seconds.set(spent)
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - started
+            _handler_seconds.reset(token)
+            route = scope.get("route")
+            key = (
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status,
+            )
+            child = self._requests.get(key)
+            if child is None:
+                child = self._requests[key] = self.metrics.http_request_seconds.labels(
+                    key[0], key[1], str(status)
+                )
+            child.observe(elapsed)
+            if spent[0]:
+                self._handler.observe(spent[0])
+                self._framework.observe(elapsed - spent[0])
+
+
+class ServiceMetrics:
+    """The metrics recorded by Micro-One"""
+
+    def __init__(self, registry: Optional[Registry] = None):
+        self.registry = registry or Registry(namespace="micro_one")
+        self.http_request_seconds = self.registry.histogram(
+            "http_request_duration_seconds",
+            "HTTP request duration by method, route and status",
+            ("method", "route", "status"),
+        )
+        self.stage_seconds = self.registry.histogram(
+            "stage_duration_seconds",
+            "Time spent in each stage of message handling",
+            ("stage",),
+        )
+        self._stages: Dict[str, _HistogramChild] = {}
+        self.dapr_call_seconds = self.registry.histogram(
+            "dapr_call_duration_seconds",
+            "Dapr client call duration by client method",
+            ("method",),
+        )
+        self.messages_total = self.registry.counter(
+            "messages_total", "Messages by final delivery outcome", ("outcome",)
+        )
+        self.errors_total = self.registry.counter(
+            "message_errors_total", "Failed delivery attempts by stage", ("stage",)
+        )
+        self.retries_total = self.registry.counter(
+            "message_retries_total", "Delivery attempts retried after a failure"
+        )
+        self.coalesced_batch_size = self.registry.histogram(
+            "coalesced_batch_size",
+            "Sends per coalesced call to a recipient",
+            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+        )
+        self.outbox_pending = self.registry.gauge(
+            "outbox_pending", "Sends accepted into the outbox and not yet delivered"
+        )
+        self.log_records_dropped_total = self.registry.counter(
+            "log_records_dropped_total",
+            "Info and debug log records dropped while the log queue was full",
+        )
+
+    def stage(self, name: str, seconds: float) -> None:
+        """Record time spent in a named stage"""
+        child = self._stages.get(name)
+        if child is None:
+            child = self._stages[name] = self.stage_seconds.labels(name)
+        child.observe(seconds)
+
+    def render(self) -> str:
+        return self.registry.render()
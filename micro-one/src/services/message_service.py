@@ -3,20 +3,367 @@ Message Service for Micro-One
 Handles sending messages to other microservices using Dapr service invocation.
 """
 
-import json
-from typing import Dict, Any, Optional
+import asyncio
+import contextvars
+import functools
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 import structlog
 from dapr.clients import DaprClient
 
+from ..compression import CODECS, accepted, compress, decompress, sniff
+from ..metrics import ServiceMetrics
+from ..protos import messages_pb2
+from ..serialization import dumps, loads
+from .resilience import (
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    RecipientOverloadedError,
+    RetryPolicy,
+    overload_retry_after,
+)
+from .send_coalescer import SendCoalescer
+from .status_tracker import MessageStatusTracker
+
 logger = structlog.get_logger(__name__)
 
+# Set in the tasks of a fan-out; once ``abandoned`` is true, cancelling them
+# means their result is no longer needed, not that the recipient was too slow
+_fanout: contextvars.ContextVar[Optional[SimpleNamespace]] = contextvars.ContextVar(
+    "fanout", default=None
+)
+
 
 class MessageService:
     """Service for handling message operations via Dapr"""
 
-    def __init__(self, dapr_client: DaprClient):
+    def __init__(
+        self,
+        dapr_client: DaprClient,
+        max_workers: int = 32,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        status_tracker: Optional[MessageStatusTracker] = None,
+        status_store_name: Optional[str] = None,
+        metrics: Optional[ServiceMetrics] = None,
+        invoke_protocol: str = "http",
+        compression_codec: Optional[str] = None,
+        compression_threshold: int = 1024,
+        coalesce_window: float = 0.0,
+        coalesce_max_batch: int = 64,
+        batch_method: str = "receive-messages",
+    ):
+        """
+        Args:
+            dapr_client: Client used for service invocation and pub/sub
+            max_workers: Threads available for blocking Dapr client calls
+            retry_policy: Backoff policy for send_message_with_retry
+            circuit_breakers: Per-recipient circuit breakers
+            status_tracker: Records the delivery lifecycle of each message
+            status_store_name: State store that final statuses are persisted to
+            metrics: Where Dapr call timings and delivery outcomes are recorded
+            invoke_protocol: "http" to POST JSON to the recipient's route, or
+                "grpc" to send protobuf to its gRPC app callback
+            compression_codec: Codec for JSON request bodies of at least
+                ``compression_threshold`` bytes, used once the recipient has
+                advertised it (None disables compression)
+            compression_threshold: Smallest request body compressed
+            coalesce_window: Seconds a send to the "receive-message" route
+                waits for concurrent sends to the same recipient, which then go
+                as one call to ``batch_method`` (0 disables coalescing)
+            coalesce_max_batch: Sends that make a batch full, sent at once
+            batch_method: The recipient's route accepting a batch of messages
+        """
+        if invoke_protocol not in ("http", "grpc"):
+            raise ValueError(f"Unknown invoke protocol {invoke_protocol!r}")
+        if compression_codec is not None and compression_codec not in CODECS:
+            raise ValueError(
+                f"Unsupported codec {compression_codec!r}, available: {CODECS}"
+            )
+        if coalesce_window > 0 and invoke_protocol != "http":
+            raise ValueError("Coalescing sends needs the http invoke protocol")
         self.dapr_client = dapr_client
+        self.invoke_protocol = invoke_protocol
+        self.compression_codec = compression_codec
+        self.compression_threshold = compression_threshold
+        # Codecs each recipient accepts, from the Accept-Encoding it replied with
+        self._recipient_codecs: Dict[str, List[str]] = {}
+        self._accept_encoding = ", ".join(
+            sorted(CODECS, key=lambda codec: codec != compression_codec)
+        )
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breakers = circuit_breakers or CircuitBreakerRegistry()
+        if status_tracker is None:
+            status_tracker = MessageStatusTracker()
+        self.status_tracker = status_tracker
+        self.status_store_name = status_store_name
+        self.metrics = metrics
+        self.batch_method = batch_method
+        self._coalescer = (
+            SendCoalescer(
+                self._invoke_batch,
+                window=coalesce_window,
+                max_batch=coalesce_max_batch,
+                metrics=metrics,
+            )
+            if coalesce_window > 0
+            else None
+        )
+        self._status_writes: Set[asyncio.Task] = set()
+        # The synchronous Dapr client blocks on every call, so those calls are
+        # pushed onto a bounded pool to keep the event loop free.
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dapr-invoke"
+        )
+
+    async def _call_dapr(self, client_method: str, /, **kwargs: Any) -> Any:
+        """
+        Call a Dapr client method without blocking the event loop
+
+        Async clients (e.g. ``dapr.aio.clients.DaprClient``) are awaited directly;
+        synchronous clients run on the service's bounded executor.
+        """
+        method = getattr(self.dapr_client, client_method)
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(method):
+                return await method(**kwargs)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(method, **kwargs)
+            )
+        finally:
+            if self.metrics is not None:
+                self.metrics.dapr_call_seconds.labels(client_method).observe(
+                    time.perf_counter() - started
+                )
+
+    def _count(
+        self, outcome: Optional[str] = None, error_stage: Optional[str] = None
+    ) -> None:
+        """Count a final delivery outcome and/or the stage that failed"""
+        if self.metrics is None:
+            return
+        if outcome is not None:
+            self.metrics.messages_total.labels(outcome).inc()
+        if error_stage is not None:
+            self.metrics.errors_total.labels(error_stage).inc()
+
+    async def _invoke_recipient(self, recipient_service: str, **kwargs: Any) -> Any:
+        """
+        Invoke a recipient through its circuit breaker
+
+        Raises:
+            CircuitOpenError: The recipient's circuit is open
+            RecipientOverloadedError: The recipient shed the call
+        """
+        breaker = self.circuit_breakers.get(recipient_service)
+        breaker.before_call()
+        try:
+            response = await self._call_dapr(
+                "invoke_method", app_id=recipient_service, **kwargs
+            )
+        except asyncio.CancelledError:
+            fanout = _fanout.get()
+            if fanout is not None and fanout.abandoned:
+                breaker.record_abandoned()
+            else:
+                breaker.record_failure()
+            raise
+        except BaseException as e:
+            retry_after = overload_retry_after(e)
+            if retry_after is not None:
+                # The recipient answered, so this is no reason to open its
+                # circuit; its Retry-After paces the sender instead
+                breaker.record_success()
+                raise RecipientOverloadedError(recipient_service, retry_after) from e
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return response
+
+    @staticmethod
+    def _build_payload(message: str, message_id: str) -> Dict[str, Any]:
+        return {
+            "message": message,
+            "message_id": message_id,
+            "sender": "micro-one",
+            "timestamp": "2024-01-01T00:00:00Z",  # In real app, use datetime.utcnow().isoformat()
+        }
+
+    def _invoke_body(
+        self, payload: Dict[str, Any], recipient_service: str
+    ) -> Dict[str, Any]:
+        """invoke_method arguments carrying ``payload`` in the configured framing"""
+        if self.invoke_protocol == "grpc":
+            # Without an HTTP verb Dapr delivers the packed message to OnInvoke
+            return {"data": messages_pb2.IncomingMessage(**payload)}
+        body = dumps(payload)
+        kwargs = {"content_type": "application/json", "http_verb": "POST"}
+        if self.compression_codec is not None:
+            # Dapr forwards invocation metadata to the recipient as headers
+            metadata: List[Tuple[str, str]] = [
+                ("accept-encoding", self._accept_encoding)
+            ]
+            if len(body) >= self.compression_threshold and (
+                self.compression_codec
+                in self._recipient_codecs.get(recipient_service, ())
+            ):
+                body = compress(body, self.compression_codec)
+                metadata.append(("content-encoding", self.compression_codec))
+            kwargs["metadata"] = tuple(metadata)
+        return {"data": body, **kwargs}
+
+    @staticmethod
+    def _header(response: Any, name: str) -> str:
+        """A response header forwarded by Dapr, or "" when there is none"""
+        values = response.headers.get(name) or ()
+        return ",".join(
+            value.decode() if isinstance(value, bytes) else value for value in values
+        )
+
+    def _parse_response(self, response: Any, recipient_service: str) -> Dict[str, Any]:
+        """The recipient's reply as the dict its JSON route would return"""
+        if self.invoke_protocol == "grpc":
+            reply = messages_pb2.MessageResponse()
+            response.unpack(reply)
+            return {
+                "status": reply.status,
+                "message_id": reply.message_id,
+                "processed_at": reply.processed_at,
+                "response_message": reply.response_message,
+            }
+        data = response.data
+        if self.compression_codec is not None:
+            advertised = self._header(response, "accept-encoding")
+            if advertised:
+                self._recipient_codecs[recipient_service] = accepted(advertised)
+            codec = self._header(response, "content-encoding") or sniff(data)
+            if codec and codec != "identity":
+                data = decompress(data, codec)
+        if data:
+            return loads(data)
+        return {"status": "success", "message": "No response data"}
+
+    async def _invoke_single(
+        self, recipient_service: str, method: str, payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        response = await self._invoke_recipient(
+            recipient_service,
+            method_name=method,
+            **self._invoke_body(payload, recipient_service),
+        )
+        return self._parse_response(response, recipient_service)
+
+    async def _invoke_batch(
+        self, recipient_service: str, payloads: List[Dict[str, Any]]
+    ) -> List[Any]:
+        """
+        Send coalesced payloads in one call, see SendCoalescer
+
+        Returns:
+            Per payload, the recipient's reply or the exception to raise for it
+        """
+        if len(payloads) == 1:
+            return [
+                await self._invoke_single(
+                    recipient_service, "receive-message", payloads[0]
+                )
+            ]
+        response_data = await self._invoke_single(
+            recipient_service, self.batch_method, {"messages": payloads}
+        )
+        results = {
+            item["message_id"]: item for item in response_data.get("results", ())
+        }
+        return [
+            self._batch_item_result(
+                recipient_service, results.get(payload["message_id"])
+            )
+            for payload in payloads
+        ]
+
+    @staticmethod
+    def _batch_item_result(
+        recipient_service: str, item: Optional[Dict[str, Any]]
+    ) -> Any:
+        """One message's reply from a batch, as its route would return it"""
+        if item is None:
+            return RuntimeError(f"{recipient_service} returned no result")
+        if item.get("status") == "overloaded":
+            return RecipientOverloadedError(
+                recipient_service, float(item.get("retry_after") or 0)
+            )
+        if item.get("status") == "failed":
+            return RuntimeError(item.get("error") or "Failed to process message")
+        return {key: value for key, value in item.items() if value is not None}
+
+    def _persist_status(self, record: Optional[Dict[str, Any]]) -> None:
+        """Save a final status to the state store without delaying the caller"""
+        if record is None or self.status_store_name is None:
+            return
+        task = asyncio.create_task(self._save_status(record))
+        self._status_writes.add(task)
+        task.add_done_callback(self._status_writes.discard)
+
+    async def _save_status(self, record: Dict[str, Any]) -> None:
+        try:
+            await self._call_dapr(
+                "save_state",
+                store_name=self.status_store_name,
+                key=f"status_{record['message_id']}",
+                value=dumps(record),
+            )
+        except Exception as e:
+            logger.warning(
+                "Failed to persist message status",
+                message_id=record["message_id"],
+                error=str(e),
+            )
+
+    async def load_status(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a persisted message status from the state store
+
+        Args:
+            message_id: Unique identifier for the message
+
+        Returns:
+            The last persisted status record, or None if there is none
+        """
+        if self.status_store_name is None:
+            return None
+        try:
+            response = await self._call_dapr(
+                "get_state",
+                store_name=self.status_store_name,
+                key=f"status_{message_id}",
+            )
+        except Exception as e:
+            logger.warning(
+                "Failed to load message status", message_id=message_id, error=str(e)
+            )
+            return None
+        return loads(response.data) if response.data else None
+
+    async def flush_status_writes(self) -> None:
+        """Wait for outstanding status writes to the state store"""
+        if self._status_writes:
+            await asyncio.gather(*self._status_writes, return_exceptions=True)
+
+    def record_failed(self, message_id: str, error: str) -> None:
+        """Record that a message delivered by the caller has been given up"""
+        self._persist_status(self.status_tracker.failed(message_id, error))
+        self._count("failed")
+
+    def close(self) -> None:
+        """Release the executor used for blocking Dapr calls"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
 
     async def send_message(
         self,
@@ -37,12 +384,7 @@ class MessageService:
         Returns:
             Response from the target service
         """
-        payload = {
-            "message": message,
-            "message_id": message_id,
-            "sender": "micro-one",
-            "timestamp": "2024-01-01T00:00:00Z",  # In real app, use datetime.utcnow().isoformat()
-        }
+        payload = self._build_payload(message, message_id)
 
         logger.info(
             "Sending message via Dapr service invocation",
@@ -50,21 +392,16 @@ class MessageService:
             message_id=message_id,
             method=method,
         )
+        self.status_tracker.in_flight(message_id, recipient_service)
 
         try:
             # Use Dapr service invocation to call the target service
-            response = self.dapr_client.invoke_method(
-                app_id=recipient_service,
-                method_name=method,
-                data=json.dumps(payload),
-                http_verb="POST",
-            )
-
-            # Parse response
-            if response.data:
-                response_data = json.loads(response.data)
+            if self._coalescer is not None and method == "receive-message":
+                response_data = await self._coalescer.submit(recipient_service, payload)
             else:
-                response_data = {"status": "success", "message": "No response data"}
+                response_data = await self._invoke_single(
+                    recipient_service, method, payload
+                )
 
             logger.info(
                 "Message sent successfully via Dapr",
@@ -72,10 +409,28 @@ class MessageService:
                 message_id=message_id,
                 response_status=response_data.get("status", "unknown"),
             )
+            self._persist_status(self.status_tracker.delivered(message_id))
+            self._count("delivered")
 
             return response_data
 
+        except CircuitOpenError as e:
+            self.status_tracker.attempt_failed(message_id, str(e))
+            self._count(error_stage="circuit_open")
+            raise
+        except RecipientOverloadedError as e:
+            logger.warning(
+                "Recipient overloaded, message refused",
+                recipient_service=recipient_service,
+                message_id=message_id,
+                retry_after=e.retry_after,
+            )
+            self.status_tracker.attempt_failed(message_id, str(e))
+            self._count(error_stage="overloaded")
+            raise
         except Exception as e:
+            # Send uncompressed until the recipient advertises its codecs again
+            self._recipient_codecs.pop(recipient_service, None)
             logger.error(
                 "Failed to send message via Dapr",
                 recipient_service=recipient_service,
@@ -83,55 +438,338 @@ class MessageService:
                 error=str(e),
                 exc_info=True,
             )
+            self.status_tracker.attempt_failed(message_id, str(e))
+            self._count(error_stage="invoke")
             raise
 
+    async def publish_message(
+        self,
+        message: str,
+        message_id: str,
+        recipient_service: str,
+        pubsub_name: str = "pubsub",
+        topic: str = "messages",
+    ) -> Dict[str, Any]:
+        """
+        Publish a message to a Dapr pub/sub topic
+
+        Unlike send_message this returns as soon as the broker has accepted the
+        message; subscribers process it independently of the sender.
+
+        Args:
+            message: The message content to send
+            message_id: Unique identifier for the message
+            recipient_service: The app-id the message is intended for
+            pubsub_name: Name of the Dapr pub/sub component
+            topic: Topic to publish to
+
+        Returns:
+            Publish confirmation
+        """
+        payload = self._build_payload(message, message_id)
+        payload["recipient"] = recipient_service
+
+        logger.info(
+            "Publishing message via Dapr pub/sub",
+            pubsub_name=pubsub_name,
+            topic=topic,
+            message_id=message_id,
+        )
+
+        try:
+            await self._call_dapr(
+                "publish_event",
+                pubsub_name=pubsub_name,
+                topic_name=topic,
+                data=dumps(payload),
+                data_content_type="application/json",
+            )
+        except Exception as e:
+            logger.error(
+                "Failed to publish message via Dapr",
+                pubsub_name=pubsub_name,
+                topic=topic,
+                message_id=message_id,
+                error=str(e),
+                exc_info=True,
+            )
+            self._persist_status(self.status_tracker.failed(message_id, str(e)))
+            self._count("failed", error_stage="publish")
+            raise
+
+        self._persist_status(self.status_tracker.published(message_id))
+        self._count("published")
+        return {"status": "published", "message_id": message_id, "topic": topic}
+
     async def send_message_with_retry(
         self,
         recipient_service: str,
         message: str,
         message_id: str,
-        max_retries: int = 3,
+        max_retries: Optional[int] = None,
         method: str = "receive-message",
     ) -> Dict[str, Any]:
         """
         Send a message with retry logic
 
+        Failed attempts are retried after an exponential, jittered backoff
+        until ``max_retries`` is exhausted or the retry policy's deadline would
+        be exceeded. A recipient that sheds load is not retried before the
+        Retry-After it sent. An open circuit for the recipient fails immediately.
+
         Args:
             recipient_service: The app-id of the target service
             message: The message content to send
             message_id: Unique identifier for the message
-            max_retries: Maximum number of retry attempts
+            max_retries: Maximum number of retry attempts (defaults to the policy's)
             method: The HTTP method/endpoint on the target service
 
         Returns:
             Response from the target service
         """
+        policy = self.retry_policy
+        if max_retries is None:
+            max_retries = policy.max_retries
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + policy.deadline if policy.deadline else None
         last_exception = None
 
         for attempt in range(max_retries + 1):
+            remaining = None if deadline is None else deadline - loop.time()
             try:
-                return await self.send_message(
+                return await asyncio.wait_for(
+                    self.send_message(
+                        recipient_service=recipient_service,
+                        message=message,
+                        message_id=message_id,
+                        method=method,
+                    ),
+                    timeout=remaining,
+                )
+            except CircuitOpenError as e:
+                logger.warning(
+                    "Circuit open, not sending message",
                     recipient_service=recipient_service,
-                    message=message,
                     message_id=message_id,
-                    method=method,
+                    retry_after=round(e.retry_after, 3),
                 )
+                self._persist_status(self.status_tracker.failed(message_id, str(e)))
+                self._count("failed")
+                raise
             except Exception as e:
+                if isinstance(e, asyncio.TimeoutError) and not str(e):
+                    # wait_for's own timeout: the deadline ran out mid-attempt
+                    e = asyncio.TimeoutError(
+                        f"Retry deadline of {policy.deadline}s exceeded "
+                        f"after {attempt + 1} attempts"
+                    )
                 last_exception = e
-                if attempt < max_retries:
+                delay = policy.backoff(attempt)
+                if isinstance(e, RecipientOverloadedError):
+                    delay = max(delay, e.retry_after)
+                if attempt < max_retries and (
+                    deadline is None or loop.time() + delay < deadline
+                ):
                     logger.warning(
                         "Message send attempt failed, retrying",
                         attempt=attempt + 1,
                         max_retries=max_retries,
                         message_id=message_id,
+                        delay=round(delay, 3),
                         error=str(e),
                     )
-                else:
-                    logger.error(
-                        "All message send attempts failed",
-                        attempts=max_retries + 1,
-                        message_id=message_id,
-                        error=str(e),
-                    )
+                    if self.metrics is not None:
+                        self.metrics.retries_total.inc()
+                    await asyncio.sleep(delay)
+                    continue
+
+                logger.error(
+                    "All message send attempts failed",
+                    attempts=attempt + 1,
+                    message_id=message_id,
+                    error=str(e),
+                )
+                self._persist_status(self.status_tracker.failed(message_id, str(e)))
+                self._count("failed")
+                break
 
         raise last_exception
+
+    async def send_batch(
+        self,
+        messages: List[Dict[str, str]],
+        max_concurrency: int = 16,
+        item_timeout: Optional[float] = None,
+        method: str = "receive-message",
+        pubsub_name: str = "pubsub",
+        topic: str = "messages",
+        max_retries: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Send a batch of messages with bounded concurrency
+
+        Each item is sent independently: a failure or timeout is reported in
+        that item's result and does not affect the others.
+
+        Args:
+            messages: Items with ``recipient_service``, ``message``, ``message_id``
+                and optionally ``delivery_mode`` (``"invoke"`` or ``"pubsub"``)
+            max_concurrency: Maximum number of sends in flight at once
+            item_timeout: Seconds to wait for a single send before failing it
+            method: The HTTP method/endpoint on the target services
+            pubsub_name: Pub/sub component used for ``"pubsub"`` items
+            topic: Topic used for ``"pubsub"`` items
+            max_retries: Retries per invoked item, following the retry policy
+
+        Returns:
+            One result per item, in the order the items were given
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def send_one(item: Dict[str, str]) -> Dict[str, Any]:
+            result = {
+                "message_id": item["message_id"],
+                "recipient_service": item["recipient_service"],
+            }
+            if item.get("delivery_mode") == "pubsub":
+                send = self.publish_message(
+                    message=item["message"],
+                    message_id=item["message_id"],
+                    recipient_service=item["recipient_service"],
+                    pubsub_name=pubsub_name,
+                    topic=topic,
+                )
+                status = "published"
+            else:
+                send = self.send_message_with_retry(
+                    recipient_service=item["recipient_service"],
+                    message=item["message"],
+                    message_id=item["message_id"],
+                    max_retries=max_retries,
+                    method=method,
+                )
+                status = "sent"
+
+            async with semaphore:
+                try:
+                    response = await asyncio.wait_for(send, timeout=item_timeout)
+                    result.update(status=status, response=response)
+                except asyncio.TimeoutError:
+                    error = f"Timed out after {item_timeout}s"
+                    self._persist_status(
+                        self.status_tracker.failed(item["message_id"], error)
+                    )
+                    self._count("failed", error_stage="timeout")
+                    result.update(status="failed", error=error)
+                except Exception as e:
+                    result.update(status="failed", error=str(e))
+            return result
+
+        results = await asyncio.gather(*(send_one(item) for item in messages))
+
+        logger.info(
+            "Message batch dispatched",
+            batch_size=len(results),
+            failed=sum(1 for result in results if result["status"] == "failed"),
+        )
+
+        return list(results)
+
+    async def send_fanout(
+        self,
+        message: str,
+        targets: List[Dict[str, str]],
+        recipient_timeout: Optional[float] = None,
+        first_k: Optional[int] = None,
+        method: str = "receive-message",
+        max_retries: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Send one message to several recipients at once (scatter-gather)
+
+        Waits for every recipient, or only until ``first_k`` of them have the
+        message, so the total time is that of the slowest recipient waited
+        for. Sends still running then are cancelled and reported as
+        ``"cancelled"``, or ``"failed"`` once ``recipient_timeout`` has passed.
+        One already handed to Dapr may still arrive, so its status is tracked
+        as ``cancelled`` or ``unknown`` rather than ``failed``.
+
+        Args:
+            message: The message content to send
+            targets: One item per recipient with ``recipient_service`` and
+                the ``message_id`` its copy is tracked under
+            recipient_timeout: Seconds to wait for each recipient
+            first_k: Return once this many recipients have the message
+            method: The HTTP method/endpoint on the target services
+            max_retries: Retries per recipient, following the retry policy
+
+        Returns:
+            One result per target, in the order the targets were given
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + recipient_timeout if recipient_timeout else None
+        fanout = SimpleNamespace(abandoned=False)
+        context = contextvars.copy_context()
+        context.run(_fanout.set, fanout)
+
+        results = {}
+        for target in targets:
+            task = asyncio.create_task(
+                self.send_message_with_retry(
+                    recipient_service=target["recipient_service"],
+                    message=message,
+                    message_id=target["message_id"],
+                    max_retries=max_retries,
+                    method=method,
+                ),
+                context=context,
+            )
+            results[task] = dict(target)
+
+        sent = 0
+        pending = set(results)
+        while pending and (first_k is None or sent < first_k):
+            timeout = None if deadline is None else deadline - loop.time()
+            if timeout is not None and timeout <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                result = results[task]
+                result["latency_ms"] = round((loop.time() - started) * 1000, 3)
+                try:
+                    result.update(status="sent", response=task.result())
+                    sent += 1
+                except Exception as e:
+                    result.update(status="failed", error=str(e))
+
+        if pending:
+            if first_k is not None and sent >= first_k:
+                fanout.abandoned = True
+                status, outcome, stage = "cancelled", "cancelled", "cancelled"
+                finish = self.status_tracker.cancelled
+                error = f"Not awaited once {first_k} recipients had the message"
+            else:
+                status, outcome, stage = "failed", "unknown", "timeout"
+                finish = self.status_tracker.unknown
+                error = f"Timed out after {recipient_timeout}s"
+            for task in pending:
+                task.cancel()
+                result = results[task]
+                self._persist_status(finish(result["message_id"], error))
+                self._count(outcome, error_stage=stage)
+                result.update(status=status, error=error)
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        logger.info(
+            "Message fanned out",
+            recipients=len(results),
+            sent=sent,
+            first_k=first_k,
+            elapsed_ms=round((loop.time() - started) * 1000, 3),
+        )
+
+        return list(results.values())
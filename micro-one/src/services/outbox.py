@@ -0,0 +1,250 @@
+"""
+Outbox for Micro-One
+File-backed log of accepted sends, delivered in the background and recovered
+after a restart.
+"""
+
+import asyncio
+import fcntl
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import structlog
+
+from ..metrics import ServiceMetrics
+from ..serialization import dumps, loads
+from .resilience import RecipientOverloadedError, RetryPolicy
+
+logger = structlog.get_logger(__name__)
+
+
+class OutboxFull(Exception):
+    """Raised instead of accepting a send while the outbox holds its maximum"""
+
+    def __init__(self, pending: int):
+        super().__init__(f"Outbox holds {pending} undelivered messages")
+        self.pending = pending
+
+
+class Outbox:
+    """
+    Append-only log of sends, each delivered by one of ``concurrency`` workers
+
+    A send is acknowledged once its entry is written to the log. The entry is
+    marked done when delivery succeeds or is given up. Failed deliveries are
+    retried after the policy's backoff, or the recipient's Retry-After, for
+    as long as it takes (or ``max_attempts``). Entries not yet marked done when
+    the process stops are delivered again after the next start, so a
+    recipient may see a message twice.
+
+    The log holds JSON lines. It is rewritten with only the undelivered entries
+    once done entries dominate it. One process must own a log file; it holds
+    a lock on ``<path>.lock`` while started, so a second one fails to start.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        deliver: Callable[[Dict[str, Any]], Awaitable[Any]],
+        concurrency: int = 8,
+        max_pending: int = 100000,
+        max_attempts: int = 0,
+        fsync: bool = False,
+        retry_policy: Optional[RetryPolicy] = None,
+        on_give_up: Optional[Callable[[Dict[str, Any], str], None]] = None,
+        compact_min_entries: int = 1000,
+        metrics: Optional[ServiceMetrics] = None,
+    ):
+        """
+        Args:
+            path: File the log is kept in; created if missing
+            deliver: Coroutine function delivering one entry, raising on failure
+            concurrency: Worker tasks delivering entries at once
+            max_pending: Undelivered entries held before sends are refused
+            max_attempts: Delivery attempts per entry (0 retries until delivered)
+            fsync: Whether each accepted entry is synced to disk before it
+                is acknowledged, rather than left to the OS
+            retry_policy: Backoff between delivery attempts of an entry
+            on_give_up: Called with an entry and the last error when its
+                attempts are exhausted
+            compact_min_entries: Done entries in the log before it is rewritten
+            metrics: Where the pending count is exported
+        """
+        self.path = path
+        self.deliver = deliver
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.fsync = fsync
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.on_give_up = on_give_up
+        self.compact_min_entries = compact_min_entries
+        # Undelivered entries by message_id, in the order they were accepted
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._done_in_log = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # Entries waiting out a backoff, by message_id
+        self._retries: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._file = None
+        self._lock = None
+        self.counts = {"accepted": 0, "delivered": 0, "given_up": 0, "recovered": 0}
+        if metrics is not None:
+            metrics.outbox_pending.set_function(lambda: len(self._pending))
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        """
+        Recover undelivered entries from the log and start the workers
+
+        Raises:
+            RuntimeError: Another process has the log
+        """
+        self._lock = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(self._lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            self._lock = None
+            raise RuntimeError(f"Outbox log {self.path} is used by another process")
+        self._recover()
+        self._rewrite()
+        for entry in self._pending.values():
+            self._queue.put_nowait(entry)
+        self.counts["recovered"] = len(self._pending)
+        if self._pending:
+            logger.info("Recovered undelivered messages", count=len(self._pending))
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"outbox-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def close(self) -> None:
+        """Stop delivering; undelivered entries stay in the log for next start"""
+        for handle in self._retries.values():
+            handle.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    async def add(self, message_id: str, recipient_service: str, message: str) -> None:
+        """
+        Write a send to the log and queue it for delivery
+
+        Raises:
+            OutboxFull: ``max_pending`` entries are undelivered
+        """
+        if len(self._pending) >= self.max_pending:
+            raise OutboxFull(len(self._pending))
+        entry = {
+            "message_id": message_id,
+            "recipient_service": recipient_service,
+            "message": message,
+            "attempts": 0,
+        }
+        self._append({"op": "add", **entry})
+        if self.fsync:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, os.fsync, self._file.fileno())
+        self._pending[message_id] = entry
+        self._queue.put_nowait(entry)
+        self.counts["accepted"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": len(self._pending), **self.counts}
+
+    def _recover(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as log:
+            for line in log:
+                try:
+                    record = loads(line)
+                except ValueError:
+                    # A line torn by a crash mid-write; nothing after it was acked
+                    logger.warning("Skipping unreadable outbox entry", path=self.path)
+                    continue
+                if record.get("op") == "add":
+                    record.pop("op")
+                    self._pending[record["message_id"]] = record
+                else:
+                    self._pending.pop(record["message_id"], None)
+
+    def _rewrite(self) -> None:
+        """Replace the log with one holding only the undelivered entries"""
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "wb") as log:
+            for entry in self._pending.values():
+                log.write(dumps({"op": "add", **entry}) + b"\n")
+            log.flush()
+            os.fsync(log.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(temporary, self.path)
+        self._file = open(self.path, "ab")
+        self._done_in_log = 0
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        self._file.write(dumps(record) + b"\n")
+        self._file.flush()
+
+    def _finish(self, entry: Dict[str, Any]) -> None:
+        self._pending.pop(entry["message_id"], None)
+        self._append({"op": "done", "message_id": entry["message_id"]})
+        self._done_in_log += 1
+        if (
+            self._done_in_log >= self.compact_min_entries
+            and self._done_in_log > 2 * len(self._pending)
+        ):
+            self._rewrite()
+
+    async def _work(self) -> None:
+        while True:
+            entry = await self._queue.get()
+            if entry["message_id"] not in self._pending:
+                continue
+            entry["attempts"] += 1
+            try:
+                await self.deliver(entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._retry(entry, e)
+                continue
+            self.counts["delivered"] += 1
+            self._finish(entry)
+
+    def _retry(self, entry: Dict[str, Any], error: Exception) -> None:
+        if self.max_attempts and entry["attempts"] >= self.max_attempts:
+            logger.error(
+                "Giving up on outbox message",
+                message_id=entry["message_id"],
+                attempts=entry["attempts"],
+                error=str(error),
+            )
+            self.counts["given_up"] += 1
+            self._finish(entry)
+            if self.on_give_up is not None:
+                self.on_give_up(entry, str(error))
+            return
+
+        # An open circuit fails fast, so it is retried on the backoff alone
+        delay = self.retry_policy.backoff(min(entry["attempts"] - 1, 32))
+        if isinstance(error, RecipientOverloadedError):
+            delay = max(delay, error.retry_after)
+        loop = asyncio.get_running_loop()
+        self._retries[entry["message_id"]] = loop.call_later(
+            delay, self._requeue, entry
+        )
+
+    def _requeue(self, entry: Dict[str, Any]) -> None:
+        self._retries.pop(entry["message_id"], None)
+        self._queue.put_nowait(entry)
@@ -0,0 +1,196 @@
+"""
+Resilience helpers for Micro-One
+Retry backoff policy, per-recipient circuit breakers and overload signals for
+outbound sends.
+"""
+
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import grpc
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a recipient whose circuit is open"""
+
+    def __init__(self, recipient: str, retry_after: float):
+        super().__init__(
+            f"Circuit for {recipient} is open; retry in {retry_after:.1f}s"
+        )
+        self.recipient = recipient
+        self.retry_after = retry_after
+
+
+class RecipientOverloadedError(Exception):
+    """Raised when a recipient sheds a call and asks to be retried later"""
+
+    def __init__(self, recipient: str, retry_after: float):
+        super().__init__(f"{recipient} is overloaded; retry in {retry_after:.1f}s")
+        self.recipient = recipient
+        self.retry_after = retry_after
+
+
+def overload_retry_after(error: BaseException) -> Optional[float]:
+    """
+    The Retry-After of a call the recipient refused as overloaded
+
+    Dapr reports a recipient's HTTP 429 as gRPC RESOURCE_EXHAUSTED and passes
+    the recipient's response headers on as call metadata.
+
+    Returns:
+        Seconds to wait (0 when the recipient gave none), or None when
+        ``error`` is not an overload refusal
+    """
+    code = getattr(error, "code", None)
+    if not callable(code) or code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+        return None
+    for source in ("initial_metadata", "trailing_metadata"):
+        metadata = getattr(error, source, None)
+        for key, value in (metadata() if callable(metadata) else None) or ():
+            if key.lower() == "retry-after":
+                try:
+                    return max(0.0, float(value))
+                except ValueError:
+                    # An HTTP date rather than seconds; fall back to backoff
+                    return 0.0
+    return 0.0
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by an overall deadline"""
+
+    max_retries: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 5.0
+    multiplier: float = 2.0
+    jitter: bool = True
+    # Seconds allowed for the whole retry sequence (None for no limit)
+    deadline: Optional[float] = 10.0
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Delay before retry number ``attempt`` (0-based)
+
+        With jitter the delay is drawn uniformly from ``[0, cap]`` so that
+        clients failing together do not retry in lockstep.
+        """
+        cap = min(self.max_delay, self.base_delay * (self.multiplier**attempt))
+        return random.uniform(0, cap) if self.jitter else cap
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for a single recipient
+
+    After ``failure_threshold`` consecutive failures the circuit opens and calls
+    fail fast for ``reset_timeout`` seconds. It then lets a single trial call
+    through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.total_failures = 0
+        self.total_rejections = 0
+        self._trial_in_flight = False
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not be attempted"""
+        if self.state == OPEN:
+            remaining = self.opened_at + self.reset_timeout - self._clock()
+            if remaining > 0:
+                self.total_rejections += 1
+                raise CircuitOpenError(self.name, remaining)
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._trial_in_flight:
+                self.total_rejections += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self._trial_in_flight = False
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            self._transition(CLOSED)
+
+    def record_abandoned(self) -> None:
+        """Forget a call given up for reasons that say nothing of the recipient"""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self._trial_in_flight = False
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        if self.state == HALF_OPEN or (
+            self.state == CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.opened_at = self._clock()
+            self._transition(OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current breaker state for diagnostics"""
+        retry_after = None
+        if self.state == OPEN:
+            retry_after = max(0.0, self.opened_at + self.reset_timeout - self._clock())
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "total_rejections": self.total_rejections,
+            "retry_after": retry_after,
+        }
+
+    def _transition(self, state: str) -> None:
+        logger.warning(
+            "Circuit breaker state changed",
+            recipient=self.name,
+            previous_state=self.state,
+            state=state,
+        )
+        self.state = state
+
+
+class CircuitBreakerRegistry:
+    """Lazily created circuit breakers, one per recipient"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, recipient: str) -> CircuitBreaker:
+        breaker = self._breakers.get(recipient)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                recipient,
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout,
+            )
+            self._breakers[recipient] = breaker
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
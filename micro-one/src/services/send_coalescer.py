@@ -0,0 +1,104 @@
+"""
+Send Coalescer for Micro-One
+Groups concurrent sends to the same recipient into one batched invocation.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..metrics import ServiceMetrics
+
+# Sends one recipient's payloads; returns a result or exception per payload
+BatchSender = Callable[[str, List[Dict[str, Any]]], Awaitable[List[Any]]]
+
+
+class SendCoalescer:
+    """
+    Collects sends per recipient for up to ``window`` seconds, then sends them
+    together
+
+    A batch is sent as soon as it holds ``max_batch`` payloads or the first
+    payload in it has waited ``window`` seconds. Every caller is answered with
+    its own payload's result; a failure of the whole batched call is raised to
+    each of its callers. A caller that stops waiting does not take its payload
+    out of the batch, since it may already be on its way.
+    """
+
+    def __init__(
+        self,
+        send_batch: BatchSender,
+        window: float = 0.002,
+        max_batch: int = 64,
+        metrics: Optional[ServiceMetrics] = None,
+    ):
+        """
+        Args:
+            send_batch: Coroutine function sending a recipient's payloads
+            window: Seconds the first payload of a batch waits for others
+            max_batch: Payloads that make a batch full, sent without waiting
+            metrics: Where batch sizes are recorded
+        """
+        self.send_batch = send_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.metrics = metrics
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._sending: Set[asyncio.Task] = set()
+
+    async def submit(self, recipient: str, payload: Dict[str, Any]) -> Any:
+        """
+        Add a payload to the recipient's next batch and wait for its result
+
+        Raises:
+            Exception: The payload's own error, or that of the batched call
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(recipient, [])
+        pending.append((payload, future))
+        if len(pending) >= self.max_batch:
+            self._flush(recipient)
+        elif len(pending) == 1:
+            self._timers[recipient] = loop.call_later(
+                self.window, self._flush, recipient
+            )
+        return await future
+
+    def _flush(self, recipient: str) -> None:
+        timer = self._timers.pop(recipient, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(recipient, None)
+        if not batch:
+            return
+        if self.metrics is not None:
+            self.metrics.coalesced_batch_size.observe(len(batch))
+        task = asyncio.create_task(self._send(recipient, batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(
+        self, recipient: str, batch: List[Tuple[Dict[str, Any], asyncio.Future]]
+    ) -> None:
+        try:
+            results = await self.send_batch(
+                recipient, [payload for payload, _ in batch]
+            )
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,123 @@
+"""
+Message Status Tracker for Micro-One
+Bounded in-memory record of each sent message's delivery lifecycle.
+"""
+
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+QUEUED = "queued"
+IN_FLIGHT = "in_flight"
+DELIVERED = "delivered"
+PUBLISHED = "published"
+FAILED = "failed"
+# Sends no longer awaited, which may still arrive
+CANCELLED = "cancelled"
+UNKNOWN = "unknown"
+
+TERMINAL_STATUSES = (DELIVERED, PUBLISHED, FAILED, CANCELLED, UNKNOWN)
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class MessageStatusTracker:
+    """Message status records indexed by message_id, evicting oldest first"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Monotonic queue time per message, used to compute delivery latency
+        self._started: Dict[str, float] = {}
+        self.evicted_count = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the status record for ``message_id``"""
+        record = self._records.get(message_id)
+        return dict(record) if record is not None else None
+
+    def queued(self, message_id: str, recipient: str) -> None:
+        """Record that a message has been accepted for delivery"""
+        now = _utc_now()
+        self._records[message_id] = {
+            "message_id": message_id,
+            "recipient": recipient,
+            "status": QUEUED,
+            "attempts": 0,
+            "retries": 0,
+            "latency_ms": None,
+            "error": None,
+            "queued_at": now,
+            "updated_at": now,
+        }
+        self._started[message_id] = time.perf_counter()
+        self._evict()
+
+    def in_flight(self, message_id: str, recipient: str) -> None:
+        """Record the start of a delivery attempt"""
+        record = self._records.get(message_id)
+        if record is None:
+            self.queued(message_id, recipient)
+            record = self._records[message_id]
+
+        record["attempts"] += 1
+        record["retries"] = record["attempts"] - 1
+        self._update(record, IN_FLIGHT)
+
+    def delivered(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Record a successful delivery"""
+        return self._finish(message_id, DELIVERED)
+
+    def published(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Record that a message was handed to the pub/sub broker"""
+        return self._finish(message_id, PUBLISHED)
+
+    def failed(self, message_id: str, error: str) -> Optional[Dict[str, Any]]:
+        """Record that delivery has been given up"""
+        return self._finish(message_id, FAILED, error=error)
+
+    def cancelled(self, message_id: str, error: str) -> Optional[Dict[str, Any]]:
+        """Record that a send is no longer awaited because it is not needed"""
+        return self._finish(message_id, CANCELLED, error=error)
+
+    def unknown(self, message_id: str, error: str) -> Optional[Dict[str, Any]]:
+        """Record that a send was given up on without learning whether it arrived"""
+        return self._finish(message_id, UNKNOWN, error=error)
+
+    def attempt_failed(self, message_id: str, error: str) -> None:
+        """Record a failed attempt that may still be retried"""
+        record = self._records.get(message_id)
+        if record is not None:
+            record["error"] = error
+            record["updated_at"] = _utc_now()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._records), "evicted_count": self.evicted_count}
+
+    def _finish(self, message_id: str, status: str, error: Optional[str] = None):
+        record = self._records.get(message_id)
+        if record is None:
+            return None
+
+        started = self._started.pop(message_id, None)
+        if started is not None:
+            record["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        record["error"] = error
+        self._update(record, status)
+        return dict(record)
+
+    def _update(self, record: Dict[str, Any], status: str) -> None:
+        record["status"] = status
+        record["updated_at"] = _utc_now()
+
+    def _evict(self) -> None:
+        while len(self._records) > self.max_entries:
+            message_id, _ = self._records.popitem(last=False)
+            self._started.pop(message_id, None)
+            self.evicted_count += 1
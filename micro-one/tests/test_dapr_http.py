@@ -0,0 +1,97 @@
+"""
+Tests for the Dapr HTTP API client
+"""
+
+import importlib.util
+import json
+
+import httpx
+import pytest
+
+from app.dapr_http import DaprHttpClient
+from app.services.message_service import MessageService
+from app.services.resilience import RecipientOverloadedError
+
+
+def make_client(handler) -> DaprHttpClient:
+    return DaprHttpClient(
+        "http://sidecar:3500", api_token="token", transport=httpx.MockTransport(handler)
+    )
+
+
+async def test_message_service_invokes_over_http():
+    """MessageService sends through the HTTP client unchanged"""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200, json={"status": "received"}, headers={"accept-encoding": "gzip"}
+        )
+
+    client = make_client(handler)
+    service = MessageService(client, compression_codec="gzip")
+
+    result = await service.send_message("micro-two", "hi", "msg-1")
+
+    assert result == {"status": "received"}
+    request = requests[0]
+    assert request.method == "POST"
+    assert request.url.path == "/v1.0/invoke/micro-two/method/receive-message"
+    assert request.headers["dapr-api-token"] == "token"
+    assert request.headers["content-type"] == "application/json"
+    assert "gzip" in request.headers["accept-encoding"]
+    assert json.loads(request.content)["message_id"] == "msg-1"
+    # The recipient's advertised codecs are read from the forwarded headers
+    assert service._recipient_codecs["micro-two"] == ["gzip"]
+    service.close()
+    await client.aclose()
+
+
+async def test_recipient_429_is_an_overload():
+    """An app's 429 passed through the sidecar carries its Retry-After"""
+    client = make_client(
+        lambda request: httpx.Response(429, headers={"retry-after": "3"})
+    )
+    service = MessageService(client)
+
+    with pytest.raises(RecipientOverloadedError) as excinfo:
+        await service.send_message("micro-two", "hi", "msg-1")
+
+    assert excinfo.value.retry_after == 3.0
+    assert service.circuit_breakers.get("micro-two").state == "closed"
+    service.close()
+    await client.aclose()
+
+
+async def test_grpc_framing_is_refused():
+    client = make_client(lambda request: httpx.Response(200))
+    service = MessageService(client, invoke_protocol="grpc")
+
+    with pytest.raises(TypeError):
+        await service.send_message("micro-two", "hi", "msg-1")
+    service.close()
+    await client.aclose()
+
+
+def test_http2_without_h2_is_a_config_error(monkeypatch):
+    """Asking for HTTP/2 without h2 installed fails as the client is built"""
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util,
+        "find_spec",
+        lambda name, *args: None if name == "h2" else find_spec(name, *args),
+    )
+
+    with pytest.raises(ValueError, match="http2 extra"):
+        DaprHttpClient("http://sidecar:3500", http2=True)
+
+
+async def test_http2_client_speaks_h2_to_plain_text_sidecars():
+    """With h2 installed, a plain-text sidecar is spoken to in HTTP/2 directly"""
+    pytest.importorskip("h2")
+    client = DaprHttpClient("http://sidecar:3500", http2=True)
+
+    pool = client._client._transport._pool
+    assert pool._http2 and not pool._http1
+    await client.aclose()
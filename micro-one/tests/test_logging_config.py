@@ -0,0 +1,60 @@
+"""
+Tests for the logging configuration helpers
+"""
+
+import logging
+import queue
+
+import pytest
+import structlog
+
+from app.logging_config import EventSampler, _RecordQueueHandler, parse_sample_rates
+
+
+def test_parse_sample_rates():
+    rates = parse_sample_rates("Message sent successfully=0.1, *=0.5,bad")
+
+    assert rates == {"Message sent successfully": 0.1, "*": 0.5}
+
+
+def test_sampler_drops_info_but_keeps_warnings():
+    """Sampled events are dropped at info level only"""
+    sampler = EventSampler({"noisy": 0.0})
+
+    with pytest.raises(structlog.DropEvent):
+        sampler(None, "info", {"event": "noisy"})
+    assert sampler(None, "warning", {"event": "noisy"}) == {"event": "noisy"}
+    assert sampler(None, "error", {"event": "noisy"}) == {"event": "noisy"}
+    assert sampler(None, "info", {"event": "other"}) == {"event": "other"}
+
+
+def test_sampler_default_rate_applies_to_unlisted_events():
+    sampler = EventSampler({"*": 0.0, "kept": 1.0})
+
+    with pytest.raises(structlog.DropEvent):
+        sampler(None, "info", {"event": "anything"})
+    assert sampler(None, "info", {"event": "kept"}) == {"event": "kept"}
+
+
+def test_full_queue_writes_warnings_and_drops_info():
+    """Warnings bypass a full queue; info records are dropped and counted"""
+    written = []
+    fallback = logging.Handler()
+    fallback.emit = written.append
+    drops = []
+    handler = _RecordQueueHandler(
+        queue.Queue(maxsize=1), fallback, on_drop=lambda: drops.append(1)
+    )
+
+    def record(level, msg):
+        return logging.LogRecord("test", level, __file__, 1, msg, None, None)
+
+    handler.handle(record(logging.INFO, "queued"))
+    handler.handle(record(logging.INFO, "dropped"))
+    handler.handle(record(logging.WARNING, "warning"))
+    handler.handle(record(logging.ERROR, "error"))
+
+    assert handler.queue.get_nowait().msg == "queued"
+    assert [r.msg for r in written] == ["warning", "error"]
+    assert handler.dropped == 1
+    assert drops == [1]
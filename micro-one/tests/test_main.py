@@ -4,7 +4,7 @@ Tests for micro-one service
 
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 from app.main import app
 
@@ -52,9 +52,152 @@ def test_send_message(mock_message_service):
 
 def test_get_message_status():
     """Test get message status endpoint"""
+    from app.main import status_tracker
+
     message_id = "test-message-123"
+    status_tracker.queued(message_id, "micro-two")
+    status_tracker.in_flight(message_id, "micro-two")
+    status_tracker.delivered(message_id)
+
     response = client.get(f"/messages/status/{message_id}")
     assert response.status_code == 200
     data = response.json()
     assert data["message_id"] == message_id
-    assert "status" in data
+    assert data["status"] == "delivered"
+    assert data["latency_ms"] is not None
+
+
+def test_get_message_status_unknown():
+    """Test status of a message that was never sent"""
+    response = client.get("/messages/status/never-sent")
+    assert response.status_code == 404
+
+
+@patch("app.main.message_service")
+def test_send_messages_batch(mock_message_service):
+    """Test batch send endpoint reports per-item results"""
+
+    async def send_batch(items, **kwargs):
+        return [
+            {
+                "status": "failed" if item["message"] == "bad" else "sent",
+                "message_id": item["message_id"],
+                "recipient_service": item["recipient_service"],
+                "error": "boom" if item["message"] == "bad" else None,
+            }
+            for item in items
+        ]
+
+    mock_message_service.send_batch.side_effect = send_batch
+
+    batch = [
+        {"message": "one", "recipient_id": "micro-two"},
+        {"message": "bad", "recipient_id": "micro-three"},
+    ]
+
+    response = client.post("/send-messages", json=batch)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sent"] == 1
+    assert data["failed"] == 1
+    assert [r["sent_to"] for r in data["results"]] == ["micro-two", "micro-three"]
+    assert data["results"][1]["error"] == "boom"
+
+
+@patch("app.main.message_service")
+def test_send_message_fanout(mock_message_service):
+    """Test fan-out reports each recipient and whether first_k was reached"""
+
+    async def send_fanout(message, targets, **kwargs):
+        assert kwargs["first_k"] == 1
+        return [
+            {**targets[0], "status": "sent", "latency_ms": 5.0},
+            {**targets[1], "status": "cancelled", "error": "Not awaited"},
+        ]
+
+    mock_message_service.send_fanout.side_effect = send_fanout
+    request = {
+        "message": "Hello, everyone",
+        "recipient_ids": ["micro-two", "micro-three", "micro-two"],
+        "first_k": 1,
+    }
+
+    response = client.post("/send-message/fanout", json=request)
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["sent_to"] for r in data["results"]] == ["micro-two", "micro-three"]
+    assert (data["sent"], data["cancelled"], data["complete"]) == (1, 1, True)
+
+    request["first_k"] = 3
+    assert client.post("/send-message/fanout", json=request).status_code == 422
+
+
+@patch("app.main.message_service")
+def test_send_message_pubsub_mode(mock_message_service):
+    """Test per-request pub/sub delivery publishes instead of invoking"""
+    mock_message_service.publish_message = AsyncMock(
+        return_value={"status": "published"}
+    )
+
+    test_message = {"message": "Hello, topic!", "delivery_mode": "pubsub"}
+
+    response = client.post("/send-message", json=test_message)
+    assert response.status_code == 200
+    assert response.json()["status"] == "published"
+    kwargs = mock_message_service.publish_message.call_args.kwargs
+    assert kwargs["topic"] == "messages"
+    mock_message_service.send_message.assert_not_called()
+
+
+@patch("app.main.message_service")
+@patch("app.main.outbox")
+def test_send_message_outbox(mock_outbox, mock_message_service):
+    """Test sends are acknowledged with 202 once the outbox has logged them"""
+    from app.services.outbox import OutboxFull
+
+    mock_outbox.add = AsyncMock()
+
+    response = client.post("/send-message", json={"message": "Hello, outbox!"})
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] == "queued"
+    mock_outbox.add.assert_awaited_once_with(
+        data["message_id"], "micro-two", "Hello, outbox!"
+    )
+    mock_message_service.send_message_with_retry.assert_not_called()
+
+    mock_outbox.add = AsyncMock(side_effect=OutboxFull(1))
+    response = client.post("/send-message", json={"message": "Hello, outbox!"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_circuit_breakers_endpoint():
+    """Test circuit breaker state is exposed per recipient"""
+    from app.main import circuit_breakers
+
+    circuit_breakers.get("micro-two")
+
+    response = client.get("/circuit-breakers")
+    assert response.status_code == 200
+    assert response.json()["micro-two"]["state"] == "closed"
+
+
+@patch("app.main.message_service")
+def test_metrics_endpoint(mock_message_service):
+    """Test /metrics exposes per-route request and stage histograms"""
+    mock_message_service.send_message_with_retry = AsyncMock(
+        return_value={"status": "received"}
+    )
+    assert client.post("/send-message", json={"message": "hi"}).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert (
+        'micro_one_http_request_duration_seconds_count{method="POST",'
+        'route="/send-message",status="200"}'
+    ) in text
+    assert 'micro_one_stage_duration_seconds_count{stage="handler"}' in text
+    assert "# TYPE micro_one_messages_total counter" in text
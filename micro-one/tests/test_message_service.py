@@ -0,0 +1,508 @@
+"""
+Tests for the micro-one MessageService
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import grpc
+import pytest
+from dapr.clients.grpc._response import InvokeMethodResponse
+
+from app.metrics import ServiceMetrics
+from app.protos import messages_pb2
+from app.services.message_service import MessageService
+from app.services.resilience import (
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    RecipientOverloadedError,
+    RetryPolicy,
+)
+from app.services.status_tracker import MessageStatusTracker
+
+
+class BlockingDaprClient:
+    """Synchronous stand-in for DaprGrpcClient with a fixed call latency"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def invoke_method(self, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls.append(kwargs)
+        return SimpleNamespace(data=json.dumps({"status": "received"}).encode())
+
+
+class AsyncDaprClient:
+    """Async stand-in for dapr.aio.clients.DaprClient"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def invoke_method(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(data=b'{"status": "received"}')
+
+
+async def test_send_message_returns_recipient_response():
+    """send_message parses the recipient's JSON response"""
+    client = BlockingDaprClient(latency=0)
+    service = MessageService(client)
+
+    result = await service.send_message("micro-two", "hi", "msg-1")
+
+    assert result == {"status": "received"}
+    assert client.calls[0]["app_id"] == "micro-two"
+    assert json.loads(client.calls[0]["data"])["message_id"] == "msg-1"
+    service.close()
+
+
+async def test_grpc_protocol_sends_protobuf():
+    """With invoke_protocol="grpc" the payload and reply are protobuf messages"""
+    client = AsyncDaprClient()
+    reply = InvokeMethodResponse()
+    reply.set_data(
+        messages_pb2.MessageResponse(
+            status="received", message_id="msg-1", response_message="hi back"
+        )
+    )
+
+    async def invoke_method(**kwargs):
+        client.calls.append(kwargs)
+        return reply
+
+    client.invoke_method = invoke_method
+    service = MessageService(client, invoke_protocol="grpc")
+
+    result = await service.send_message("micro-two", "hi", "msg-1")
+
+    assert result["status"] == "received"
+    assert result["response_message"] == "hi back"
+    sent = client.calls[0]
+    assert "http_verb" not in sent
+    assert sent["data"] == messages_pb2.IncomingMessage(
+        message="hi",
+        message_id="msg-1",
+        sender="micro-one",
+        timestamp="2024-01-01T00:00:00Z",
+    )
+    service.close()
+
+
+async def test_concurrent_sends_overlap():
+    """Blocking client calls run off the event loop, so sends overlap"""
+    client = BlockingDaprClient(latency=0.1)
+    service = MessageService(client, max_workers=8)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(service.send_message("micro-two", "hi", f"msg-{i}") for i in range(8))
+    )
+    elapsed = time.perf_counter() - started
+
+    assert len(client.calls) == 8
+    assert elapsed < 0.4
+    service.close()
+
+
+async def test_async_client_is_awaited_directly():
+    """Clients with a coroutine invoke_method bypass the executor"""
+    client = AsyncDaprClient()
+    service = MessageService(client)
+
+    result = await service.send_message("micro-two", "hi", "msg-1")
+
+    assert result["status"] == "received"
+    assert len(client.calls) == 1
+    service.close()
+
+
+async def test_send_batch_isolates_failures_and_timeouts():
+    """A failing or slow item is reported without stalling the others"""
+
+    class MixedDaprClient:
+        async def invoke_method(self, **kwargs):
+            if kwargs["app_id"] == "broken":
+                raise RuntimeError("unavailable")
+            if kwargs["app_id"] == "slow":
+                await asyncio.sleep(5)
+            return SimpleNamespace(data=b'{"status": "received"}')
+
+    service = MessageService(MixedDaprClient())
+    items = [
+        {"recipient_service": app_id, "message": "hi", "message_id": f"msg-{i}"}
+        for i, app_id in enumerate(["micro-two", "broken", "slow", "micro-two"])
+    ]
+
+    results = await service.send_batch(items, max_concurrency=2, item_timeout=0.1)
+
+    assert [r["status"] for r in results] == ["sent", "failed", "failed", "sent"]
+    assert results[1]["error"] == "unavailable"
+    assert "Timed out" in results[2]["error"]
+    service.close()
+
+
+async def test_publish_message_uses_pubsub_component():
+    """publish_message sends the payload to the configured topic"""
+
+    class PublishingClient:
+        def __init__(self):
+            self.published = []
+
+        def publish_event(self, **kwargs):
+            self.published.append(kwargs)
+
+    client = PublishingClient()
+    service = MessageService(client)
+
+    result = await service.publish_message("hi", "msg-1", "micro-two")
+
+    assert result["status"] == "published"
+    event = client.published[0]
+    assert (event["pubsub_name"], event["topic_name"]) == ("pubsub", "messages")
+    assert json.loads(event["data"])["recipient"] == "micro-two"
+    service.close()
+
+
+class FlakyDaprClient:
+    """Async client that fails a fixed number of times before succeeding"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def invoke_method(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("unavailable")
+        return SimpleNamespace(data=b'{"status": "received"}')
+
+
+async def test_send_with_retry_backs_off_then_succeeds():
+    """Retries wait between attempts and eventually succeed"""
+    client = FlakyDaprClient(failures=2)
+    service = MessageService(
+        client, retry_policy=RetryPolicy(base_delay=0.05, jitter=False)
+    )
+
+    started = time.perf_counter()
+    result = await service.send_message_with_retry("micro-two", "hi", "msg-1")
+
+    assert result["status"] == "received"
+    assert client.calls == 3
+    # 0.05s + 0.1s of backoff
+    assert time.perf_counter() - started >= 0.15
+    service.close()
+
+
+async def test_send_with_retry_stops_at_deadline():
+    """No retry is attempted once its backoff would pass the deadline"""
+    client = FlakyDaprClient(failures=100)
+    service = MessageService(
+        client,
+        retry_policy=RetryPolicy(
+            max_retries=10, base_delay=0.1, jitter=False, deadline=0.25
+        ),
+    )
+
+    with pytest.raises(RuntimeError):
+        await service.send_message_with_retry("micro-two", "hi", "msg-1")
+
+    # Attempts at t=0 and t=0.1; the next backoff (0.2s) would pass 0.25s
+    assert client.calls == 2
+    service.close()
+
+
+async def test_send_with_retry_deadline_during_attempt_is_reported():
+    """An attempt cut off by the deadline leaves a real error message"""
+    service = MessageService(
+        BlockingDaprClient(latency=0.5),
+        retry_policy=RetryPolicy(max_retries=3, deadline=0.1),
+    )
+
+    with pytest.raises(asyncio.TimeoutError) as raised:
+        await service.send_message_with_retry("micro-two", "hi", "msg-1")
+
+    error = "Retry deadline of 0.1s exceeded after 1 attempts"
+    assert str(raised.value) == error
+    record = service.status_tracker.get("msg-1")
+    assert record["status"] == "failed"
+    assert record["error"] == error
+    service.close()
+
+
+async def test_open_circuit_fails_fast():
+    """Once the recipient's breaker opens, sends fail without invoking it"""
+    client = FlakyDaprClient(failures=100)
+    service = MessageService(
+        client,
+        retry_policy=RetryPolicy(max_retries=0),
+        circuit_breakers=CircuitBreakerRegistry(failure_threshold=2),
+    )
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await service.send_message_with_retry("micro-two", "hi", "msg-1")
+
+    with pytest.raises(CircuitOpenError):
+        await service.send_message_with_retry("micro-two", "hi", "msg-1")
+    assert client.calls == 2
+    service.close()
+
+
+class OverloadedRpcError(grpc.RpcError):
+    """What Dapr raises when the recipient answers 429 with Retry-After"""
+
+    def __init__(self, retry_after: str):
+        self.retry_after = retry_after
+
+    def code(self):
+        return grpc.StatusCode.RESOURCE_EXHAUSTED
+
+    def initial_metadata(self):
+        return (("retry-after", self.retry_after),)
+
+    def trailing_metadata(self):
+        return ()
+
+
+class SheddingDaprClient(FlakyDaprClient):
+    async def invoke_method(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OverloadedRpcError("0.2")
+        return SimpleNamespace(data=b'{"status": "received"}')
+
+
+async def test_overloaded_recipient_is_retried_after_retry_after():
+    """A shed call waits for Retry-After and doesn't count against the circuit"""
+    client = SheddingDaprClient(failures=2)
+    breakers = CircuitBreakerRegistry(failure_threshold=1)
+    service = MessageService(
+        client,
+        retry_policy=RetryPolicy(base_delay=0.01, jitter=False),
+        circuit_breakers=breakers,
+    )
+
+    started = time.perf_counter()
+    result = await service.send_message_with_retry("micro-two", "hi", "msg-1")
+
+    assert result["status"] == "received"
+    assert time.perf_counter() - started >= 0.4
+    assert breakers.get("micro-two").state == "closed"
+
+    client.failures, client.calls = 100, 0
+    service.retry_policy = RetryPolicy(base_delay=0.01, jitter=False, deadline=0.3)
+    with pytest.raises(RecipientOverloadedError) as excinfo:
+        await service.send_message_with_retry("micro-two", "hi", "msg-2")
+    assert excinfo.value.retry_after == 0.2
+    # The second Retry-After wait would pass the deadline
+    assert client.calls == 2
+    service.close()
+
+
+async def test_status_is_tracked_and_persisted():
+    """Final statuses are recorded locally and saved to the state store"""
+
+    class StatefulClient(FlakyDaprClient):
+        def __init__(self):
+            super().__init__(failures=1)
+            self.state = {}
+
+        def save_state(self, store_name, key, value):
+            self.state[key] = value
+
+        def get_state(self, store_name, key):
+            return SimpleNamespace(data=self.state.get(key, b""))
+
+    client = StatefulClient()
+    tracker = MessageStatusTracker()
+    service = MessageService(
+        client,
+        retry_policy=RetryPolicy(base_delay=0.01),
+        status_tracker=tracker,
+        status_store_name="statestore",
+    )
+
+    tracker.queued("msg-1", "micro-two")
+    await service.send_message_with_retry("micro-two", "hi", "msg-1")
+    await service.flush_status_writes()
+
+    assert tracker.get("msg-1")["retries"] == 1
+    # A fresh service (e.g. after a restart) can still answer from the store
+    restarted = MessageService(client, status_store_name="statestore")
+    persisted = await restarted.load_status("msg-1")
+    assert persisted["status"] == "delivered"
+    service.close()
+    restarted.close()
+
+
+async def test_metrics_count_retries_and_outcomes():
+    """Retries, failed attempts, outcomes and Dapr call timings are recorded"""
+    metrics = ServiceMetrics()
+    client = FlakyDaprClient(failures=1)
+    service = MessageService(
+        client,
+        retry_policy=RetryPolicy(base_delay=0.001, jitter=False),
+        metrics=metrics,
+    )
+
+    await service.send_message_with_retry("micro-two", "hi", "msg-1")
+
+    assert metrics.retries_total.labels().value == 1
+    assert metrics.errors_total.labels("invoke").value == 1
+    assert metrics.messages_total.labels("delivered").value == 1
+    assert sum(metrics.dapr_call_seconds.labels("invoke_method").counts) == 2
+    service.close()
+
+
+async def test_compression_is_negotiated_per_recipient():
+    """Bodies are compressed only after the recipient advertises the codec"""
+    client = AsyncDaprClient()
+
+    async def invoke_method(**kwargs):
+        client.calls.append(kwargs)
+        return InvokeMethodResponse(
+            data=gzip.compress(json.dumps({"status": "received"}).encode()),
+            headers=(("accept-encoding", "gzip"), ("content-encoding", "gzip")),
+        )
+
+    client.invoke_method = invoke_method
+    service = MessageService(
+        client, compression_codec="gzip", compression_threshold=100
+    )
+
+    first = await service.send_message("micro-two", "x" * 1000, "msg-1")
+    await service.send_message("micro-two", "x" * 1000, "msg-2")
+    await service.send_message("micro-two", "short", "msg-3")
+
+    assert first == {"status": "received"}
+    initial, negotiated, small = (dict(call["metadata"]) for call in client.calls)
+    assert initial == {"accept-encoding": "gzip"}
+    assert negotiated["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(client.calls[1]["data"]))["message_id"] == "msg-2"
+    assert "content-encoding" not in small
+    service.close()
+
+
+async def test_concurrent_sends_are_coalesced():
+    """Concurrent sends to a recipient share one call, each with its own result"""
+    client = AsyncDaprClient()
+
+    async def invoke_method(**kwargs):
+        client.calls.append(kwargs)
+        messages = json.loads(kwargs["data"]).get("messages")
+        if messages is None:
+            return SimpleNamespace(data=b'{"status": "received"}')
+        statuses = {"msg-1": "received", "msg-2": "failed", "msg-3": "overloaded"}
+        results = [
+            {
+                "status": statuses[message["message_id"]],
+                "message_id": message["message_id"],
+                "error": "boom" if message["message_id"] == "msg-2" else None,
+                "retry_after": 2,
+            }
+            for message in messages
+        ]
+        return SimpleNamespace(data=json.dumps({"results": results}).encode())
+
+    client.invoke_method = invoke_method
+    metrics = ServiceMetrics()
+    service = MessageService(client, metrics=metrics, coalesce_window=0.01)
+
+    results = await asyncio.gather(
+        *(service.send_message("micro-two", "hi", f"msg-{i}") for i in range(1, 4)),
+        return_exceptions=True,
+    )
+    single = await service.send_message("micro-two", "hi", "msg-4")
+
+    received, failed, overloaded = results
+    assert received == {"status": "received", "message_id": "msg-1", "retry_after": 2}
+    assert str(failed) == "boom"
+    assert isinstance(overloaded, RecipientOverloadedError)
+    assert overloaded.retry_after == 2
+    assert single == {"status": "received"}
+    assert [call["method_name"] for call in client.calls] == [
+        "receive-messages",
+        "receive-message",
+    ]
+    assert sum(metrics.coalesced_batch_size.labels().counts) == 2
+    service.close()
+
+
+async def test_fanout_returns_after_first_k_and_times_out_stragglers():
+    """A fan-out waits only for what it needs and reports every recipient"""
+    latencies = {"fast": 0.01, "slow": 0.5, "stuck": 5.0}
+
+    class FanoutClient:
+        async def invoke_method(self, app_id, **kwargs):
+            if app_id == "broken":
+                raise RuntimeError("unavailable")
+            await asyncio.sleep(latencies[app_id])
+            return SimpleNamespace(data=b'{"status": "received"}')
+
+    breakers = CircuitBreakerRegistry()
+    service = MessageService(FanoutClient(), circuit_breakers=breakers)
+    targets = [
+        {"recipient_service": name, "message_id": f"msg-{name}"}
+        for name in ("slow", "broken", "fast", "stuck")
+    ]
+
+    started = time.perf_counter()
+    first = await service.send_fanout("hi", targets, first_k=1)
+    first_elapsed = time.perf_counter() - started
+    timed = await service.send_fanout("hi", targets, recipient_timeout=0.2)
+
+    assert first_elapsed < 0.3
+    assert [r["status"] for r in first] == ["cancelled", "failed", "sent", "cancelled"]
+    assert [r["status"] for r in timed] == ["failed", "failed", "sent", "failed"]
+    assert timed[0]["error"] == "Timed out after 0.2s"
+    assert service.status_tracker.get("msg-fast")["status"] == "delivered"
+    # Abandoned sends are no fault of the recipient; timed out ones are
+    assert breakers.get("slow").total_failures == 1
+    assert breakers.get("broken").total_failures == 2
+    service.close()
+
+
+async def test_fanout_tracks_abandoned_sends_as_not_failed():
+    """Sends no longer awaited may still arrive, so they are not failures"""
+
+    class FanoutClient:
+        async def invoke_method(self, app_id, **kwargs):
+            await asyncio.sleep(0.01 if app_id == "fast" else 5.0)
+            return SimpleNamespace(data=b'{"status": "received"}')
+
+    metrics = ServiceMetrics()
+    service = MessageService(FanoutClient(), metrics=metrics)
+
+    await service.send_fanout(
+        "hi",
+        [
+            {"recipient_service": "fast", "message_id": "msg-fast"},
+            {"recipient_service": "slow", "message_id": "msg-cancelled"},
+        ],
+        first_k=1,
+    )
+    await service.send_fanout(
+        "hi",
+        [{"recipient_service": "slow", "message_id": "msg-timed-out"}],
+        recipient_timeout=0.05,
+    )
+
+    cancelled = service.status_tracker.get("msg-cancelled")
+    timed_out = service.status_tracker.get("msg-timed-out")
+    assert cancelled["status"] == "cancelled"
+    assert cancelled["error"] == "Not awaited once 1 recipients had the message"
+    assert timed_out["status"] == "unknown"
+    assert timed_out["error"] == "Timed out after 0.05s"
+    assert metrics.messages_total.labels("cancelled").value == 1
+    assert metrics.messages_total.labels("unknown").value == 1
+    assert metrics.messages_total.labels("failed").value == 0
+    service.close()
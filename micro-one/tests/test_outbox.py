@@ -0,0 +1,152 @@
+"""
+Tests for the micro-one Outbox
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.metrics import ServiceMetrics
+from app.services.outbox import Outbox, OutboxFull
+from app.services.resilience import RetryPolicy
+
+
+class Recipient:
+    """Records delivered entries, failing the first ``failures`` attempts"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.delivered = []
+
+    async def deliver(self, entry):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("sidecar unavailable")
+        self.delivered.append(entry["message_id"])
+
+
+async def wait_until_drained(outbox: Outbox) -> None:
+    for _ in range(200):
+        if not len(outbox):
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError(f"{len(outbox)} entries still pending")
+
+
+def log_records(path):
+    with open(path) as log:
+        return [json.loads(line) for line in log]
+
+
+async def test_delivered_entries_are_marked_done(tmp_path):
+    """Accepted sends are delivered and logged as done"""
+    path = tmp_path / "outbox.log"
+    recipient = Recipient()
+    metrics = ServiceMetrics()
+    outbox = Outbox(str(path), recipient.deliver, concurrency=2, metrics=metrics)
+    await outbox.start()
+
+    for i in range(5):
+        await outbox.add(f"msg-{i}", "micro-two", "hi")
+    await wait_until_drained(outbox)
+    await outbox.close()
+
+    assert sorted(recipient.delivered) == [f"msg-{i}" for i in range(5)]
+    assert outbox.stats()["delivered"] == 5
+    assert [record["op"] for record in log_records(path)].count("done") == 5
+    assert "micro_one_outbox_pending 0" in metrics.render()
+
+
+async def test_failed_deliveries_are_retried_then_given_up(tmp_path):
+    """Failures are retried after a backoff until max_attempts"""
+    recipient = Recipient(failures=2)
+    given_up = []
+    outbox = Outbox(
+        str(tmp_path / "outbox.log"),
+        recipient.deliver,
+        retry_policy=RetryPolicy(base_delay=0.001, max_delay=0.001),
+    )
+    await outbox.start()
+    await outbox.add("msg-1", "micro-two", "hi")
+    await wait_until_drained(outbox)
+    await outbox.close()
+    assert recipient.delivered == ["msg-1"]
+
+    recipient = Recipient(failures=10)
+    outbox = Outbox(
+        str(tmp_path / "outbox.log"),
+        recipient.deliver,
+        max_attempts=3,
+        retry_policy=RetryPolicy(base_delay=0.001, max_delay=0.001),
+        on_give_up=lambda entry, error: given_up.append((entry["attempts"], error)),
+    )
+    await outbox.start()
+    await outbox.add("msg-2", "micro-two", "hi")
+    await wait_until_drained(outbox)
+    await outbox.close()
+
+    assert recipient.delivered == []
+    assert given_up == [(3, "sidecar unavailable")]
+    assert outbox.stats()["given_up"] == 1
+
+
+async def test_full_outbox_refuses_sends(tmp_path):
+    """Sends beyond max_pending are refused rather than logged"""
+    outbox = Outbox(
+        str(tmp_path / "outbox.log"), Recipient(failures=100).deliver, max_pending=1
+    )
+    await outbox.start()
+    await outbox.add("msg-1", "micro-two", "hi")
+
+    with pytest.raises(OutboxFull):
+        await outbox.add("msg-2", "micro-two", "hi")
+    await outbox.close()
+
+
+async def test_undelivered_entries_are_recovered_at_start(tmp_path):
+    """Entries not marked done are delivered after a restart; torn lines are skipped"""
+    path = tmp_path / "outbox.log"
+    with open(path, "w") as log:
+        for i in range(3):
+            entry = {
+                "op": "add",
+                "message_id": f"msg-{i}",
+                "recipient_service": "micro-two",
+                "message": "hi",
+                "attempts": 0,
+            }
+            log.write(json.dumps(entry) + "\n")
+        log.write(json.dumps({"op": "done", "message_id": "msg-1"}) + "\n")
+        log.write('{"op": "add", "message_id": "msg-3", "recip')
+
+    recipient = Recipient()
+    outbox = Outbox(str(path), recipient.deliver)
+    await outbox.start()
+    await wait_until_drained(outbox)
+    await outbox.close()
+
+    assert sorted(recipient.delivered) == ["msg-0", "msg-2"]
+    assert outbox.stats()["recovered"] == 2
+    # Compaction at start kept only the two undelivered entries, now both done
+    assert [record["op"] for record in log_records(path)] == [
+        "add",
+        "add",
+        "done",
+        "done",
+    ]
+
+
+async def test_log_is_owned_by_one_outbox(tmp_path):
+    """A second outbox on the same log fails to start until the first closes"""
+    path = str(tmp_path / "outbox.log")
+    first = Outbox(path, Recipient().deliver)
+    await first.start()
+
+    with pytest.raises(RuntimeError, match="used by another process"):
+        await Outbox(path, Recipient().deliver).start()
+
+    await first.close()
+    second = Outbox(path, Recipient().deliver)
+    await second.start()
+    await second.close()
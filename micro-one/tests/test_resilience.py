@@ -0,0 +1,89 @@
+"""
+Tests for micro-one retry policy and circuit breakers
+"""
+
+import pytest
+
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    RetryPolicy,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_backoff_grows_exponentially_up_to_cap():
+    """Without jitter the delay doubles until it reaches max_delay"""
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.5, jitter=False)
+
+    assert [policy.backoff(i) for i in range(4)] == pytest.approx([0.1, 0.2, 0.4, 0.5])
+
+
+def test_backoff_jitter_stays_within_cap():
+    """Jittered delays are drawn from [0, cap]"""
+    policy = RetryPolicy(base_delay=0.1, max_delay=1.0)
+
+    delays = [policy.backoff(3) for _ in range(100)]
+    assert all(0 <= delay <= 0.8 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_breaker_opens_after_threshold_and_recovers():
+    """The breaker fails fast while open and closes after a good trial call"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "micro-two", failure_threshold=2, reset_timeout=10, clock=clock
+    )
+
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(10)
+
+    clock.now = 11
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # Only one trial call is let through while half-open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.snapshot()["total_rejections"] == 2
+
+
+def test_failed_trial_reopens_breaker():
+    """A failure while half-open re-opens the circuit"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "micro-two", failure_threshold=1, reset_timeout=5, clock=clock
+    )
+    breaker.before_call()
+    breaker.record_failure()
+
+    clock.now = 6
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert breaker.snapshot()["retry_after"] == pytest.approx(5)
+
+
+def test_registry_creates_one_breaker_per_recipient():
+    registry = CircuitBreakerRegistry(failure_threshold=3)
+
+    assert registry.get("a") is registry.get("a")
+    registry.get("b")
+    assert set(registry.snapshot()) == {"a", "b"}
@@ -0,0 +1,22 @@
+"""
+Tests for the JSON serialization helpers
+"""
+
+from app.serialization import FastJSONResponse, dumps, loads
+
+
+def test_round_trip_returns_bytes():
+    payload = {"message": "héllo", "count": 3, "nested": {"ok": True}}
+
+    encoded = dumps(payload)
+
+    assert isinstance(encoded, bytes)
+    assert loads(encoded) == payload
+    assert loads(encoded.decode()) == payload
+
+
+def test_fast_json_response_renders_compact_json():
+    response = FastJSONResponse({"status": "ok"})
+
+    assert response.body == b'{"status":"ok"}'
+    assert response.media_type == "application/json"
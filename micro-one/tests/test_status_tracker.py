@@ -0,0 +1,42 @@
+"""
+Tests for the micro-one MessageStatusTracker
+"""
+
+from app.services.status_tracker import MessageStatusTracker
+
+
+def test_lifecycle_records_retries_and_latency():
+    """A message moves from queued through in-flight to delivered"""
+    tracker = MessageStatusTracker()
+    tracker.queued("msg-1", "micro-two")
+    assert tracker.get("msg-1")["status"] == "queued"
+
+    tracker.in_flight("msg-1", "micro-two")
+    tracker.attempt_failed("msg-1", "unavailable")
+    tracker.in_flight("msg-1", "micro-two")
+    record = tracker.delivered("msg-1")
+
+    assert record["status"] == "delivered"
+    assert record["attempts"] == 2
+    assert record["retries"] == 1
+    assert record["error"] is None
+    assert record["latency_ms"] >= 0
+
+
+def test_failed_keeps_error():
+    tracker = MessageStatusTracker()
+    tracker.queued("msg-1", "micro-two")
+
+    assert tracker.failed("msg-1", "boom")["error"] == "boom"
+    assert tracker.get("msg-1")["status"] == "failed"
+
+
+def test_bounded_by_max_entries():
+    """The oldest records are evicted once the table is full"""
+    tracker = MessageStatusTracker(max_entries=2)
+    for i in range(3):
+        tracker.queued(f"msg-{i}", "micro-two")
+
+    assert tracker.get("msg-0") is None
+    assert len(tracker) == 2
+    assert tracker.stats()["evicted_count"] == 1
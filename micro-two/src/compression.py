@@ -0,0 +1,303 @@
+"""
+Payload compression helpers
+Codecs are named as in HTTP Content-Encoding. gzip uses the standard library;
+zstd is available when the zstandard package is installed.
+"""
+
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from .serialization import dumps
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised only without zstandard
+    zstandard = None
+
+# Usable codecs, preferred first
+CODECS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+# Leading bytes of each codec's frames; JSON text never starts with these
+_MAGIC = {"gzip": b"\x1f\x8b", "zstd": b"\x28\xb5\x2f\xfd"}
+
+_CHUNK = 64 * 1024
+
+
+class PayloadTooLarge(ValueError):
+    """Data decompresses to more than the allowed size"""
+
+
+class _RejectedBody(Exception):
+    """A request body that cannot be decoded, with the status to answer"""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """Compress ``data`` with ``codec`` at a speed-oriented level"""
+    if codec == "gzip":
+        # Level 1 keeps most of level 6's size reduction at a fraction of its CPU
+        encoder = zlib.compressobj(1, zlib.DEFLATED, 31)
+        return encoder.compress(data) + encoder.flush()
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unsupported codec {codec!r}")
+
+
+def decompress(data: bytes, codec: str, max_size: Optional[int] = None) -> bytes:
+    """
+    Decompress one ``codec`` frame
+
+    Args:
+        data: The compressed bytes
+        codec: Codec the bytes were compressed with
+        max_size: Largest decompressed size accepted (None for no limit)
+
+    Returns:
+        The decompressed bytes
+
+    Raises:
+        PayloadTooLarge: The data decompresses to more than ``max_size`` bytes
+        ValueError: The codec is unknown or the data is corrupt or truncated
+    """
+    limit = max_size + 1 if max_size is not None else 0
+    try:
+        if codec == "gzip":
+            decoder = zlib.decompressobj(31)
+            result = decoder.decompress(data, limit)
+            if not decoder.eof and not decoder.unconsumed_tail:
+                raise ValueError("Truncated gzip data")
+        elif codec == "zstd" and zstandard is not None:
+            chunks: List[bytes] = []
+            size = 0
+            with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+                while chunk := reader.read(_CHUNK):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if limit and size >= limit:
+                        break
+            result = b"".join(chunks)
+        else:
+            raise ValueError(f"Unsupported codec {codec!r}")
+    except zlib.error as e:
+        raise ValueError(f"Corrupt {codec} data: {e}") from None
+    except Exception as e:
+        if zstandard is not None and isinstance(e, zstandard.ZstdError):
+            raise ValueError(f"Corrupt {codec} data: {e}") from None
+        raise
+    if max_size is not None and len(result) > max_size:
+        raise PayloadTooLarge(f"Decompressed data exceeds {max_size} bytes")
+    return result
+
+
+def sniff(data: bytes) -> Optional[str]:
+    """The codec ``data`` was compressed with, or None for plain data"""
+    for codec, magic in _MAGIC.items():
+        if data.startswith(magic):
+            return codec
+    return None
+
+
+def encode_value(value: bytes, codec: Optional[str], threshold: int) -> bytes:
+    """
+    Compress a stored value when it is at least ``threshold`` bytes
+
+    Values that would not shrink are kept as they are. Compressed values are
+    recognised by their frame header, see :func:`decode_value`.
+    """
+    if codec is None or threshold <= 0 or len(value) < threshold:
+        return value
+    packed = compress(value, codec)
+    return packed if len(packed) < len(value) else value
+
+
+def decode_value(data: Union[bytes, str]) -> Union[bytes, str]:
+    """Reverse :func:`encode_value`; plain values are returned unchanged"""
+    if isinstance(data, str):
+        return data
+    codec = sniff(data)
+    return decompress(data, codec) if codec is not None else data
+
+
+def accepted(accept_encoding: str) -> List[str]:
+    """The codecs an Accept-Encoding value allows, in the order listed"""
+    codecs = []
+    wildcard = False
+    refused = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = params.strip()
+        if quality.startswith("q=") and _quality(quality[2:]) == 0:
+            refused.add(name)
+        elif name == "*":
+            wildcard = True
+        elif name:
+            codecs.append(name)
+    if wildcard:
+        codecs.extend(codec for codec in CODECS if codec not in codecs)
+    return [codec for codec in codecs if codec not in refused]
+
+
+def _quality(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 1.0
+
+
+def negotiate(accept_encoding: str, preferred: Iterable[str]) -> Optional[str]:
+    """The first of ``preferred`` that an Accept-Encoding value allows"""
+    allowed = accepted(accept_encoding)
+    return next((codec for codec in preferred if codec in allowed), None)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware for compressed request and response bodies
+
+    Request bodies with a supported Content-Encoding are decompressed before
+    the app sees them; other encodings get 415. Responses of at least
+    ``threshold`` bytes are compressed with a codec the client accepts, and
+    every response advertises the supported codecs in Accept-Encoding so
+    callers know they may compress their requests. Streamed responses are
+    passed through unchanged.
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        codec: str = "gzip",
+        threshold: int = 1024,
+        max_size: int = 64 * 1024 * 1024,
+    ):
+        """
+        Args:
+            app: The wrapped ASGI app
+            codec: Codec preferred for responses
+            threshold: Smallest response body compressed (0 disables it)
+            max_size: Largest decompressed request body accepted
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unsupported codec {codec!r}, available: {CODECS}")
+        self.app = app
+        self.threshold = threshold
+        self.max_size = max_size
+        self._preferred = (codec,) + tuple(c for c in CODECS if c != codec)
+        self._advertised = ", ".join(CODECS).encode()
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        encoding = headers.get(b"content-encoding", b"identity").decode().lower()
+        if encoding != "identity":
+            try:
+                scope, receive = await self._decoded_request(scope, receive, encoding)
+            except _RejectedBody as e:
+                await self._reject(send, e.status, str(e))
+                return
+
+        codec = None
+        if self.threshold > 0:
+            codec = negotiate(
+                headers.get(b"accept-encoding", b"").decode(), self._preferred
+            )
+        await self.app(scope, receive, self._encoding_sender(send, codec))
+
+    async def _decoded_request(self, scope, receive, encoding):
+        """Scope and receive callable for the decompressed request body"""
+        if encoding not in CODECS:
+            raise _RejectedBody(415, f"Unsupported Content-Encoding {encoding!r}")
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise _RejectedBody(400, "Client disconnected")
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        try:
+            body = decompress(b"".join(chunks), encoding, self.max_size)
+        except PayloadTooLarge as e:
+            raise _RejectedBody(413, str(e)) from None
+        except ValueError as e:
+            raise _RejectedBody(400, str(e)) from None
+
+        headers = [
+            (name, value)
+            for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode()))
+        delivered = False
+
+        async def receive_decoded() -> Dict[str, Any]:
+            nonlocal delivered
+            if delivered:
+                return await receive()
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return {**scope, "headers": headers}, receive_decoded
+
+    async def _reject(self, send: Callable, status: int, detail: str) -> None:
+        body = dumps({"detail": detail})
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"accept-encoding", self._advertised),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def _encoding_sender(self, send: Callable, codec: Optional[str]) -> Callable:
+        """Wrap ``send`` to advertise codecs and compress large single bodies"""
+        start: Optional[Dict[str, Any]] = None
+
+        async def send_encoded(message: Dict[str, Any]) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether to compress it
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            headers = list(start["headers"])
+            headers.append((b"accept-encoding", self._advertised))
+            body = message.get("body", b"")
+            if (
+                codec is not None
+                and not message.get("more_body", False)
+                and len(body) >= self.threshold
+                and not any(name == b"content-encoding" for name, _ in headers)
+            ):
+                body = compress(body, codec)
+                headers = [
+                    (name, value)
+                    for name, value in headers
+                    if name != b"content-length"
+                ]
+                headers += [
+                    (b"content-encoding", codec.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"vary", b"Accept-Encoding"),
+                ]
+                message = {**message, "body": body}
+            await send({**start, "headers": headers})
+            start = None
+            await send(message)
+
+        return send_encoded
@@ -0,0 +1,199 @@
+"""
+Runtime settings for Micro-Two
+Values are read from environment variables so they can be tuned per deployment.
+"""
+
+import os
+from dataclasses import dataclass
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.getenv(name) or default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Service settings resolved from the environment"""
+
+    # Logging: level, background rendering, and per-event info sampling
+    # ("event name=rate,..."; "*" applies to every unlisted info event)
+    log_level: str = "INFO"
+    log_async: bool = True
+    log_queue_size: int = 10000
+    log_sample_rates: str = ""
+    # Prometheus metrics on /metrics, including per-stage latency histograms
+    metrics_enabled: bool = True
+    # Size of the thread pool used for blocking Dapr client calls
+    dapr_state_max_workers: int = 16
+    # Dapr API the client speaks: "grpc" (the SDK client, run on that pool) or
+    # "http" (async calls over a pool of kept-alive connections, optionally
+    # multiplexed over HTTP/2)
+    dapr_transport: str = "grpc"
+    dapr_http_max_connections: int = 100
+    dapr_http_max_keepalive: int = 20
+    dapr_http_keepalive_expiry: float = 5.0
+    dapr_http2: bool = False
+    # Write-behind state persistence: buffer records and save them in bulk
+    state_write_behind: bool = False
+    state_flush_max_batch: int = 100
+    state_flush_max_pending: float = 0.5
+    # Where received messages are kept: "memory" (per process) or "dapr" (the
+    # state store, shared by all workers and replicas; max_bytes not enforced)
+    message_store_backend: str = "memory"
+    # Bounds for the store of received messages (0 disables a bound)
+    message_store_max_messages: int = 10000
+    message_store_max_bytes: int = 64 * 1024 * 1024
+    # Records read from the store per chunk of GET /messages/export
+    export_batch_size: int = 100
+    # Read-through cache for message state lookups (0 entries disables it)
+    state_cache_max_entries: int = 1024
+    state_cache_ttl: float = 30.0
+    # Duplicate detection by message_id: results of the most recent ids, and
+    # optionally a Bloom filter remembering ids for longer (0 disables each)
+    dedup_max_entries: int = 10000
+    dedup_filter_capacity: int = 0
+    dedup_filter_error_rate: float = 0.001
+    # Admission control: messages processed at once (0 disables the limit),
+    # messages queued for a slot, and seconds one may wait before a 429
+    admission_max_concurrency: int = 64
+    admission_max_queue: int = 256
+    admission_queue_timeout: float = 2.0
+    # "sync" answers invocations once processed; "async" answers 202 once
+    # queued and processes with receive_workers tasks (queue_size waiting)
+    receive_mode: str = "sync"
+    receive_workers: int = 8
+    receive_queue_size: int = 1000
+    receive_status_max_entries: int = 10000
+    # Largest batch of messages accepted by POST /receive-messages
+    receive_batch_max_items: int = 1000
+    # Pub/sub subscription; Dapr delivers up to max_messages per bulk request
+    pubsub_name: str = "pubsub"
+    pubsub_topic: str = "messages"
+    pubsub_bulk_max_messages: int = 100
+    pubsub_bulk_max_await_ms: int = 1000
+    # This service's Dapr app-id; pub/sub events addressed to another
+    # recipient on the shared topic are dropped
+    app_id: str = "micro-two"
+    # Dapr gRPC app callback server for protobuf invocations (0 disables it)
+    grpc_app_port: int = 0
+    # Compression of response bodies and stored state values of at least
+    # threshold bytes (0 disables it; compressed requests are always accepted)
+    compression_codec: str = "gzip"
+    compression_threshold: int = 1024
+    # Production launcher (python -m app.serve): listening address, worker
+    # processes (0 sizes them to the container's CPU quota) and seconds
+    # in-flight requests get to finish on shutdown
+    server_host: str = "0.0.0.0"
+    server_port: int = 8002
+    server_workers: int = 0
+    server_graceful_timeout: float = 15.0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from environment variables, falling back to defaults"""
+        return cls(
+            log_level=_env_str("LOG_LEVEL", cls.log_level),
+            log_async=_env_bool("LOG_ASYNC", cls.log_async),
+            log_queue_size=_env_int("LOG_QUEUE_SIZE", cls.log_queue_size),
+            log_sample_rates=_env_str("LOG_SAMPLE_RATES", cls.log_sample_rates),
+            metrics_enabled=_env_bool("METRICS_ENABLED", cls.metrics_enabled),
+            dapr_state_max_workers=_env_int(
+                "DAPR_STATE_MAX_WORKERS", cls.dapr_state_max_workers
+            ),
+            dapr_transport=_env_str("DAPR_TRANSPORT", cls.dapr_transport),
+            dapr_http_max_connections=_env_int(
+                "DAPR_HTTP_MAX_CONNECTIONS", cls.dapr_http_max_connections
+            ),
+            dapr_http_max_keepalive=_env_int(
+                "DAPR_HTTP_MAX_KEEPALIVE", cls.dapr_http_max_keepalive
+            ),
+            dapr_http_keepalive_expiry=_env_float(
+                "DAPR_HTTP_KEEPALIVE_EXPIRY", cls.dapr_http_keepalive_expiry
+            ),
+            dapr_http2=_env_bool("DAPR_HTTP2", cls.dapr_http2),
+            state_write_behind=_env_bool(
+                "STATE_WRITE_BEHIND", cls.state_write_behind
+            ),
+            state_flush_max_batch=_env_int(
+                "STATE_FLUSH_MAX_BATCH", cls.state_flush_max_batch
+            ),
+            state_flush_max_pending=_env_float(
+                "STATE_FLUSH_MAX_PENDING", cls.state_flush_max_pending
+            ),
+            message_store_backend=_env_str(
+                "MESSAGE_STORE_BACKEND", cls.message_store_backend
+            ),
+            message_store_max_messages=_env_int(
+                "MESSAGE_STORE_MAX_MESSAGES", cls.message_store_max_messages
+            ),
+            message_store_max_bytes=_env_int(
+                "MESSAGE_STORE_MAX_BYTES", cls.message_store_max_bytes
+            ),
+            export_batch_size=_env_int("EXPORT_BATCH_SIZE", cls.export_batch_size),
+            state_cache_max_entries=_env_int(
+                "STATE_CACHE_MAX_ENTRIES", cls.state_cache_max_entries
+            ),
+            state_cache_ttl=_env_float("STATE_CACHE_TTL", cls.state_cache_ttl),
+            dedup_max_entries=_env_int("DEDUP_MAX_ENTRIES", cls.dedup_max_entries),
+            dedup_filter_capacity=_env_int(
+                "DEDUP_FILTER_CAPACITY", cls.dedup_filter_capacity
+            ),
+            dedup_filter_error_rate=_env_float(
+                "DEDUP_FILTER_ERROR_RATE", cls.dedup_filter_error_rate
+            ),
+            admission_max_concurrency=_env_int(
+                "ADMISSION_MAX_CONCURRENCY", cls.admission_max_concurrency
+            ),
+            admission_max_queue=_env_int(
+                "ADMISSION_MAX_QUEUE", cls.admission_max_queue
+            ),
+            admission_queue_timeout=_env_float(
+                "ADMISSION_QUEUE_TIMEOUT", cls.admission_queue_timeout
+            ),
+            receive_mode=_env_str("RECEIVE_MODE", cls.receive_mode),
+            receive_workers=_env_int("RECEIVE_WORKERS", cls.receive_workers),
+            receive_queue_size=_env_int("RECEIVE_QUEUE_SIZE", cls.receive_queue_size),
+            receive_status_max_entries=_env_int(
+                "RECEIVE_STATUS_MAX_ENTRIES", cls.receive_status_max_entries
+            ),
+            receive_batch_max_items=_env_int(
+                "RECEIVE_BATCH_MAX_ITEMS", cls.receive_batch_max_items
+            ),
+            pubsub_name=_env_str("PUBSUB_NAME", cls.pubsub_name),
+            pubsub_topic=_env_str("PUBSUB_TOPIC", cls.pubsub_topic),
+            pubsub_bulk_max_messages=_env_int(
+                "PUBSUB_BULK_MAX_MESSAGES", cls.pubsub_bulk_max_messages
+            ),
+            pubsub_bulk_max_await_ms=_env_int(
+                "PUBSUB_BULK_MAX_AWAIT_MS", cls.pubsub_bulk_max_await_ms
+            ),
+            app_id=_env_str("APP_ID", cls.app_id),
+            grpc_app_port=_env_int("GRPC_APP_PORT", cls.grpc_app_port),
+            compression_codec=_env_str("COMPRESSION_CODEC", cls.compression_codec),
+            compression_threshold=_env_int(
+                "COMPRESSION_THRESHOLD", cls.compression_threshold
+            ),
+            server_host=_env_str("SERVER_HOST", cls.server_host),
+            server_port=_env_int("SERVER_PORT", cls.server_port),
+            server_workers=_env_int("SERVER_WORKERS", cls.server_workers),
+            server_graceful_timeout=_env_float(
+                "SERVER_GRACEFUL_TIMEOUT", cls.server_graceful_timeout
+            ),
+        )
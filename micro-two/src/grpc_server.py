@@ -0,0 +1,249 @@
+"""
+gRPC Invocation Server for Micro-Two
+Serves Dapr service invocation over the gRPC app callback API with protobuf
+payloads, alongside the FastAPI app. With ``app-protocol: grpc`` the sidecar
+sends everything here, so pub/sub and HTTP-style invocations are served too.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import grpc
+import httpx
+import structlog
+from dapr.proto import appcallback_service_v1, appcallback_v1, common_v1
+from google.protobuf import any_pb2
+
+from .metrics import ServiceMetrics
+from .protos import messages_pb2
+from .services.admission import Overloaded
+
+logger = structlog.get_logger(__name__)
+
+MessageHandler = Callable[
+    [messages_pb2.IncomingMessage], Awaitable[messages_pb2.MessageResponse]
+]
+# Takes a pub/sub event's data and returns SUCCESS, RETRY or DROP
+EventHandler = Callable[[Any], Awaitable[str]]
+_EventStatus = appcallback_v1.TopicEventResponse.TopicEventResponseStatus
+
+# HTTP statuses as the gRPC codes Dapr turns back into them for HTTP callers
+_STATUS_CODES = {
+    400: grpc.StatusCode.INVALID_ARGUMENT,
+    401: grpc.StatusCode.UNAUTHENTICATED,
+    403: grpc.StatusCode.PERMISSION_DENIED,
+    404: grpc.StatusCode.NOT_FOUND,
+    409: grpc.StatusCode.ABORTED,
+    429: grpc.StatusCode.RESOURCE_EXHAUSTED,
+    501: grpc.StatusCode.UNIMPLEMENTED,
+    503: grpc.StatusCode.UNAVAILABLE,
+    504: grpc.StatusCode.DEADLINE_EXCEEDED,
+}
+
+
+def _status_code(status: int) -> grpc.StatusCode:
+    if status in _STATUS_CODES:
+        return _STATUS_CODES[status]
+    return (
+        grpc.StatusCode.INTERNAL if status >= 500 else grpc.StatusCode.INVALID_ARGUMENT
+    )
+
+
+def _topic_subscription(entry: Dict[str, Any]) -> appcallback_v1.TopicSubscription:
+    """A subscription as listed by GET /dapr/subscribe, in protobuf form"""
+    bulk = entry.get("bulkSubscribe", {})
+    return appcallback_v1.TopicSubscription(
+        pubsub_name=entry["pubsubname"],
+        topic=entry["topic"],
+        bulk_subscribe=appcallback_v1.BulkSubscribeConfig(
+            enabled=bulk.get("enabled", False),
+            max_messages_count=bulk.get("maxMessagesCount", 0),
+            max_await_duration_ms=bulk.get("maxAwaitDurationMs", 0),
+        ),
+    )
+
+
+class _AppCallbackServicer(
+    appcallback_service_v1.AppCallbackServicer,
+    appcallback_service_v1.AppCallbackAlphaServicer,
+    appcallback_service_v1.AppCallbackHealthCheckServicer,
+):
+    """The app callback methods Dapr calls on a gRPC app"""
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        metrics: Optional[ServiceMetrics],
+        http: Optional[httpx.AsyncClient],
+        event_handler: Optional[EventHandler],
+        subscriptions: List[appcallback_v1.TopicSubscription],
+    ):
+        self.handler = handler
+        self.metrics = metrics
+        self.http = http
+        self.event_handler = event_handler
+        self.subscriptions = subscriptions
+
+    async def OnInvoke(self, request, context):
+        message = messages_pb2.IncomingMessage()
+        if request.method == "receive-message" and request.data.Unpack(message):
+            return await self._invoke(message, context)
+        if (
+            self.http is not None
+            and request.http_extension.verb != common_v1.HTTPExtension.NONE
+        ):
+            # Sent with an HTTP verb, such as JSON sends and coalesced batches
+            return await self._forward(request, context)
+        if request.method != "receive-message":
+            await context.abort(
+                grpc.StatusCode.UNIMPLEMENTED, f"{request.method} is not served"
+            )
+        await context.abort(
+            grpc.StatusCode.INVALID_ARGUMENT,
+            f"Expected a {message.DESCRIPTOR.full_name} payload",
+        )
+
+    async def _invoke(self, message: messages_pb2.IncomingMessage, context):
+        started = time.perf_counter()
+        try:
+            reply = await self.handler(message)
+        except Overloaded as e:
+            # Dapr passes the status and metadata on to the calling app
+            context.set_trailing_metadata((("retry-after", str(e.retry_after)),))
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+        finally:
+            if self.metrics is not None:
+                self.metrics.stage("grpc_handler", time.perf_counter() - started)
+
+        data = any_pb2.Any()
+        data.Pack(reply)
+        return common_v1.InvokeResponse(data=data)
+
+    async def _forward(self, request, context):
+        """Serve an invocation with the FastAPI app, in process"""
+        extension = request.http_extension
+        url = f"/{request.method}"
+        if extension.querystring:
+            url += f"?{extension.querystring}"
+        response = await self.http.request(
+            common_v1.HTTPExtension.Verb.Name(extension.verb),
+            url,
+            content=request.data.value,
+            headers={"content-type": request.content_type or "application/json"},
+        )
+        if response.is_error:
+            retry_after = response.headers.get("retry-after")
+            if retry_after is not None:
+                context.set_trailing_metadata((("retry-after", retry_after),))
+            await context.abort(_status_code(response.status_code), response.text)
+        return common_v1.InvokeResponse(
+            data=any_pb2.Any(value=response.content),
+            content_type=response.headers.get("content-type", ""),
+        )
+
+    async def ListTopicSubscriptions(self, request, context):
+        return appcallback_v1.ListTopicSubscriptionsResponse(
+            subscriptions=self.subscriptions
+        )
+
+    async def OnTopicEvent(self, request, context):
+        status = await self.event_handler(request.data)
+        return appcallback_v1.TopicEventResponse(status=_EventStatus.Value(status))
+
+    async def OnBulkTopicEvent(self, request, context):
+        logger.info("Received bulk pub/sub delivery", entries=len(request.entries))
+        statuses = await asyncio.gather(
+            *(
+                self.event_handler(
+                    entry.bytes
+                    if entry.WhichOneof("event") == "bytes"
+                    else entry.cloud_event.data
+                )
+                for entry in request.entries
+            )
+        )
+        return appcallback_v1.TopicEventBulkResponse(
+            statuses=[
+                appcallback_v1.TopicEventBulkResponseEntry(
+                    entry_id=entry.entry_id,
+                    status=_EventStatus.Value(status),
+                )
+                for entry, status in zip(request.entries, statuses)
+            ]
+        )
+
+    # Older sidecars deliver bulk events through the alpha API
+    OnBulkTopicEventAlpha1 = OnBulkTopicEvent
+
+    async def HealthCheck(self, request, context):
+        return appcallback_v1.HealthCheckResponse()
+
+
+class GrpcInvokeServer:
+    """
+    Dapr app callback server for the "receive-message" method
+
+    Runs as a ``grpc.aio`` server on the FastAPI event loop, so invocations are
+    processed by the same code as POST /receive-message without a thread hop.
+
+    A sidecar with ``app-protocol: grpc`` calls only this server. It also lists
+    the subscriptions and takes their events, and passes invocations made with
+    an HTTP verb (JSON sends, coalesced /receive-messages batches) to the
+    FastAPI app in process.
+    """
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        port: int,
+        metrics: Optional[ServiceMetrics] = None,
+        http_app: Optional[Callable] = None,
+        event_handler: Optional[EventHandler] = None,
+        subscriptions: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """
+        Args:
+            handler: Coroutine function processing one message
+            port: Port the gRPC server listens on
+            metrics: Where gRPC invocation timings are recorded
+            http_app: ASGI app serving invocations made with an HTTP verb
+                (None rejects them)
+            event_handler: Coroutine function processing one pub/sub event
+            subscriptions: Subscriptions in the form GET /dapr/subscribe lists
+                them; their events go to ``event_handler``
+        """
+        self.port = port
+        self._http = (
+            httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=http_app), base_url="http://app"
+            )
+            if http_app is not None
+            else None
+        )
+        self._server = grpc.aio.server()
+        servicer = _AppCallbackServicer(
+            handler,
+            metrics,
+            self._http,
+            event_handler,
+            [_topic_subscription(entry) for entry in subscriptions or ()],
+        )
+        appcallback_service_v1.add_AppCallbackServicer_to_server(servicer, self._server)
+        appcallback_service_v1.add_AppCallbackAlphaServicer_to_server(
+            servicer, self._server
+        )
+        appcallback_service_v1.add_AppCallbackHealthCheckServicer_to_server(
+            servicer, self._server
+        )
+        self._server.add_insecure_port(f"[::]:{port}")
+
+    async def start(self) -> None:
+        await self._server.start()
+        logger.info("gRPC invocation server started", port=self.port)
+
+    async def stop(self, grace: float = 5.0) -> None:
+        """Stop accepting calls and wait up to ``grace`` seconds for running ones"""
+        await self._server.stop(grace)
+        if self._http is not None:
+            await self._http.aclose()
@@ -3,35 +3,48 @@ Micro-Two: Receiver Service
 A FastAPI microservice that receives messages from micro-one using Dapr.
 """
 
+import asyncio
+import inspect
 import logging
 from contextlib import asynccontextmanager
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
 
 import structlog
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from dapr.clients.grpc.client import DaprGrpcClient
 
+from .compression import CompressionMiddleware
+from .config import Settings
+from .dapr_http import DaprHttpClient
+from .grpc_server import GrpcInvokeServer
+from .logging_config import configure_logging, parse_sample_rates
+from .metrics import CONTENT_TYPE, MetricsMiddleware, ServiceMetrics, timed_handler
+from .protos import messages_pb2
+from .serialization import FastJSONResponse, dumps, loads
+from .services.admission import AdmissionController, AdmissionMiddleware, Overloaded
+from .services.dapr_message_store import DaprMessageStore
+from .services.dedup_cache import DedupCache
 from .services.message_processor import MessageProcessor
+from .services.message_store import MessageStore
+from .services.receive_queue import ReceiveQueue
+from .services.state_cache import TTLCache
+
+settings = Settings.from_env()
+metrics = ServiceMetrics() if settings.metrics_enabled else None
 
 # Configure structured logging
-structlog.configure(
-    processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer(),
-    ],
-    context_class=dict,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    wrapper_class=structlog.stdlib.BoundLogger,
-    cache_logger_on_first_use=True,
+configure_logging(
+    level=settings.log_level,
+    use_queue=settings.log_async,
+    queue_size=settings.log_queue_size,
+    sample_rates=parse_sample_rates(settings.log_sample_rates),
+    on_emit=(
+        (lambda seconds: metrics.stage("log", seconds)) if metrics is not None else None
+    ),
+    on_drop=metrics.log_records_dropped_total.inc if metrics is not None else None,
 )
 
 logger = structlog.get_logger(__name__)
@@ -52,40 +65,219 @@ class MessageResponse(BaseModel):
     response_message: str
 
 
+class AcceptedResponse(BaseModel):
+    status: str
+    message_id: str
+    accepted_at: str
+
+
+class IncomingMessageBatch(BaseModel):
+    messages: List[IncomingMessage]
+
+
+class BatchItemResult(BaseModel):
+    # "received", "accepted" (RECEIVE_MODE=async), "overloaded" or "failed"
+    status: str
+    message_id: str
+    processed_at: Optional[str] = None
+    response_message: Optional[str] = None
+    accepted_at: Optional[str] = None
+    retry_after: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BatchReceiveResponse(BaseModel):
+    results: List[BatchItemResult]
+
+
+class StoreStats(BaseModel):
+    size: int
+    bytes: int
+    total_added: int
+    evicted_count: int
+    evicted_bytes: int
+
+
+class CacheStats(BaseModel):
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class DedupStats(BaseModel):
+    size: int
+    hits: int
+    filter_hits: int
+    filter_false_positives: int
+
+
+class AdmissionStats(BaseModel):
+    in_flight: int
+    queued: int
+    rejected: int
+    saturation: float
+
+
+class ReceiveQueueStats(BaseModel):
+    depth: int
+    workers: int
+    accepted: int
+    processed: int
+    failed: int
+
+
 class HealthResponse(BaseModel):
     status: str
     service: str
     version: str
     messages_received: int
+    store: StoreStats
+    state_cache: Optional[CacheStats] = None
+    dedup: Optional[DedupStats] = None
+    admission: Optional[AdmissionStats] = None
+    receive_queue: Optional[ReceiveQueueStats] = None
 
 
 class MessageListResponse(BaseModel):
     messages: List[Dict[str, Any]]
     total_count: int
+    # Pass as ?cursor= to continue after this page (None when it is empty)
+    next_cursor: Optional[int] = None
 
 
 # Global variables
 message_processor: MessageProcessor = None
-received_messages: List[Dict[str, Any]] = []
+if settings.message_store_backend not in ("memory", "dapr"):
+    raise ValueError(
+        f"Unknown MESSAGE_STORE_BACKEND {settings.message_store_backend!r}"
+    )
+if settings.receive_mode not in ("sync", "async"):
+    raise ValueError(f"Unknown RECEIVE_MODE {settings.receive_mode!r}")
+# Replaced by a DaprMessageStore at startup with the "dapr" backend
+message_store: Union[MessageStore, DaprMessageStore] = MessageStore(
+    max_messages=settings.message_store_max_messages,
+    max_bytes=settings.message_store_max_bytes,
+)
+grpc_server: Optional[GrpcInvokeServer] = None
+# Codec for state values, None when compression is disabled; the HTTP API
+# stores values as JSON, so they are not compressed over it
+state_codec = (
+    settings.compression_codec
+    if settings.compression_threshold > 0 and settings.dapr_transport != "http"
+    else None
+)
+state_cache = (
+    TTLCache(max_entries=settings.state_cache_max_entries, ttl=settings.state_cache_ttl)
+    if settings.state_cache_max_entries > 0
+    else None
+)
+dedup_cache = (
+    DedupCache(
+        max_entries=settings.dedup_max_entries,
+        filter_capacity=settings.dedup_filter_capacity,
+        filter_error_rate=settings.dedup_filter_error_rate,
+    )
+    if settings.dedup_max_entries > 0
+    else None
+)
+admission = (
+    AdmissionController(
+        max_concurrency=settings.admission_max_concurrency,
+        max_queue=settings.admission_max_queue,
+        queue_timeout=settings.admission_queue_timeout,
+        metrics=metrics,
+    )
+    if settings.admission_max_concurrency > 0
+    else None
+)
+# Processes invoked messages after they are answered, in the "async" mode
+receive_queue = (
+    ReceiveQueue(
+        lambda item: _handle_incoming(*item),
+        workers=settings.receive_workers,
+        max_size=settings.receive_queue_size,
+        status_max_entries=settings.receive_status_max_entries,
+        metrics=metrics,
+    )
+    if settings.receive_mode == "async"
+    else None
+)
+
+
+def _dapr_client():
+    """The Dapr client for the configured transport"""
+    if settings.dapr_transport == "grpc":
+        return DaprGrpcClient()
+    if settings.dapr_transport != "http":
+        raise ValueError(f"Unknown Dapr transport {settings.dapr_transport!r}")
+    return DaprHttpClient(
+        max_connections=settings.dapr_http_max_connections,
+        max_keepalive_connections=settings.dapr_http_max_keepalive,
+        keepalive_expiry=settings.dapr_http_keepalive_expiry,
+        http2=settings.dapr_http2,
+    )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global message_processor
+    global message_processor, message_store, grpc_server
 
     logger.info("Starting micro-two service")
 
     # Initialize Dapr client and message processor
-    dapr_client = DaprGrpcClient()
-    message_processor = MessageProcessor(dapr_client)
+    dapr_client = _dapr_client()
+    message_processor = MessageProcessor(
+        dapr_client,
+        max_workers=settings.dapr_state_max_workers,
+        write_behind=settings.state_write_behind,
+        flush_max_batch=settings.state_flush_max_batch,
+        flush_max_pending=settings.state_flush_max_pending,
+        state_cache=state_cache,
+        metrics=metrics,
+        compression_codec=state_codec,
+        compression_threshold=settings.compression_threshold,
+    )
+    await message_processor.start()
+    if settings.message_store_backend == "dapr":
+        message_store = DaprMessageStore(
+            dapr_client,
+            max_messages=settings.message_store_max_messages,
+            max_workers=settings.dapr_state_max_workers,
+            metrics=metrics,
+            compression_codec=state_codec,
+            compression_threshold=settings.compression_threshold,
+        )
+        await message_store.start()
+    if receive_queue is not None:
+        await receive_queue.start()
+    if settings.grpc_app_port:
+        grpc_server = GrpcInvokeServer(
+            _receive_grpc_message,
+            port=settings.grpc_app_port,
+            metrics=metrics,
+            http_app=app,
+            event_handler=_handle_event,
+            subscriptions=_subscriptions(),
+        )
+        await grpc_server.start()
 
     yield
 
     # Cleanup
     logger.info("Shutting down micro-two service")
-    if dapr_client:
-        await dapr_client.close()
+    if grpc_server is not None:
+        await grpc_server.stop()
+    if receive_queue is not None:
+        await receive_queue.close()
+    await message_processor.close()
+    if isinstance(message_store, DaprMessageStore):
+        await message_store.close()
+    if isinstance(dapr_client, DaprHttpClient):
+        await dapr_client.aclose()
+    elif dapr_client:
+        dapr_client.close()
 
 
 # Create FastAPI app
@@ -94,17 +286,49 @@ app = FastAPI(
     description="Receiver microservice for Dapr demo",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
+app.add_middleware(
+    CompressionMiddleware,
+    codec=settings.compression_codec,
+    threshold=settings.compression_threshold,
+)
+if admission is not None:
+    app.add_middleware(AdmissionMiddleware, admission=admission)
+if metrics is not None:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+
+async def _store(method: str, *args: Any, **kwargs: Any) -> Any:
+    """Call a message store method, awaiting it for the shared backend"""
+    result = getattr(message_store, method)(*args, **kwargs)
+    if inspect.isawaitable(result):
+        return await result
+    return result
 
 
 @app.get("/healthz", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    store_stats = await _store("stats")
     return HealthResponse(
         status="healthy",
         service="micro-two",
         version="1.0.0",
-        messages_received=len(received_messages),
+        messages_received=store_stats["size"],
+        store=StoreStats(**store_stats),
+        state_cache=(
+            CacheStats(**state_cache.stats()) if state_cache is not None else None
+        ),
+        dedup=DedupStats(**dedup_cache.stats()) if dedup_cache is not None else None,
+        admission=(
+            AdmissionStats(**admission.stats()) if admission is not None else None
+        ),
+        receive_queue=(
+            ReceiveQueueStats(**receive_queue.stats())
+            if receive_queue is not None
+            else None
+        ),
     )
 
 
@@ -117,48 +341,158 @@ async def root():
         "endpoints": {
             "health": "/healthz",
             "receive_message": "/receive-message",
+            "receive_messages": "/receive-messages",
             "messages": "/messages",
+            "export": "/messages/export",
+            "status": "/messages/status/{message_id}",
+            "events": "/events/messages",
+            "metrics": "/metrics",
             "docs": "/docs",
         },
-        "stats": {"messages_received": len(received_messages)},
+        "stats": {"messages_received": (await _store("stats"))["size"]},
     }
 
 
-@app.post("/receive-message", response_model=MessageResponse)
-async def receive_message(message: IncomingMessage):
-    """Receive and process a message from another microservice"""
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+
+async def _handle_incoming(
+    message: IncomingMessage, source: str = "invoke"
+) -> Dict[str, Any]:
+    """Process a message once, answering redeliveries with the first result"""
+    if dedup_cache is None:
+        return await _process_new(message, source)
+
+    result, duplicate = await dedup_cache.run_once(
+        message.message_id,
+        lambda: _process_new(message, source),
+        lambda: _stored_result(message.message_id),
+        summarize=_result_summary,
+    )
+    if not duplicate:
+        return result
+
     logger.info(
-        "Received message",
+        "Duplicate message skipped",
         message_id=message.message_id,
         sender=message.sender,
-        message_length=len(message.message),
+        source=source,
     )
+    if metrics is not None:
+        metrics.duplicates_total.labels(source).inc()
+    if "response" not in result:
+        # The copy carries the message text, so the reply needn't be cached
+        result = {
+            **result,
+            "response": MessageProcessor.response_text(
+                message.sender, message.message, result["processed_at"]
+            ),
+        }
+    return result
+
+
+def _result_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    """What the dedup cache keeps of a result: everything but message text"""
+    return {
+        "status": result.get("status", "processed"),
+        "message_id": result.get("message_id"),
+        "sender": result.get("sender"),
+        "processed_at": result.get("processed_at"),
+    }
 
+
+async def _stored_result(message_id: str) -> Optional[Dict[str, Any]]:
+    """Summary of an earlier delivery, rebuilt from its persisted state"""
+    state = await message_processor.get_message_state(message_id)
+    if state is None:
+        return None
+    return _result_summary({"message_id": message_id, **state})
+
+
+async def _process_new(message: IncomingMessage, source: str) -> Dict[str, Any]:
+    """Process a message once admitted, see AdmissionController"""
+    if admission is None:
+        return await _process_admitted(message, source)
+    async with admission.admit():
+        return await _process_admitted(message, source)
+
+
+async def _process_admitted(message: IncomingMessage, source: str) -> Dict[str, Any]:
+    """Process a message and record it for later retrieval"""
     try:
-        # Process the message
         processed_message = await message_processor.process_message(
             message=message.message,
             message_id=message.message_id,
             sender=message.sender,
         )
+    except Exception:
+        if metrics is not None:
+            metrics.errors_total.labels("process").inc()
+        raise
+    if metrics is not None:
+        metrics.messages_total.labels(source).inc()
+
+    # Store the message for later retrieval
+    message_record = {
+        "message_id": message.message_id,
+        "sender": message.sender,
+        "message": message.message,
+        "received_at": datetime.utcnow().isoformat(),
+        # Lets the in-memory store rebuild the response instead of keeping it
+        "processed_at": processed_message.get("processed_at"),
+        "processed": True,
+        "response": processed_message["response"],
+    }
+    await _store("add", message_record)
 
-        # Store the message for later retrieval
-        message_record = {
-            "message_id": message.message_id,
-            "sender": message.sender,
-            "message": message.message,
-            "received_at": datetime.utcnow().isoformat(),
-            "processed": True,
-            "response": processed_message["response"],
-        }
-        received_messages.append(message_record)
+    logger.info(
+        "Message processed successfully",
+        message_id=message.message_id,
+        sender=message.sender,
+        total_messages=(await _store("stats"))["size"],
+    )
 
-        logger.info(
-            "Message processed successfully",
-            message_id=message.message_id,
-            sender=message.sender,
-            total_messages=len(received_messages),
-        )
+    return processed_message
+
+
+@app.post(
+    "/receive-message",
+    response_model=MessageResponse,
+    responses={202: {"model": AcceptedResponse}},
+)
+@timed_handler
+async def receive_message(message: IncomingMessage):
+    """
+    Receive and process a message from another microservice
+
+    With RECEIVE_MODE=async the message is queued and answered with 202; its
+    progress is at /messages/status/{message_id}.
+    """
+    logger.info(
+        "Received message",
+        message_id=message.message_id,
+        sender=message.sender,
+        message_length=len(message.message),
+    )
+
+    try:
+        if receive_queue is not None:
+            record = receive_queue.submit(message.message_id, (message, "invoke"))
+            return FastJSONResponse(
+                AcceptedResponse(
+                    status=record["status"],
+                    message_id=message.message_id,
+                    accepted_at=record["accepted_at"],
+                ).model_dump(),
+                status_code=202,
+            )
+
+        processed_message = await _handle_incoming(message)
 
         return MessageResponse(
             status="received",
@@ -167,6 +501,17 @@ async def receive_message(message: IncomingMessage):
             response_message=processed_message["response"],
         )
 
+    except Overloaded as e:
+        logger.warning(
+            "Message refused, service overloaded",
+            message_id=message.message_id,
+            retry_after=e.retry_after,
+        )
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         logger.error(
             "Failed to process message",
@@ -180,33 +525,299 @@ async def receive_message(message: IncomingMessage):
         )
 
 
+@app.post(
+    "/receive-messages",
+    response_model=BatchReceiveResponse,
+    response_model_exclude_none=True,
+)
+@timed_handler
+async def receive_messages(batch: IncomingMessageBatch):
+    """
+    Receive a batch of messages, such as a sender's coalesced sends
+
+    The messages are processed concurrently and each gets its own result, so
+    one refused or failed message does not fail the others.
+    """
+    if len(batch.messages) > settings.receive_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.receive_batch_max_items} messages",
+        )
+    logger.info("Received message batch", batch_size=len(batch.messages))
+
+    results = await asyncio.gather(
+        *(_receive_batch_item(message) for message in batch.messages)
+    )
+    return BatchReceiveResponse(results=list(results))
+
+
+async def _receive_batch_item(message: IncomingMessage) -> BatchItemResult:
+    """Process one message of a batch, reporting any failure in its result"""
+    try:
+        if receive_queue is not None:
+            record = receive_queue.submit(message.message_id, (message, "invoke"))
+            return BatchItemResult(
+                status=record["status"],
+                message_id=message.message_id,
+                accepted_at=record["accepted_at"],
+            )
+        processed_message = await _handle_incoming(message)
+    except Overloaded as e:
+        return BatchItemResult(
+            status="overloaded",
+            message_id=message.message_id,
+            retry_after=e.retry_after,
+        )
+    except Exception as e:
+        logger.error(
+            "Failed to process message",
+            message_id=message.message_id,
+            sender=message.sender,
+            error=str(e),
+            exc_info=True,
+        )
+        return BatchItemResult(
+            status="failed",
+            message_id=message.message_id,
+            error=f"Failed to process message: {str(e)}",
+        )
+
+    return BatchItemResult(
+        status="received",
+        message_id=message.message_id,
+        processed_at=datetime.utcnow().isoformat(),
+        response_message=processed_message["response"],
+    )
+
+
+async def _receive_grpc_message(
+    request: messages_pb2.IncomingMessage,
+) -> messages_pb2.MessageResponse:
+    """Process a message invoked over gRPC, see GrpcInvokeServer"""
+    # Protobuf has already enforced the field types, so skip re-validating
+    message = IncomingMessage.model_construct(
+        message=request.message,
+        message_id=request.message_id,
+        sender=request.sender,
+        timestamp=request.timestamp,
+    )
+    logger.info(
+        "Received message",
+        message_id=message.message_id,
+        sender=message.sender,
+        message_length=len(message.message),
+    )
+
+    try:
+        if receive_queue is not None:
+            record = receive_queue.submit(message.message_id, (message, "grpc"))
+            # Nothing is processed yet, so there is no reply text
+            return messages_pb2.MessageResponse(
+                status=record["status"], message_id=message.message_id
+            )
+        processed_message = await _handle_incoming(message, source="grpc")
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(
+            "Failed to process message",
+            message_id=message.message_id,
+            sender=message.sender,
+            error=str(e),
+            exc_info=True,
+        )
+        raise
+
+    return messages_pb2.MessageResponse(
+        status="received",
+        message_id=message.message_id,
+        processed_at=datetime.utcnow().isoformat(),
+        response_message=processed_message["response"],
+    )
+
+
+def _subscriptions() -> List[Dict[str, Any]]:
+    """Programmatic Dapr subscription with bulk delivery enabled"""
+    return [
+        {
+            "pubsubname": settings.pubsub_name,
+            "topic": settings.pubsub_topic,
+            "route": "/events/messages",
+            "bulkSubscribe": {
+                "enabled": True,
+                "maxMessagesCount": settings.pubsub_bulk_max_messages,
+                "maxAwaitDurationMs": settings.pubsub_bulk_max_await_ms,
+            },
+        }
+    ]
+
+
+@app.get("/dapr/subscribe")
+async def subscribe():
+    """Subscriptions for a sidecar delivering to this HTTP app"""
+    return _subscriptions()
+
+
+def _event_payload(event: Any) -> Any:
+    """Extract the published payload from a (possibly CloudEvent-wrapped) event"""
+    if isinstance(event, (str, bytes)):
+        event = loads(event)
+    if isinstance(event, dict) and "data" in event and "message_id" not in event:
+        event = event["data"]
+    if isinstance(event, (str, bytes)):
+        event = loads(event)
+    return event
+
+
+async def _handle_event(event: Any) -> str:
+    """Process one pub/sub event and map the outcome to a Dapr status"""
+    try:
+        payload = _event_payload(event)
+        message = IncomingMessage.model_validate(payload)
+    except (ValidationError, ValueError) as e:
+        # Malformed events can never succeed, so don't ask Dapr to redeliver
+        logger.warning("Dropping malformed pub/sub event", error=str(e))
+        if metrics is not None:
+            metrics.errors_total.labels("validate").inc()
+        return "DROP"
+
+    recipient = payload.get("recipient")
+    if recipient is not None and recipient != settings.app_id:
+        # Published for another service on the shared topic
+        logger.debug(
+            "Dropping pub/sub event for another recipient",
+            message_id=message.message_id,
+            recipient=recipient,
+        )
+        return "DROP"
+
+    try:
+        await _handle_incoming(message, source="pubsub")
+        return "SUCCESS"
+    except Overloaded:
+        # Dapr redelivers per its resiliency policy, after the spike has passed
+        return "RETRY"
+    except Exception as e:
+        logger.error(
+            "Failed to process pub/sub message",
+            message_id=message.message_id,
+            error=str(e),
+            exc_info=True,
+        )
+        return "RETRY"
+
+
+@app.post("/events/messages")
+@timed_handler
+async def receive_events(body: Dict[str, Any]):
+    """Receive pub/sub messages, either one CloudEvent or a bulk delivery"""
+    entries = body.get("entries")
+    if entries is None:
+        return {"status": await _handle_event(body)}
+
+    logger.info("Received bulk pub/sub delivery", entries=len(entries))
+
+    statuses = await asyncio.gather(
+        *(_handle_event(entry.get("event")) for entry in entries)
+    )
+    return {
+        "statuses": [
+            {"entryId": entry.get("entryId"), "status": status}
+            for entry, status in zip(entries, statuses)
+        ]
+    }
+
+
 @app.get("/messages", response_model=MessageListResponse)
-async def get_messages(limit: int = 10, offset: int = 0):
-    """Get list of received messages"""
-    total_count = len(received_messages)
-    messages_slice = received_messages[offset : offset + limit]
+async def get_messages(limit: int = 10, offset: int = 0, cursor: Optional[int] = None):
+    """
+    Get list of received messages
+
+    With ``cursor`` (the ``next_cursor`` of the previous page, or 0 to start)
+    pages are read by sequence number and ``offset`` is ignored.
+    """
+    if cursor is not None:
+        messages_slice = await _store("after", cursor=cursor, limit=limit)
+    else:
+        messages_slice = await _store("page", offset=offset, limit=limit)
+
+    return MessageListResponse(
+        messages=messages_slice,
+        total_count=(await _store("stats"))["size"],
+        next_cursor=messages_slice[-1]["seq"] if messages_slice else None,
+    )
 
-    return MessageListResponse(messages=messages_slice, total_count=total_count)
+
+async def _export_lines(cursor: int, limit: Optional[int], batch_size: int):
+    """NDJSON chunks of stored records, one store batch per chunk"""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        # Each batch is looked up afresh, so the store may change in between
+        batch = await _store("after", cursor=cursor, limit=batch_size)
+        if not batch:
+            return
+        cursor = batch[-1]["seq"]
+        if remaining is not None:
+            batch = batch[:remaining]
+            remaining -= len(batch)
+        yield b"".join(dumps(record) + b"\n" for record in batch)
+
+
+@app.get("/messages/export")
+async def export_messages(cursor: int = 0, limit: Optional[int] = None):
+    """
+    Stream received messages as NDJSON, one record per line in sequence order
+
+    Records are read from the store in small batches while the response is
+    sent, so memory use does not depend on how many records are exported.
+    Resume an interrupted export with the ``seq`` of the last line received.
+    """
+    return StreamingResponse(
+        _export_lines(cursor, limit, settings.export_batch_size),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.get("/messages/status/{message_id}")
+async def get_message_status(message_id: str):
+    """Get the processing status of a message accepted with RECEIVE_MODE=async"""
+    status = receive_queue.get(message_id) if receive_queue is not None else None
+    if status is not None:
+        return status
+
+    raise HTTPException(
+        status_code=404, detail=f"No status recorded for message {message_id}"
+    )
 
 
 @app.get("/messages/{message_id}")
 async def get_message(message_id: str):
     """Get a specific message by ID"""
-    for message in received_messages:
-        if message["message_id"] == message_id:
-            return message
+    message = await _store("get", message_id)
+    if message is not None:
+        return message
 
     raise HTTPException(
         status_code=404, detail=f"Message with ID {message_id} not found"
     )
 
 
+@app.get("/messages/{message_id}/state")
+async def get_message_state(message_id: str):
+    """Get the persisted processing state of a message"""
+    state = await message_processor.get_message_state(message_id)
+    if state is not None:
+        return state
+
+    raise HTTPException(
+        status_code=404, detail=f"No state found for message {message_id}"
+    )
+
+
 @app.delete("/messages")
 async def clear_messages():
     """Clear all received messages (for testing)"""
-    global received_messages
-    count = len(received_messages)
-    received_messages.clear()
+    count = await _store("clear")
 
     logger.info("Cleared all messages", count=count)
 
@@ -0,0 +1,240 @@
+"""
+Production launcher
+Runs the service as several uvicorn worker processes, each accepting on its
+own SO_REUSEPORT socket bound to the same address, and stops them gracefully.
+
+Usage:
+    python -m app.serve
+"""
+
+import importlib.util
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional
+
+import structlog
+import uvicorn
+
+from .config import Settings
+from .logging_config import configure_logging
+
+logger = structlog.get_logger(__name__)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Seconds a worker gets, once its requests are drained, for the app's shutdown
+SHUTDOWN_GRACE = 10.0
+# A worker exiting sooner than this after it started stops the launcher
+# instead of being replaced, since its replacement would most likely fail too
+MIN_UPTIME = 5.0
+
+
+def cpu_quota(root: str = CGROUP_ROOT) -> Optional[float]:
+    """
+    CPUs the cgroup's CFS quota allows this process, read from cgroup v2's
+    ``cpu.max`` or else cgroup v1's ``cpu.cfs_quota_us`` and ``cpu.cfs_period_us``
+
+    Returns:
+        The quota in CPUs, or None when no quota is set or none can be read
+    """
+    try:
+        with open(os.path.join(root, "cpu.max")) as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError, ZeroDivisionError):
+        pass
+    try:
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def default_workers(root: str = CGROUP_ROOT) -> int:
+    """One worker per CPU this process may run on, capped by the CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cpu_quota(root)
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """
+    Bind a TCP socket to host:port that other workers' sockets may bind too
+
+    With SO_REUSEPORT the kernel spreads new connections across the listening
+    sockets, instead of every worker waking to accept from one shared socket.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _worker(app: str, host: str, port: int, options: Dict[str, Any]) -> None:
+    """Serve ``app`` in this process until uvicorn is told to exit"""
+    configure_logging(options["log_level"], use_queue=False)
+    sock = bind_socket(host, port)
+    # No log config of uvicorn's own, so its records go through the app's logging
+    server = uvicorn.Server(uvicorn.Config(app, log_config=None, **options))
+    server.run(sockets=[sock])
+    if not server.started:
+        sys.exit(1)
+
+
+def serve(
+    app: str,
+    host: str,
+    port: int,
+    workers: int,
+    graceful_timeout: float = 15.0,
+    log_level: str = "INFO",
+) -> int:
+    """
+    Run ``workers`` processes serving ``app`` until SIGTERM or SIGINT
+
+    Each worker runs uvicorn on uvloop and httptools when they are installed.
+    On either signal every worker stops accepting connections, gives in-flight
+    requests up to ``graceful_timeout`` seconds to finish and runs the app's
+    shutdown; workers still running ``SHUTDOWN_GRACE`` seconds after that are
+    killed. A worker that dies while serving is replaced.
+
+    Args:
+        app: Import string of the ASGI app, as given to uvicorn
+        host: Address to listen on
+        port: Port to listen on
+        workers: Worker processes to run
+        graceful_timeout: Seconds in-flight requests get to finish on shutdown
+        log_level: Log level name for the launcher and uvicorn
+
+    Returns:
+        Exit status: 0 after a requested shutdown, 1 when a worker failed to start
+    """
+    options = {
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        "lifespan": "on",
+        "log_level": log_level.lower(),
+        "access_log": False,
+        "timeout_graceful_shutdown": graceful_timeout,
+    }
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+    status = 0
+
+    def request_stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+
+    def start() -> List[Any]:
+        process = context.Process(target=_worker, args=(app, host, port, options))
+        process.start()
+        return [process, time.monotonic()]
+
+    previous = {
+        sig: signal.signal(sig, request_stop) for sig in (signal.SIGTERM, signal.SIGINT)
+    }
+    running = [start() for _ in range(workers)]
+    logger.info(
+        "Started workers",
+        workers=workers,
+        host=host,
+        port=port,
+        loop=options["loop"],
+        http=options["http"],
+    )
+    try:
+        while not stopping:
+            wait([process.sentinel for process, _ in running], timeout=0.5)
+            for index, (process, started) in enumerate(running):
+                if stopping or process.is_alive():
+                    continue
+                if time.monotonic() - started < MIN_UPTIME:
+                    logger.error(
+                        "Worker failed to start",
+                        pid=process.pid,
+                        exitcode=process.exitcode,
+                    )
+                    status = 1
+                    stopping = True
+                    break
+                logger.warning(
+                    "Replacing worker", pid=process.pid, exitcode=process.exitcode
+                )
+                running[index] = start()
+    finally:
+        logger.info("Stopping workers", workers=len(running))
+        for process, _ in running:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + graceful_timeout + SHUTDOWN_GRACE
+        for process, _ in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Killing worker that did not stop", pid=process.pid)
+                process.kill()
+                process.join()
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    return status
+
+
+def worker_count(settings: Settings, root: str = CGROUP_ROOT) -> int:
+    """
+    Workers to run for ``settings``: ``server_workers``, or one per usable CPU
+
+    One worker is run instead when there is no SO_REUSEPORT for the workers to
+    share the port, or unless received messages are kept in the Dapr state
+    store: each worker would otherwise serve its own ``/messages`` and process
+    a redelivery that reaches it a second time.
+    """
+    workers = settings.server_workers or default_workers(root)
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        logger.warning("SO_REUSEPORT is not available, running one worker")
+        return 1
+    if workers > 1 and settings.message_store_backend != "dapr":
+        logger.warning(
+            "Received messages are kept per process, running one worker",
+            message_store_backend=settings.message_store_backend,
+            server_workers=settings.server_workers,
+        )
+        return 1
+    return workers
+
+
+def main() -> None:
+    settings = Settings.from_env()
+    configure_logging(settings.log_level, use_queue=False)
+    sys.exit(
+        serve(
+            f"{__package__}.main:app",
+            host=settings.server_host,
+            port=settings.server_port,
+            workers=worker_count(settings),
+            graceful_timeout=settings.server_graceful_timeout,
+            log_level=settings.log_level,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
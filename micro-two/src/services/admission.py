@@ -0,0 +1,204 @@
+"""
+Admission Control for Micro-Two
+Bounds concurrent message processing and sheds excess load early.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Collection, Deque, Dict, Optional
+
+from ..metrics import ServiceMetrics
+from ..serialization import dumps
+
+
+class Overloaded(Exception):
+    """Raised instead of admitting work when the limits are reached"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Overloaded; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded FIFO queue in front of it
+
+    Up to ``max_concurrency`` callers run at once and up to ``max_queue`` more
+    wait for a slot, each for at most ``queue_timeout`` seconds. Anyone else
+    is rejected at once with :class:`Overloaded`, whose ``retry_after`` is an
+    estimate of how long the current backlog takes to drain.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 64,
+        max_queue: int = 256,
+        queue_timeout: float = 2.0,
+        metrics: Optional[ServiceMetrics] = None,
+    ):
+        """
+        Args:
+            max_concurrency: Callers admitted at once
+            max_queue: Callers waiting for a slot before new ones are rejected
+            queue_timeout: Longest wait in seconds before a queued caller is
+                rejected
+            metrics: Where saturation, rejections and queue waits are recorded
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.metrics = metrics
+        self.active = 0
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long admitted work holds a slot
+        self._service_seconds = 0.0
+        if metrics is not None:
+            metrics.admission_in_flight.set_function(lambda: self.active)
+            metrics.admission_queued.set_function(lambda: len(self._waiters))
+            metrics.admission_saturation.set_function(self.saturation)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def saturation(self) -> float:
+        """Share of slots and queue places taken, from 0 to 1"""
+        capacity = self.max_concurrency + self.max_queue
+        return (self.active + len(self._waiters)) / capacity
+
+    def retry_after(self) -> int:
+        """Whole seconds, at least 1, for the current backlog to drain"""
+        backlog = self.active + len(self._waiters)
+        seconds = self._service_seconds * backlog / self.max_concurrency
+        return max(1, math.ceil(seconds))
+
+    def full(self) -> bool:
+        """Whether a caller arriving now would be rejected"""
+        return (
+            self.active >= self.max_concurrency and len(self._waiters) >= self.max_queue
+        )
+
+    def reject(self) -> Overloaded:
+        """Count a rejection and return the error to raise for it"""
+        self.rejected += 1
+        if self.metrics is not None:
+            self.metrics.admission_rejected_total.inc()
+        return Overloaded(self.retry_after())
+
+    async def _acquire(self) -> None:
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self.reject()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # A releasing caller hands its slot over by resolving the future
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if self._handed_over(waiter):
+                # The slot arrived just as the wait timed out: take it
+                return
+            raise self.reject() from None
+        except asyncio.CancelledError:
+            if self._handed_over(waiter):
+                self._release()
+            raise
+
+    def _handed_over(self, waiter: asyncio.Future) -> bool:
+        """Whether an abandoned waiter was given a slot, dequeuing it if not"""
+        if waiter.done() and not waiter.cancelled():
+            return True
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            # Already skipped by _release
+            pass
+        return False
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Hold a processing slot for the duration of the block
+
+        Raises:
+            Overloaded: The queue is full or the wait exceeded queue_timeout
+        """
+        started = time.perf_counter()
+        await self._acquire()
+        admitted = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.stage("admission_wait", admitted - started)
+        try:
+            yield
+        finally:
+            self._release()
+            elapsed = time.perf_counter() - admitted
+            self._service_seconds += 0.1 * (elapsed - self._service_seconds)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self.active,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+            "saturation": self.saturation(),
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware refusing requests early while admission is full
+
+    Requests to ``paths`` get 429 with Retry-After before their bodies are
+    read or validated, so shed load costs next to nothing. Requests let
+    through are still admitted by the handler, which has the final say.
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        admission: AdmissionController,
+        paths: Collection[str] = ("/receive-message", "/receive-messages"),
+    ):
+        self.app = app
+        self.admission = admission
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if (
+            scope["type"] != "http"
+            or scope["path"] not in self.paths
+            or not self.admission.full()
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        error = self.admission.reject()
+        body = dumps({"detail": str(error)})
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(error.retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,689 @@
+"""
+Shared Message Store for Micro-Two
+Received-message records kept in the Dapr state store, so every worker process
+and replica answers /messages queries from the same data.
+"""
+
+import asyncio
+import functools
+import inspect
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import grpc
+import structlog
+from dapr.clients.grpc._request import (
+    TransactionalStateOperation,
+    TransactionOperationType,
+)
+from dapr.clients.grpc._state import Concurrency, StateOptions
+from dapr.clients.grpc.client import DaprGrpcClient
+
+from ..compression import decode_value, encode_value
+from ..metrics import ServiceMetrics
+from ..serialization import dumps, loads
+from .message_store import estimate_record_size
+
+logger = structlog.get_logger(__name__)
+
+EMPTY_META = {
+    "next_seq": 1,
+    "head": 1,
+    "size": 0,
+    "bytes": 0,
+    "total_added": 0,
+    "evicted_count": 0,
+    "evicted_bytes": 0,
+}
+
+# Records read per state call while purging a cleared store
+PURGE_BATCH_SIZE = 100
+
+
+class ConcurrentUpdateError(Exception):
+    """The store index kept changing under every attempt to update it"""
+
+
+def _is_conflict(error: Exception) -> bool:
+    """Whether a Dapr error means another writer changed the key first"""
+    code = getattr(error, "code", None)
+    if callable(code) and code() in (
+        grpc.StatusCode.ABORTED,
+        grpc.StatusCode.FAILED_PRECONDITION,
+    ):
+        return True
+    # Some state stores report a failed transaction etag check as an
+    # internal error, so fall back to the message
+    return "etag" in str(error).lower()
+
+
+def _upsert(key: str, value: bytes, etag: Optional[str] = None):
+    return TransactionalStateOperation(key=key, data=value, etag=etag)
+
+
+def _delete(key: str, etag: Optional[str] = None):
+    return TransactionalStateOperation(
+        key=key, etag=etag, operation_type=TransactionOperationType.delete
+    )
+
+
+def _count_eviction(meta: Dict[str, Any], size: int, count: int = 1) -> None:
+    meta["size"] -= count
+    meta["bytes"] -= count * size
+    meta["evicted_count"] += count
+    meta["evicted_bytes"] += count * size
+
+
+@dataclass
+class _IndexChange:
+    """
+    An id index entry to point at ``after``, or to delete when it is None
+
+    The claim counted the change as replacing ``before``. Once the change is
+    made, ``replaced`` is the entry it actually overwrote.
+    """
+
+    key: str
+    # The seq the change is made for: the record added, or the one evicted
+    seq: int
+    before: Optional[Dict[str, Any]]
+    after: Optional[Dict[str, Any]]
+    # Evicting a record found in the store, rather than adding one
+    evicted: bool = False
+    applied: bool = False
+    replaced: Optional[Dict[str, Any]] = None
+
+
+class DaprMessageStore:
+    """
+    Message records in a Dapr state store, ordered by a shared sequence
+
+    One metadata key holds the next ``seq``, the oldest live ``seq`` (``head``)
+    and the size counters. An add first claims its seqs: it reads the metadata
+    with its etag and writes the advanced metadata alone, conditioned on that
+    etag. The process that loses the race has written nothing, and re-reads the
+    metadata and tries again. Only then are the records written, under seqs no
+    other process will use.
+
+    Records live under ``{prefix}_seq_{seq}`` and are found by id through
+    ``{prefix}_id_{message_id}``. Each index entry is changed by itself with
+    its own etag, and only ever to point at a newer seq, so adds of the same id
+    in several processes settle on the newest record. State store transactions
+    are never relied on to roll back, since ``state.redis`` applies the
+    operations whose etag matched even when another one's did not.
+
+    Concurrent adds within a process are claimed together. The methods mirror
+    MessageStore as coroutines. Only ``max_messages`` is enforced, since a byte
+    budget would need every record's size in the metadata. A record claimed but
+    not yet written when eviction reaches it stays counted in the size; that
+    takes more adds in flight than ``max_messages``.
+    """
+
+    def __init__(
+        self,
+        dapr_client: DaprGrpcClient,
+        store_name: str = "statestore",
+        prefix: str = "received",
+        max_messages: int = 10000,
+        max_attempts: int = 20,
+        max_workers: int = 16,
+        metrics: Optional[ServiceMetrics] = None,
+        compression_codec: Optional[str] = None,
+        compression_threshold: int = 1024,
+    ):
+        """
+        Args:
+            dapr_client: Client used for state store access
+            store_name: Dapr state store component holding the records
+            prefix: Prefix of every key written by the store
+            max_messages: Maximum number of records kept (0 for no limit)
+            max_attempts: Times an update is retried after losing a race
+            max_workers: Threads available for blocking Dapr client calls
+            metrics: Where Dapr call timings are recorded
+            compression_codec: Codec for records of at least
+                ``compression_threshold`` bytes (None stores them as JSON)
+            compression_threshold: Smallest record compressed
+        """
+        self.dapr_client = dapr_client
+        self.store_name = store_name
+        self.prefix = prefix
+        self.max_messages = max_messages
+        self.max_attempts = max_attempts
+        self.metrics = metrics
+        self.compression_codec = compression_codec
+        self.compression_threshold = compression_threshold
+        self._meta_key = f"{prefix}_meta"
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dapr-store"
+        )
+        # Adds waiting for the commit in progress, committed together after it
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._commit_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Create the metadata key unless another process already has"""
+        await self._read_meta()
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def _call_dapr(self, client_method: str, /, **kwargs: Any) -> Any:
+        """
+        Call a Dapr client method without blocking the event loop
+
+        Async clients are awaited directly; synchronous clients run on the
+        store's bounded executor.
+        """
+        method = getattr(self.dapr_client, client_method)
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(method):
+                return await method(**kwargs)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(method, **kwargs)
+            )
+        finally:
+            if self.metrics is not None:
+                self.metrics.dapr_call_seconds.labels(client_method).observe(
+                    time.perf_counter() - started
+                )
+
+    def _seq_key(self, seq: int) -> str:
+        return f"{self.prefix}_seq_{seq}"
+
+    def _id_key(self, message_id: str) -> str:
+        return f"{self.prefix}_id_{message_id}"
+
+    async def _get_bulk(self, keys: List[str]) -> Dict[str, Tuple[Any, str]]:
+        """Values and etags of the keys that exist"""
+        if not keys:
+            return {}
+        response = await self._call_dapr(
+            "get_bulk_state", store_name=self.store_name, keys=keys
+        )
+        return {
+            item.key: (loads(decode_value(item.data)), item.etag)
+            for item in response.items
+            if item.data
+        }
+
+    async def _get_records(self, seqs: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        keys = {self._seq_key(seq): seq for seq in seqs}
+        found = await self._get_bulk(list(keys))
+        return {keys[key]: record for key, (record, _) in found.items()}
+
+    async def _read_meta(self) -> Tuple[Dict[str, Any], str]:
+        """The metadata and its etag, creating it on first use"""
+        while True:
+            response = await self._call_dapr(
+                "get_state", store_name=self.store_name, key=self._meta_key
+            )
+            if response.data:
+                meta = loads(response.data)
+                return meta, response.etag
+
+            try:
+                # First-write: only succeeds if no other process created it
+                await self._call_dapr(
+                    "save_state",
+                    store_name=self.store_name,
+                    key=self._meta_key,
+                    value=dumps(EMPTY_META),
+                    options=StateOptions(concurrency=Concurrency.first_write),
+                )
+            except Exception as e:
+                if not _is_conflict(e):
+                    raise
+
+    async def _commit(self, operations: List[TransactionalStateOperation]) -> bool:
+        """Execute a transaction, returning False if its etag check failed"""
+        try:
+            await self._call_dapr(
+                "execute_state_transaction",
+                store_name=self.store_name,
+                operations=operations,
+            )
+            return True
+        except Exception as e:
+            if not _is_conflict(e):
+                raise
+            return False
+
+    async def _backoff(self, attempt: int) -> None:
+        # Jitter keeps workers that collided from colliding again in lockstep
+        await asyncio.sleep(random.uniform(0, 0.001 * (attempt + 1)))
+
+    async def add(self, record: Dict[str, Any]) -> None:
+        """
+        Store a record, replacing any earlier record with the same message_id
+
+        The record is given the next ``seq``; a replaced record moves to the end.
+        Records added while this process is already committing are queued and
+        committed together in one transaction, so concurrent adds in a process
+        don't compete with each other for the metadata etag.
+
+        Args:
+            record: Message record; must contain a ``message_id`` key
+
+        Raises:
+            ConcurrentUpdateError: Other writers won every attempt
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((record, future))
+        async with self._commit_lock:
+            if not future.done():
+                batch, self._pending = self._pending, []
+                try:
+                    await self._add_batch([queued for queued, _ in batch])
+                except Exception as e:
+                    for _, waiter in batch:
+                        waiter.set_exception(e)
+                else:
+                    for _, waiter in batch:
+                        waiter.set_result(None)
+        await future
+
+    async def _add_batch(self, records: List[Dict[str, Any]]) -> None:
+        cleared, added, evicted, changes = await self._claim(records)
+
+        # The claimed seqs are this process's alone, so no other writer touches
+        # these keys and the writes need no etag
+        operations = [
+            _upsert(
+                self._seq_key(seq),
+                encode_value(
+                    dumps(record), self.compression_codec, self.compression_threshold
+                ),
+            )
+            for seq, record in added.items()
+        ]
+        operations.extend(_delete(self._seq_key(seq)) for seq in evicted)
+        if operations:
+            await self._commit(operations)
+
+        pending = [
+            change
+            for change in changes.values()
+            if change.before is not None or change.after is not None
+        ]
+        for attempt in range(self.max_attempts):
+            if not pending:
+                break
+            found = await self._get_bulk([change.key for change in pending])
+            settled = await asyncio.gather(
+                *(
+                    self._settle(change, *found.get(change.key, (None, None)))
+                    for change in pending
+                )
+            )
+            pending = [change for change, done in zip(pending, settled) if not done]
+            if pending:
+                await self._backoff(attempt)
+
+        stale, counts = self._reconcile(changes, cleared)
+        if stale:
+            await self._commit([_delete(self._seq_key(seq)) for seq in stale])
+        if any(counts.values()):
+            await self._correct(counts, cleared)
+        if pending:
+            raise ConcurrentUpdateError(
+                f"Could not index {len(pending)} messages "
+                f"after {self.max_attempts} attempts"
+            )
+
+    async def _claim(
+        self, records: List[Dict[str, Any]]
+    ) -> Tuple[int, Dict[int, Dict[str, Any]], List[int], Dict[str, _IndexChange]]:
+        """
+        Reserve the next seqs for ``records`` and count them in the metadata
+
+        Only the metadata is written, conditioned on its etag, so an attempt
+        that loses the race leaves nothing behind.
+
+        Returns:
+            The seq below which records were cleared, the records to write by
+            seq, the seqs of evicted records and the index changes by key
+
+        Raises:
+            ConcurrentUpdateError: Other writers won every attempt
+        """
+        id_keys = [self._id_key(record["message_id"]) for record in records]
+        for attempt in range(self.max_attempts):
+            found = await self._get_bulk([self._meta_key, *dict.fromkeys(id_keys)])
+            if self._meta_key not in found:
+                await self._read_meta()
+                continue
+            meta, etag = found[self._meta_key]
+
+            changes: Dict[str, _IndexChange] = {}
+            added: Dict[int, Dict[str, Any]] = {}
+            removed = set()
+            for record, id_key in zip(records, id_keys):
+                change = changes.get(id_key)
+                if change is None:
+                    entry = found[id_key][0] if id_key in found else None
+                    if entry is not None and entry["seq"] < meta["head"]:
+                        # Left behind by eviction or clear(), no longer counted
+                        entry = None
+                    change = changes[id_key] = _IndexChange(id_key, 0, entry, None)
+                    previous = entry
+                else:
+                    # An earlier copy in this batch, which is never written
+                    previous = change.after
+                    del added[previous["seq"]]
+                if previous is not None:
+                    removed.add(previous["seq"])
+                    meta["size"] -= 1
+                    meta["bytes"] -= previous["size"]
+
+                seq = meta["next_seq"]
+                record["seq"] = seq
+                size = estimate_record_size(record)
+                change.seq = seq
+                change.after = {"seq": seq, "size": size}
+                added[seq] = record
+                meta["next_seq"] = seq + 1
+                meta["size"] += 1
+                meta["bytes"] += size
+                meta["total_added"] += 1
+
+            evicted = await self._evict(meta, removed, added, changes)
+            if await self._commit([_upsert(self._meta_key, dumps(meta), etag=etag)]):
+                return meta.get("cleared", 0), added, evicted, changes
+            await self._backoff(attempt)
+
+        raise ConcurrentUpdateError(
+            f"Could not store {len(records)} messages "
+            f"after {self.max_attempts} attempts"
+        )
+
+    async def _evict(
+        self,
+        meta: Dict[str, Any],
+        removed: set,
+        added: Dict[int, Dict[str, Any]],
+        changes: Dict[str, _IndexChange],
+    ) -> List[int]:
+        """
+        Advance ``head`` past the oldest records beyond ``max_messages``
+
+        Records of this update that are evicted are dropped from ``added``, and
+        evicted records found in the store get an entry in ``changes``.
+
+        Args:
+            meta: Metadata being updated
+            removed: Seqs replaced in this update, which no longer count
+            added: Records written by this update, not yet in the store
+            changes: Index changes of this update, by key
+
+        Returns:
+            Seqs of the evicted records in the store
+        """
+        evicted = []
+        count = 0
+        excess = meta["size"] - self.max_messages if self.max_messages else 0
+        # The newest record is always kept
+        newest = meta["next_seq"] - 1
+        while excess > 0 and meta["head"] < newest:
+            seqs = range(meta["head"], min(meta["head"] + excess, newest))
+            records = await self._get_records(
+                s for s in seqs if s not in removed and s not in added
+            )
+            for seq in seqs:
+                meta["head"] = seq + 1
+                record = added.get(seq) if seq not in removed else None
+                if record is None:
+                    record = records.get(seq)
+                if record is None:
+                    # Replaced by a newer copy, which kept its place in size, or
+                    # claimed by another process and not written yet
+                    continue
+                size = estimate_record_size(record)
+                key = self._id_key(record["message_id"])
+                change = changes.get(key)
+                if seq in added:
+                    del added[seq]
+                    change.after = None
+                else:
+                    evicted.append(seq)
+                    if change is not None and not change.evicted:
+                        # An older copy of a record this update replaces
+                        continue
+                    if change is not None:
+                        # Two copies of an id: only the newer one can be live
+                        _count_eviction(meta, change.before["size"], -1)
+                        count -= 1
+                        excess += 1
+                    changes[key] = _IndexChange(
+                        key, seq, {"seq": seq, "size": size}, None, evicted=True
+                    )
+                _count_eviction(meta, size)
+                count += 1
+                excess -= 1
+
+        if count:
+            logger.debug("Evicting messages from store", count=count)
+        return evicted
+
+    async def _settle(
+        self, change: _IndexChange, current: Optional[Dict[str, Any]], etag: str
+    ) -> bool:
+        """
+        Make one index change, unless a newer record already owns the entry
+
+        Args:
+            change: The change to make
+            current: The entry as just read, None if there is none
+            etag: The entry's etag
+
+        Returns:
+            False if another writer changed the entry first, True otherwise
+        """
+        if current is not None and current["seq"] > change.seq:
+            return True
+        if change.after is None and (
+            current is None or (change.evicted and current["seq"] != change.seq)
+        ):
+            # Already removed, or replaced since the record was evicted
+            return True
+
+        try:
+            if change.after is None:
+                await self._call_dapr(
+                    "delete_state",
+                    store_name=self.store_name,
+                    key=change.key,
+                    etag=etag,
+                )
+            elif current is None:
+                await self._call_dapr(
+                    "save_state",
+                    store_name=self.store_name,
+                    key=change.key,
+                    value=dumps(change.after),
+                    options=StateOptions(concurrency=Concurrency.first_write),
+                )
+            else:
+                await self._call_dapr(
+                    "save_state",
+                    store_name=self.store_name,
+                    key=change.key,
+                    value=dumps(change.after),
+                    etag=etag,
+                )
+        except Exception as e:
+            if not _is_conflict(e):
+                raise
+            return False
+        change.applied = True
+        change.replaced = current
+        return True
+
+    def _reconcile(
+        self, changes: Dict[str, _IndexChange], cleared: int
+    ) -> Tuple[List[int], Dict[str, int]]:
+        """
+        Records left without an index entry, and corrections to the counters
+
+        The claim counted each change as ``before`` being replaced by ``after``.
+        Where another process changed the entry first, what happened differs.
+
+        Args:
+            changes: Index changes of this update, made or given up
+            cleared: Entries for seqs below this were not counted anyway
+
+        Returns:
+            Seqs of records to delete, and the amount to add to each counter
+        """
+        stale = []
+        counts = dict.fromkeys(("size", "bytes", "evicted_count", "evicted_bytes"), 0)
+
+        def count(entry: Optional[Dict[str, Any]], sign: int) -> None:
+            if entry is not None:
+                counts["size"] += sign
+                counts["bytes"] += sign * entry["size"]
+
+        for change in changes.values():
+            # Take back what the claim counted, then count what happened
+            count(change.after, -1)
+            count(change.before, 1)
+            if change.applied:
+                count(change.after, 1)
+                replaced = change.replaced
+                if replaced is not None:
+                    if replaced["seq"] >= cleared:
+                        count(replaced, -1)
+                    if not change.evicted:
+                        stale.append(replaced["seq"])
+            else:
+                if change.after is not None:
+                    # A newer copy of the record won the entry
+                    stale.append(change.seq)
+                if change.evicted:
+                    counts["evicted_count"] -= 1
+                    counts["evicted_bytes"] -= change.before["size"]
+        return stale, counts
+
+    async def _correct(self, counts: Dict[str, int], cleared: int) -> None:
+        """Add ``counts`` to the metadata counters, unless it was cleared since"""
+        for attempt in range(self.max_attempts):
+            meta, etag = await self._read_meta()
+            if meta.get("cleared", 0) != cleared:
+                return
+            for name, amount in counts.items():
+                meta[name] += amount
+            if await self._commit([_upsert(self._meta_key, dumps(meta), etag=etag)]):
+                return
+            await self._backoff(attempt)
+        logger.warning("Could not correct message store counters", **counts)
+
+    async def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Return the record for ``message_id`` or None if it is not stored"""
+        id_key = self._id_key(message_id)
+        found = await self._get_bulk([self._meta_key, id_key])
+        if id_key not in found or self._meta_key not in found:
+            return None
+        seq = found[id_key][0]["seq"]
+        if seq < found[self._meta_key][0]["head"]:
+            # Left behind by clear() and not purged yet
+            return None
+        return (await self._get_records([seq])).get(seq)
+
+    async def page(self, offset: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Return up to ``limit`` records in insertion order, skipping ``offset``
+
+        The offset counts sequence numbers from the oldest record, so it
+        overshoots by the number of replaced records it skips over.
+        """
+        meta, _ = await self._read_meta()
+        return await self._after(meta, meta["head"] - 1 + offset, limit)
+
+    async def after(self, cursor: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Return up to ``limit`` records whose ``seq`` is greater than ``cursor``
+
+        Args:
+            cursor: The ``seq`` of the last record already read (0 for none)
+            limit: Maximum number of records to return
+
+        Returns:
+            Records in ``seq`` order
+        """
+        meta, _ = await self._read_meta()
+        return await self._after(meta, cursor, limit)
+
+    async def _after(
+        self, meta: Dict[str, Any], cursor: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        seq = max(cursor + 1, meta["head"])
+        end = meta["next_seq"]
+        result: List[Dict[str, Any]] = []
+        # Replaced records leave gaps, so top up until the page is full
+        while len(result) < limit and seq < end:
+            chunk = range(seq, min(seq + limit - len(result), end))
+            records = await self._get_records(chunk)
+            result.extend(records[s] for s in chunk if s in records)
+            seq = chunk.stop
+        return result
+
+    async def clear(self) -> int:
+        """
+        Remove all records
+
+        The metadata is reset first, which hides every record from readers at
+        once; the record keys are deleted afterwards.
+
+        Returns:
+            Number of records removed
+        """
+        for attempt in range(self.max_attempts):
+            meta, etag = await self._read_meta()
+            count, head, end = meta["size"], meta["head"], meta["next_seq"]
+            meta.update(head=end, cleared=end, size=0, bytes=0)
+            if await self._commit([_upsert(self._meta_key, dumps(meta), etag=etag)]):
+                await self._purge(head, end)
+                return count
+            await self._backoff(attempt)
+
+        raise ConcurrentUpdateError(
+            f"Could not clear messages after {self.max_attempts} attempts"
+        )
+
+    async def _purge(self, start: int, end: int) -> None:
+        """Delete the keys of records with ``start <= seq < end``"""
+        for batch_start in range(start, end, PURGE_BATCH_SIZE):
+            seqs = range(batch_start, min(batch_start + PURGE_BATCH_SIZE, end))
+            records = await self._get_records(seqs)
+            id_keys = [self._id_key(r["message_id"]) for r in records.values()]
+            index = await self._get_bulk(id_keys)
+
+            operations = [_delete(self._seq_key(seq)) for seq in records]
+            # An id may have been stored again since; its entry then points past
+            # ``end`` and is kept, and the etag guards against a concurrent add
+            operations.extend(
+                _delete(key, etag=etag)
+                for key, (entry, etag) in index.items()
+                if entry["seq"] < end
+            )
+            if operations and not await self._commit(operations):
+                logger.warning(
+                    "Skipped purging cleared messages changed concurrently",
+                    first_seq=batch_start,
+                )
+
+    async def stats(self) -> Dict[str, int]:
+        """Current size and eviction counters, shared by all processes"""
+        meta, _ = await self._read_meta()
+        return {
+            "size": meta["size"],
+            "bytes": meta["bytes"],
+            "total_added": meta["total_added"],
+            "evicted_count": meta["evicted_count"],
+            "evicted_bytes": meta["evicted_bytes"],
+        }
@@ -0,0 +1,205 @@
+"""
+Dedup Cache for Micro-Two
+Recognises redelivered message ids so each message is processed once.
+"""
+
+import asyncio
+import hashlib
+import math
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+Result = Dict[str, Any]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Args:
+            capacity: Number of items the filter is sized for
+            error_rate: False positive rate once ``capacity`` items are added
+        """
+        self.capacity = capacity
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RotatingBloomFilter:
+    """
+    Bloom filter over roughly the last ``capacity`` to ``2 * capacity`` items
+
+    Items go into the current generation; once it holds ``capacity`` items it
+    becomes the previous one and the generation before is dropped. Lookups
+    check both, so the error rate stays bounded however many items are added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous: Optional[BloomFilter] = None
+
+    def add(self, item: str) -> None:
+        if self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+        self._current.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._current or (
+            self._previous is not None and item in self._previous
+        )
+
+
+class DedupCache:
+    """
+    Runs the processing of each message id once
+
+    The most recent ``max_entries`` ids are kept with their results, so a
+    redelivered message gets the original result back without any work. A copy
+    that arrives while the original is still being processed waits for it
+    instead of starting again, and processes the message itself if the
+    original fails or is cancelled. Optionally a rotating Bloom filter remembers
+    ids for a longer window: a filter hit is confirmed by loading the stored
+    result (e.g. the message's persisted state), and a miss, which is certain,
+    skips that lookup.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        filter_capacity: int = 0,
+        filter_error_rate: float = 0.001,
+    ):
+        """
+        Args:
+            max_entries: Recent ids whose results are kept
+            filter_capacity: Ids per Bloom filter generation (0 disables it)
+            filter_error_rate: False positive rate of a full generation
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Result]" = OrderedDict()
+        # Ids being processed, kept apart so that eviction never forgets them
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._filter = (
+            RotatingBloomFilter(filter_capacity, filter_error_rate)
+            if filter_capacity > 0
+            else None
+        )
+        self.hits = 0
+        self.filter_hits = 0
+        self.filter_false_positives = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remember(self, message_id: str, result: Result) -> None:
+        self._entries[message_id] = result
+        self._entries.move_to_end(message_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def run_once(
+        self,
+        message_id: str,
+        process: Callable[[], Awaitable[Result]],
+        load: Optional[Callable[[], Awaitable[Optional[Result]]]] = None,
+        summarize: Optional[Callable[[Result], Result]] = None,
+    ) -> Tuple[Result, bool]:
+        """
+        Process a message unless its id has been processed already
+
+        Args:
+            message_id: Unique identifier for the message
+            process: Processes the message and returns its result
+            load: Looks up the stored result of an earlier delivery; called
+                only when the Bloom filter has seen the id
+            summarize: Reduces a result to what is kept for later deliveries,
+                which receive the summary instead of the full result
+
+        Returns:
+            The result and whether it came from an earlier delivery
+        """
+        while True:
+            entry = self._entries.get(message_id)
+            if entry is not None:
+                self._entries.move_to_end(message_id)
+                self.hits += 1
+                return entry, True
+
+            pending = self._in_flight.get(message_id)
+            if pending is not None:
+                try:
+                    result = await asyncio.shield(pending)
+                except BaseException:
+                    if not pending.done():
+                        # This copy was cancelled, not the original
+                        raise
+                    # The original failed or was cancelled: try again
+                    continue
+                self.hits += 1
+                return result, True
+
+            if self._filter is None or load is None or message_id not in self._filter:
+                break
+            stored = await load()
+            if stored is not None:
+                self.filter_hits += 1
+                self._remember(message_id, stored)
+                return stored, True
+            if message_id not in self._entries and message_id not in self._in_flight:
+                # Not stored after all (or its state was lost): process it
+                self.filter_false_positives += 1
+                break
+
+        pending = asyncio.get_running_loop().create_future()
+        self._in_flight[message_id] = pending
+        try:
+            result = await process()
+        except BaseException as e:
+            del self._in_flight[message_id]
+            if isinstance(e, asyncio.CancelledError):
+                pending.cancel()
+            else:
+                pending.set_exception(e)
+                # Waiters only need to know it failed; don't warn about it
+                pending.exception()
+            raise
+
+        del self._in_flight[message_id]
+        pending.set_result(result)
+        self._remember(message_id, summarize(result) if summarize else result)
+        if self._filter is not None:
+            self._filter.add(message_id)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "filter_hits": self.filter_hits,
+            "filter_false_positives": self.filter_false_positives,
+        }
@@ -3,22 +3,123 @@ Message Processor Service for Micro-Two
 Handles processing of incoming messages and state management using Dapr.
 """
 
-import json
-from typing import Dict, Any, Optional
+import asyncio
+import functools
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 import structlog
+from dapr.clients.grpc._state import StateItem
 from dapr.clients.grpc.client import DaprGrpcClient
 
+from ..compression import decode_value, encode_value
+from ..metrics import ServiceMetrics
+from ..serialization import dumps, loads
+from .state_cache import TTLCache
+from .state_writer import DELETED, WriteBehindBuffer
+
 logger = structlog.get_logger(__name__)
 
 
 class MessageProcessor:
     """Service for processing incoming messages via Dapr"""
 
-    def __init__(self, dapr_client: DaprGrpcClient):
+    def __init__(
+        self,
+        dapr_client: DaprGrpcClient,
+        max_workers: int = 16,
+        write_behind: bool = False,
+        flush_max_batch: int = 100,
+        flush_max_pending: float = 0.5,
+        state_cache: Optional[TTLCache] = None,
+        metrics: Optional[ServiceMetrics] = None,
+        compression_codec: Optional[str] = None,
+        compression_threshold: int = 1024,
+    ):
+        """
+        Args:
+            dapr_client: Client used for state store access
+            max_workers: Threads available for blocking Dapr client calls
+            write_behind: Buffer state writes and save them in bulk
+            flush_max_batch: Buffered records that trigger an immediate flush
+            flush_max_pending: Longest time in seconds a buffered write may wait
+            state_cache: Read-through cache for get_message_state
+            metrics: Where Dapr call and state write timings are recorded
+            compression_codec: Codec for state values of at least
+                ``compression_threshold`` bytes (None stores them as JSON)
+            compression_threshold: Smallest state value compressed
+        """
         self.dapr_client = dapr_client
         self.state_store_name = "statestore"
+        self.compression_codec = compression_codec
+        self.compression_threshold = compression_threshold
+        self.state_cache = state_cache
+        # Keys with a store read in flight: [readers, invalidation generation].
+        # A read only caches its result if no write or delete of the key
+        # happened while it was waiting.
+        self._reads: Dict[str, List[int]] = {}
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dapr-state"
+        )
+        self.write_buffer: Optional[WriteBehindBuffer] = None
+        if write_behind:
+            self.write_buffer = WriteBehindBuffer(
+                self._save_bulk_state,
+                max_batch=flush_max_batch,
+                max_pending=flush_max_pending,
+            )
+
+    async def start(self) -> None:
+        """Start background work such as the write-behind flush loop"""
+        if self.write_buffer is not None:
+            self.write_buffer.start()
+
+    async def close(self) -> None:
+        """Flush pending state writes and release the executor"""
+        if self.write_buffer is not None:
+            await self.write_buffer.stop()
+        self._executor.shutdown(wait=True)
+
+    async def _call_dapr(self, client_method: str, /, **kwargs: Any) -> Any:
+        """
+        Call a Dapr client method without blocking the event loop
+
+        Async clients are awaited directly; synchronous clients run on the
+        processor's bounded executor.
+        """
+        method = getattr(self.dapr_client, client_method)
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(method):
+                return await method(**kwargs)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(method, **kwargs)
+            )
+        finally:
+            if self.metrics is not None:
+                self.metrics.dapr_call_seconds.labels(client_method).observe(
+                    time.perf_counter() - started
+                )
+
+    async def _save_bulk_state(self, records: Dict[str, bytes]) -> None:
+        """Persist a batch of buffered state records with one bulk call"""
+        await self._call_dapr(
+            "save_bulk_state",
+            store_name=self.state_store_name,
+            states=[StateItem(key=key, value=value) for key, value in records.items()],
+        )
+
+        logger.info(
+            "Buffered message state flushed",
+            records=len(records),
+            state_store=self.state_store_name,
+        )
 
     async def process_message(
         self, message: str, message_id: str, sender: str
@@ -46,7 +147,7 @@ class MessageProcessor:
             processed_at = datetime.utcnow().isoformat()
 
             # Create response message
-            response_message = f"Hello {sender}! I received your message: '{message}'. Processed at {processed_at}"
+            response_message = self.response_text(sender, message, processed_at)
 
             # Store message state in Dapr state store (optional)
             await self._store_message_state(
@@ -94,6 +195,11 @@ class MessageProcessor:
             )
             raise
 
+    @staticmethod
+    def response_text(sender: str, message: str, processed_at: str) -> str:
+        """The reply text for a message processed at ``processed_at``"""
+        return f"Hello {sender}! I received your message: '{message}'. Processed at {processed_at}"
+
     async def _store_message_state(
         self,
         message_id: str,
@@ -112,6 +218,7 @@ class MessageProcessor:
             processed_at: Timestamp when message was processed
             response: The response message
         """
+        started = time.perf_counter()
         try:
             state_data = {
                 "message_id": message_id,
@@ -122,12 +229,27 @@ class MessageProcessor:
                 "processor": "micro-two",
             }
 
+            key = f"message_{message_id}"
+            value = encode_value(
+                dumps(state_data), self.compression_codec, self.compression_threshold
+            )
+
+            if self.write_buffer is not None:
+                # Write-behind: the buffer saves it in bulk shortly
+                self.write_buffer.put(key, value)
+                self._invalidate_reads(key)
+                self._cache_state(key, state_data)
+                return
+
             # Store in Dapr state store
-            self.dapr_client.save_state(
+            await self._call_dapr(
+                "save_state",
                 store_name=self.state_store_name,
-                key=f"message_{message_id}",
-                value=json.dumps(state_data),
+                key=key,
+                value=value,
             )
+            self._invalidate_reads(key)
+            self._cache_state(key, state_data)
 
             logger.info(
                 "Message state stored successfully",
@@ -140,6 +262,26 @@ class MessageProcessor:
             logger.warning(
                 "Failed to store message state", message_id=message_id, error=str(e)
             )
+            if self.metrics is not None:
+                self.metrics.errors_total.labels("store_state").inc()
+        finally:
+            if self.metrics is not None:
+                self.metrics.stage("store_state", time.perf_counter() - started)
+
+    def _cache_state(self, key: str, state_data: Dict[str, Any]) -> None:
+        if self.state_cache is not None:
+            self.state_cache.set(key, state_data)
+
+    def _invalidate_reads(self, key: str) -> None:
+        """Keep reads of ``key`` now in flight from caching what they return"""
+        read = self._reads.get(key)
+        if read is not None:
+            read[1] += 1
+
+    def _forget_state(self, key: str) -> None:
+        self._invalidate_reads(key)
+        if self.state_cache is not None:
+            self.state_cache.invalidate(key)
 
     async def get_message_state(self, message_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -151,13 +293,37 @@ class MessageProcessor:
         Returns:
             Message state data or None if not found
         """
+        key = f"message_{message_id}"
+        if self.state_cache is not None:
+            cached = self.state_cache.get(key)
+            if cached is not None:
+                return dict(cached)
+
         try:
-            response = self.dapr_client.get_state(
-                store_name=self.state_store_name, key=f"message_{message_id}"
+            pending = (
+                self.write_buffer.get(key) if self.write_buffer is not None else None
             )
+            if pending is DELETED:
+                return None
+            if pending is not None:
+                return loads(decode_value(pending))
+
+            read = self._reads.setdefault(key, [0, 0])
+            read[0] += 1
+            generation = read[1]
+            try:
+                response = await self._call_dapr(
+                    "get_state", store_name=self.state_store_name, key=key
+                )
+            finally:
+                read[0] -= 1
+                if not read[0]:
+                    del self._reads[key]
 
             if response.data:
-                state_data = json.loads(response.data)
+                state_data = loads(decode_value(response.data))
+                if read[1] == generation:
+                    self._cache_state(key, state_data)
                 logger.info(
                     "Retrieved message state",
                     message_id=message_id,
@@ -191,10 +357,19 @@ class MessageProcessor:
         Returns:
             True if deleted successfully, False otherwise
         """
+        key = f"message_{message_id}"
+        self._forget_state(key)
+
         try:
-            self.dapr_client.delete_state(
-                store_name=self.state_store_name, key=f"message_{message_id}"
+            if self.write_buffer is not None:
+                await self.write_buffer.discard(key)
+
+            await self._call_dapr(
+                "delete_state", store_name=self.state_store_name, key=key
             )
+            # Reads made while the delete was in flight may have cached the
+            # old value, or may still be about to
+            self._forget_state(key)
 
             logger.info(
                 "Message state deleted",
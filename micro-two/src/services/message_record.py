@@ -0,0 +1,168 @@
+"""
+Message Record for Micro-Two
+Compact in-memory form of the records kept by MessageStore.
+"""
+
+import sys
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from .message_processor import MessageProcessor
+
+# Rough cost of a record object, its timestamps and its string headers
+RECORD_OVERHEAD_BYTES = 256
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = datetime.resolution
+_FIELDS = frozenset(
+    ("message_id", "sender", "message", "received_at", "processed_at", "processed")
+)
+
+
+def _to_micros(value: Any) -> Optional[int]:
+    """Microseconds since the epoch of a naive UTC ISO timestamp, if exact"""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None or parsed.isoformat() != value:
+        return None
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+@lru_cache(maxsize=4096)
+def _second_iso(seconds: int) -> str:
+    return (_EPOCH + seconds * 1_000_000 * _MICROSECOND).isoformat()
+
+
+def _to_iso(micros: int) -> str:
+    # Records read together mostly share their second, so that part is cached
+    seconds, fraction = divmod(micros, 1_000_000)
+    if fraction:
+        return f"{_second_iso(seconds)}.{fraction:06d}"
+    return _second_iso(seconds)
+
+
+class MessageRecord:
+    """
+    A stored message, about half the size of the equivalent dict
+
+    The sender is interned, timestamps are held as integer microseconds and
+    the response text, which repeats the message, is rebuilt on read. Keys
+    and values that do not fit these fields are kept as they are in ``extra``,
+    so ``from_dict(record).to_dict()`` always equals ``record``.
+    """
+
+    __slots__ = (
+        "seq",
+        "message_id",
+        "sender",
+        "message",
+        "received_at",
+        "processed_at",
+        "processed",
+        "extra",
+    )
+
+    def __init__(
+        self,
+        message_id: str,
+        sender: Optional[str] = None,
+        message: Optional[str] = None,
+        received_at: Optional[int] = None,
+        processed_at: Optional[int] = None,
+        processed: Optional[bool] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ):
+        self.seq = 0
+        self.message_id = message_id
+        self.sender = sys.intern(sender) if sender is not None else None
+        self.message = message
+        self.received_at = received_at
+        self.processed_at = processed_at
+        self.processed = processed
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "MessageRecord":
+        """Build the compact form of a record dict (its ``seq`` is not kept)"""
+        extra = {
+            key: value
+            for key, value in record.items()
+            if key not in _FIELDS and key not in ("seq", "response")
+        }
+
+        fields: Dict[str, Any] = {}
+        for key in ("sender", "message"):
+            value = record.get(key)
+            if isinstance(value, str):
+                fields[key] = value
+            elif key in record:
+                extra[key] = value
+        for key in ("received_at", "processed_at"):
+            micros = _to_micros(record.get(key))
+            if micros is not None:
+                fields[key] = micros
+            elif key in record:
+                extra[key] = record[key]
+        if isinstance(record.get("processed"), bool):
+            fields["processed"] = record["processed"]
+        elif "processed" in record:
+            extra["processed"] = record["processed"]
+
+        self = cls(record["message_id"], **fields)
+        if "response" in record and record["response"] != self.response():
+            extra["response"] = record["response"]
+        self.extra = extra or None
+        return self
+
+    def response(self, processed_at: Optional[str] = None) -> Optional[str]:
+        """
+        The reply text derived from the message, if the record has one
+
+        Args:
+            processed_at: The record's ``processed_at`` already in ISO form
+        """
+        if self.extra is not None and "response" in self.extra:
+            return self.extra["response"]
+        if self.sender is None or self.message is None or self.processed_at is None:
+            return None
+        return MessageProcessor.response_text(
+            self.sender, self.message, processed_at or _to_iso(self.processed_at)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The record as the dict it was built from, plus its ``seq``"""
+        record: Dict[str, Any] = {"message_id": self.message_id}
+        if self.sender is not None:
+            record["sender"] = self.sender
+        if self.message is not None:
+            record["message"] = self.message
+        if self.received_at is not None:
+            record["received_at"] = _to_iso(self.received_at)
+        processed_at = None
+        if self.processed_at is not None:
+            processed_at = record["processed_at"] = _to_iso(self.processed_at)
+        if self.processed is not None:
+            record["processed"] = self.processed
+        response = self.response(processed_at)
+        if response is not None:
+            record["response"] = response
+        if self.extra is not None:
+            record.update(self.extra)
+        record["seq"] = self.seq
+        return record
+
+    def size(self) -> int:
+        """Approximate the memory held by the record, dominated by its text"""
+        size = RECORD_OVERHEAD_BYTES + len(self.message_id)
+        if self.message is not None:
+            size += len(self.message)
+        if self.extra is not None:
+            size += sum(
+                len(value) for value in self.extra.values() if isinstance(value, str)
+            )
+        return size
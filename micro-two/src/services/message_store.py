@@ -0,0 +1,174 @@
+"""
+Message Store for Micro-Two
+Bounded, insertion-ordered in-memory store of received message records.
+"""
+
+from bisect import bisect_right
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+from .message_record import MessageRecord
+
+logger = structlog.get_logger(__name__)
+
+# Rough per-record cost of the dict and its keys on top of the value payloads
+RECORD_OVERHEAD_BYTES = 512
+
+
+def estimate_record_size(record: Dict[str, Any]) -> int:
+    """Approximate the memory held by a record, dominated by its string values"""
+    return RECORD_OVERHEAD_BYTES + sum(
+        len(value) for value in record.values() if isinstance(value, str)
+    )
+
+
+class MessageStore:
+    """
+    In-memory message records indexed by id, evicting oldest first
+
+    Records are held as compact MessageRecord objects and handed out as dicts.
+    Every stored record gets a ``seq`` number from a counter that only ever
+    increases (also across ``clear``), so a client can resume reading after
+    the last ``seq`` it saw regardless of evictions and new arrivals.
+    """
+
+    def __init__(self, max_messages: int = 10000, max_bytes: int = 0):
+        """
+        Args:
+            max_messages: Maximum number of records kept (0 for no limit)
+            max_bytes: Approximate maximum size of all records (0 for no limit)
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        # Records keyed by seq; dicts keep insertion order, so oldest first
+        self._records: Dict[int, MessageRecord] = {}
+        self._seq_by_id: Dict[str, int] = {}
+        # Ascending seqs for cursor seeks; may hold removed seqs until compacted
+        self._order: List[int] = []
+        self._next_seq = 1
+        self.total_bytes = 0
+        self.total_added = 0
+        self.evicted_count = 0
+        self.evicted_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """
+        Store a record, replacing any earlier record with the same message_id
+
+        The record is given the next ``seq``; a replaced record moves to the end.
+
+        Args:
+            record: Message record; must contain a ``message_id`` key
+        """
+        message_id = record["message_id"]
+        previous = self._seq_by_id.get(message_id)
+        if previous is not None:
+            self._remove(previous)
+
+        seq = self._next_seq
+        self._next_seq += 1
+        record["seq"] = seq
+        stored = MessageRecord.from_dict(record)
+        stored.seq = seq
+        size = stored.size()
+        self._records[seq] = stored
+        self._seq_by_id[message_id] = seq
+        self._order.append(seq)
+        self.total_bytes += size
+        self.total_added += 1
+
+        self._evict()
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Return the record for ``message_id`` or None if it is not stored"""
+        seq = self._seq_by_id.get(message_id)
+        record = self._records.get(seq) if seq is not None else None
+        return record.to_dict() if record is not None else None
+
+    def page(self, offset: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` records in insertion order, skipping ``offset``"""
+        records = islice(self._records.values(), offset, offset + limit)
+        return [record.to_dict() for record in records]
+
+    def after(self, cursor: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Return up to ``limit`` records whose ``seq`` is greater than ``cursor``
+
+        Unlike ``page`` this does not walk the records before the cursor, so
+        reading deep into the store costs the same as reading its start.
+
+        Args:
+            cursor: The ``seq`` of the last record already read (0 for none)
+            limit: Maximum number of records to return
+
+        Returns:
+            Records in ``seq`` order
+        """
+        order = self._order
+        get = self._records.get
+        result: List[Dict[str, Any]] = []
+        index = bisect_right(order, cursor)
+        # Slices may include removed seqs, so top up until the page is full
+        while len(result) < limit and index < len(order):
+            chunk = order[index : index + limit - len(result)]
+            index += len(chunk)
+            result.extend(
+                record.to_dict() for record in map(get, chunk) if record is not None
+            )
+        return result
+
+    def clear(self) -> int:
+        """
+        Remove all records
+
+        Returns:
+            Number of records removed
+        """
+        count = len(self._records)
+        self._records.clear()
+        self._seq_by_id.clear()
+        self._order.clear()
+        self.total_bytes = 0
+        return count
+
+    def stats(self) -> Dict[str, int]:
+        """Current size and eviction counters"""
+        return {
+            "size": len(self._records),
+            "bytes": self.total_bytes,
+            "total_added": self.total_added,
+            "evicted_count": self.evicted_count,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+    def _remove(self, seq: int) -> int:
+        record = self._records.pop(seq)
+        del self._seq_by_id[record.message_id]
+        size = record.size()
+        self.total_bytes -= size
+
+        # Drop removed seqs from the seek index once they outnumber live ones
+        if len(self._order) > 2 * len(self._records) + 64:
+            records = self._records
+            self._order = [s for s in self._order if s in records]
+        return size
+
+    def _evict(self) -> None:
+        evicted = 0
+        # The newest record is always kept, even if it alone exceeds max_bytes
+        while len(self._records) > 1 and (
+            (self.max_messages and len(self._records) > self.max_messages)
+            or (self.max_bytes and self.total_bytes > self.max_bytes)
+        ):
+            oldest_seq = next(iter(self._records))
+            self.evicted_bytes += self._remove(oldest_seq)
+            self.evicted_count += 1
+            evicted += 1
+
+        if evicted:
+            logger.debug("Evicted messages from store", count=evicted)
@@ -0,0 +1,181 @@
+"""
+Receive Queue for Micro-Two
+Accepts messages for processing in the background by a pool of worker tasks.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import structlog
+
+from ..metrics import ServiceMetrics
+from .admission import Overloaded
+
+logger = structlog.get_logger(__name__)
+
+ACCEPTED = "accepted"
+PROCESSING = "processing"
+PROCESSED = "processed"
+FAILED = "failed"
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ReceiveQueue:
+    """
+    Bounded queue of accepted messages, processed by ``workers`` tasks
+
+    Each message's progress is kept as a status record indexed by message_id,
+    evicting the oldest records first. A message_id that is already queued,
+    being processed or processed is not queued again.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[Any], Awaitable[Any]],
+        workers: int = 8,
+        max_size: int = 1000,
+        status_max_entries: int = 10000,
+        metrics: Optional[ServiceMetrics] = None,
+    ):
+        """
+        Args:
+            process: Coroutine function processing one accepted item
+            workers: Worker tasks processing items concurrently
+            max_size: Items waiting for a worker before new ones are refused
+            status_max_entries: Status records kept for lookups
+            metrics: Where queue depth and queueing time are recorded
+        """
+        self.process = process
+        self.workers = workers
+        self.status_max_entries = status_max_entries
+        self.metrics = metrics
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        # Moving average of how long a worker spends on one item
+        self._service_seconds = 0.0
+        self.counts = {ACCEPTED: 0, PROCESSED: 0, FAILED: 0}
+        if metrics is not None:
+            metrics.receive_queue_depth.set_function(self._queue.qsize)
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"receive-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop accepting and give queued items up to ``timeout`` seconds"""
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Receive queue not drained before shutdown",
+                pending=self._queue.qsize(),
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, message_id: str, item: Any) -> Dict[str, Any]:
+        """
+        Queue an item for processing unless its message_id is already known
+
+        Returns:
+            A copy of the message's status record
+
+        Raises:
+            Overloaded: The queue is full or shutting down
+        """
+        record = self._records.get(message_id)
+        if record is not None and record["status"] != FAILED:
+            return dict(record)
+        if self._closing or self._queue.full():
+            raise Overloaded(self.retry_after())
+
+        record = {
+            "message_id": message_id,
+            "status": ACCEPTED,
+            "error": None,
+            "accepted_at": _utc_now(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self._queue.put_nowait((record, item, time.perf_counter()))
+        self._records[message_id] = record
+        self._records.move_to_end(message_id)
+        while len(self._records) > self.status_max_entries:
+            self._records.popitem(last=False)
+        self.counts[ACCEPTED] += 1
+        return dict(record)
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the status record for ``message_id``"""
+        record = self._records.get(message_id)
+        return dict(record) if record is not None else None
+
+    def retry_after(self) -> int:
+        """Whole seconds, at least 1, for the queued items to be taken"""
+        seconds = self._service_seconds * self._queue.qsize() / self.workers
+        return max(1, math.ceil(seconds))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self._queue.qsize(),
+            "workers": self.workers,
+            "accepted": self.counts[ACCEPTED],
+            "processed": self.counts[PROCESSED],
+            "failed": self.counts[FAILED],
+        }
+
+    async def _work(self) -> None:
+        while True:
+            record, item, queued = await self._queue.get()
+            started = time.perf_counter()
+            if self.metrics is not None:
+                self.metrics.stage("receive_queue", started - queued)
+            record["status"] = PROCESSING
+            record["started_at"] = _utc_now()
+            try:
+                await self._process(item)
+                record["status"] = PROCESSED
+            except asyncio.CancelledError:
+                record["status"] = FAILED
+                record["error"] = "Shut down before processing finished"
+                raise
+            except Exception as e:
+                logger.error(
+                    "Failed to process queued message",
+                    message_id=record["message_id"],
+                    error=str(e),
+                    exc_info=True,
+                )
+                record["status"] = FAILED
+                record["error"] = str(e)
+            finally:
+                record["finished_at"] = _utc_now()
+                self.counts[record["status"]] += 1
+                elapsed = time.perf_counter() - started
+                self._service_seconds += 0.1 * (elapsed - self._service_seconds)
+                self._queue.task_done()
+
+    async def _process(self, item: Any) -> None:
+        while True:
+            try:
+                await self.process(item)
+                return
+            except Overloaded as e:
+                # Accepted messages are not refused later; wait for capacity
+                await asyncio.sleep(e.retry_after)
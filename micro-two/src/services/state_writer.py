@@ -0,0 +1,131 @@
+"""
+Write-Behind Buffer for Micro-Two
+Collects state writes in memory and hands them to a bulk flush callback.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+FlushCallback = Callable[[Dict[str, bytes]], Awaitable[None]]
+
+# Returned by get() for a key discarded while its save was in flight
+DELETED = object()
+
+
+class WriteBehindBuffer:
+    """Buffer of pending state writes, flushed by size or age"""
+
+    def __init__(
+        self,
+        flush_callback: FlushCallback,
+        max_batch: int = 100,
+        max_pending: float = 0.5,
+    ):
+        """
+        Args:
+            flush_callback: Coroutine that persists a ``{key: value}`` batch
+            max_batch: Number of pending records that triggers an immediate flush
+            max_pending: Longest time in seconds a record may wait to be flushed
+        """
+        self._flush_callback = flush_callback
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: Dict[str, bytes] = {}
+        # The batch being saved, until the save completes; discarded keys
+        # map to DELETED
+        self._in_flight: Dict[str, Any] = {}
+        self._batch_full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Start the background flush loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, key: str, value: bytes) -> None:
+        """Queue a write; a later write to the same key replaces the earlier one"""
+        self._pending[key] = value
+        if len(self._pending) >= self.max_batch:
+            self._batch_full.set()
+
+    def get(self, key: str) -> Any:
+        """
+        Return a value that has been written but not persisted yet
+
+        Returns:
+            The value, ``DELETED`` if it was discarded while being saved, or
+            None if the buffer does not hold the key
+        """
+        value = self._pending.get(key)
+        if value is None:
+            value = self._in_flight.get(key)
+        return value
+
+    async def discard(self, key: str) -> None:
+        """
+        Drop a buffered write, e.g. because the key is being deleted
+
+        If the key is in a save that is in flight, waits for that save to
+        land, so that a delete issued afterwards is not overwritten by it.
+        """
+        self._pending.pop(key, None)
+        if key in self._in_flight:
+            self._in_flight[key] = DELETED
+            async with self._flush_lock:
+                pass
+
+    async def flush(self) -> int:
+        """
+        Persist all pending writes
+
+        Returns:
+            Number of records handed to the flush callback
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            self._in_flight = dict(batch)
+            self._batch_full.clear()
+
+            try:
+                await self._flush_callback(batch)
+            except Exception as e:
+                # Match the synchronous path: state persistence is best effort
+                logger.warning(
+                    "Failed to flush buffered state", records=len(batch), error=str(e)
+                )
+            finally:
+                self._in_flight = {}
+            return len(batch)
+
+    async def stop(self) -> None:
+        """Stop the flush loop and persist anything still pending"""
+        if self._task is not None:
+            # Let an in-progress flush finish rather than cancelling it midway
+            self._stopping = True
+            self._batch_full.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+
+        flushed = await self.flush()
+        logger.info("Write-behind buffer drained", records=flushed)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.max_pending)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
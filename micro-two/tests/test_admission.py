@@ -0,0 +1,119 @@
+"""
+Tests for the micro-two AdmissionController
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.metrics import ServiceMetrics
+from app.services.admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    Overloaded,
+)
+
+
+async def test_excess_callers_queue_in_order_then_are_rejected():
+    """Callers beyond the slots wait FIFO; beyond the queue they get Overloaded"""
+    admission = AdmissionController(max_concurrency=2, max_queue=2)
+    release = asyncio.Event()
+    order = []
+
+    async def work(name):
+        async with admission.admit():
+            order.append(name)
+            await release.wait()
+
+    tasks = [asyncio.create_task(work(i)) for i in range(4)]
+    await asyncio.sleep(0)
+    assert (admission.active, admission.queued) == (2, 2)
+    assert admission.saturation() == 1.0
+
+    with pytest.raises(Overloaded) as excinfo:
+        async with admission.admit():
+            pass
+    assert excinfo.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2, 3]
+    assert admission.stats() == {
+        "in_flight": 0,
+        "queued": 0,
+        "rejected": 1,
+        "saturation": 0.0,
+    }
+
+
+async def test_queued_callers_give_up_after_the_timeout():
+    """A wait longer than queue_timeout is rejected and leaves the queue"""
+    admission = AdmissionController(max_concurrency=1, max_queue=5, queue_timeout=0.02)
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.admit():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded):
+        async with admission.admit():
+            pass
+    assert admission.queued == 0
+
+    release.set()
+    await holder
+    async with admission.admit():
+        assert admission.active == 1
+
+
+async def test_cancelled_waiters_do_not_leak_slots():
+    """Cancelling a queued caller, even one just handed a slot, frees the slot"""
+    metrics = ServiceMetrics()
+    admission = AdmissionController(max_concurrency=1, max_queue=5, metrics=metrics)
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.admit():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(hold()) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert "micro_two_admission_queued 2" in metrics.render()
+
+    waiters[0].cancel()
+    release.set()
+    # The holder hands its slot to waiters[1] once the cancelled one is skipped
+    await asyncio.gather(holder, waiters[1])
+    assert (admission.active, admission.queued) == (0, 0)
+    assert "micro_two_admission_saturation 0" in metrics.render()
+
+
+def test_middleware_refuses_before_reading_the_body():
+    """While slots and queue are full, listed paths get 429 without the handler"""
+    admission = AdmissionController(max_concurrency=1, max_queue=0)
+    app = FastAPI()
+    calls = []
+
+    @app.post("/receive-message")
+    async def receive(request: Request):
+        calls.append(await request.body())
+        return {"status": "received"}
+
+    app.add_middleware(AdmissionMiddleware, admission=admission)
+    client = TestClient(app)
+
+    assert client.post("/receive-message", content=b"{}").status_code == 200
+    admission.active = 1
+    response = client.post("/receive-message", content=b"{}")
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    assert len(calls) == 1
+    assert admission.rejected == 1
@@ -0,0 +1,97 @@
+"""
+Tests for the compression helpers and CompressionMiddleware
+"""
+
+import gzip
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.compression import (
+    CompressionMiddleware,
+    decode_value,
+    encode_value,
+    negotiate,
+    sniff,
+)
+
+
+def test_values_over_the_threshold_are_compressed_and_recognised():
+    large = b'{"message": "' + b"x" * 4000 + b'"}'
+    small = b'{"message": "hi"}'
+
+    packed = encode_value(large, "gzip", threshold=1024)
+
+    assert sniff(packed) == "gzip"
+    assert len(packed) < len(large)
+    assert decode_value(packed) == large
+    assert encode_value(small, "gzip", threshold=1024) is small
+    assert encode_value(large, None, threshold=1024) is large
+    assert decode_value(small) is small
+
+
+def test_negotiate_honours_quality_and_wildcard():
+    assert negotiate("gzip, zstd", ("zstd", "gzip")) == "zstd"
+    assert negotiate("zstd;q=0, gzip;q=0.5", ("zstd", "gzip")) == "gzip"
+    assert negotiate("*", ("gzip",)) == "gzip"
+    assert negotiate("br, identity", ("gzip",)) is None
+    assert negotiate("", ("gzip",)) is None
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"received": (await request.body()).decode()}
+
+    app.add_middleware(CompressionMiddleware, threshold=100, max_size=10_000)
+    return TestClient(app)
+
+
+def test_compressed_requests_are_decoded_and_unknown_codecs_refused(client):
+    """Requests are decompressed for the app; unsupported encodings get 415"""
+    response = client.post(
+        "/echo",
+        content=gzip.compress(b"hello"),
+        headers={"content-encoding": "gzip", "accept-encoding": "identity"},
+    )
+    assert response.json() == {"received": "hello"}
+    assert "content-encoding" not in response.headers
+    assert "gzip" in response.headers["accept-encoding"]
+
+    response = client.post(
+        "/echo", content=b"hello", headers={"content-encoding": "br"}
+    )
+    assert response.status_code == 415
+    assert "gzip" in response.headers["accept-encoding"]
+
+    bomb = gzip.compress(b"x" * 20_000)
+    response = client.post("/echo", content=bomb, headers={"content-encoding": "gzip"})
+    assert response.status_code == 413
+
+    response = client.post(
+        "/echo", content=b"\x1f\x8bnot gzip", headers={"content-encoding": "gzip"}
+    )
+    assert response.status_code == 400
+
+
+def test_only_large_responses_are_compressed(client):
+    """Bodies under the threshold, or to clients without the codec, stay plain"""
+    response = client.post(
+        "/echo", content=b"x" * 500, headers={"accept-encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == {"received": "x" * 500}
+
+    response = client.post("/echo", content=b"hi", headers={"accept-encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    response = client.post(
+        "/echo", content=b"x" * 500, headers={"accept-encoding": "identity"}
+    )
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"received": "x" * 500}
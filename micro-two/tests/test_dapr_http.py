@@ -0,0 +1,146 @@
+"""
+Tests for the Dapr HTTP API client
+"""
+
+import importlib.util
+import json
+
+import httpx
+import pytest
+from dapr.clients.grpc._request import (
+    TransactionalStateOperation,
+    TransactionOperationType,
+)
+from dapr.clients.grpc._state import Concurrency, StateOptions
+
+from app.dapr_http import DaprHttpClient
+from app.services.dapr_message_store import _is_conflict
+
+
+class FakeStateApi:
+    """Records requests and answers them like the sidecar's state API"""
+
+    def __init__(self):
+        self.requests = []
+        self.values = {"s_1": (b'{"n":1}', "7")}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+        if path.endswith("/bulk"):
+            keys = json.loads(request.content)["keys"]
+            items = [
+                (
+                    {"key": key, "data": json.loads(self.values[key][0]), "etag": "7"}
+                    if key in self.values
+                    else {"key": key}
+                )
+                for key in keys
+            ]
+            return httpx.Response(200, json=items)
+        if request.method == "GET":
+            key = path.rsplit("/", 1)[1]
+            if key not in self.values:
+                return httpx.Response(204)
+            value, etag = self.values[key]
+            return httpx.Response(200, content=value, headers={"etag": etag})
+        if request.headers.get("if-match") == "stale":
+            return httpx.Response(409, json={"errorCode": "ERR_STATE_DELETE"})
+        return httpx.Response(204)
+
+
+@pytest.fixture
+async def state_api():
+    api = FakeStateApi()
+    client = DaprHttpClient("http://sidecar:3500", transport=httpx.MockTransport(api))
+    yield api, client
+    await client.aclose()
+
+
+async def test_state_values_are_sent_as_raw_json(state_api):
+    """Values are embedded as JSON, with etags and first-write options"""
+    api, client = state_api
+
+    await client.save_state(
+        "store",
+        "s_2",
+        b'{"message":"hi"}',
+        options=StateOptions(concurrency=Concurrency.first_write),
+    )
+    await client.execute_state_transaction(
+        "store",
+        [
+            TransactionalStateOperation(key="s_1", data=b"[1,2]", etag="7"),
+            TransactionalStateOperation(
+                key="s_3", operation_type=TransactionOperationType.delete
+            ),
+        ],
+    )
+
+    save, transaction = api.requests
+    assert save.url.path == "/v1.0/state/store"
+    assert json.loads(save.content) == [
+        {
+            "key": "s_2",
+            "value": {"message": "hi"},
+            "options": {"concurrency": "first-write"},
+        }
+    ]
+    assert transaction.url.path == "/v1.0/state/store/transaction"
+    assert json.loads(transaction.content)["operations"] == [
+        {
+            "operation": "upsert",
+            "request": {"key": "s_1", "etag": "7", "value": [1, 2]},
+        },
+        {"operation": "delete", "request": {"key": "s_3"}},
+    ]
+    with pytest.raises(ValueError):
+        await client.save_state("store", "s_4", b"\x1f\x8b\x08\x00")
+
+
+async def test_reads_return_sdk_response_types(state_api):
+    _, client = state_api
+
+    found = await client.get_state("store", "s_1")
+    missing = await client.get_state("store", "s_9")
+    bulk = await client.get_bulk_state("store", ["s_1", "s_9"])
+
+    assert (found.data, found.etag) == (b'{"n":1}', "7")
+    assert missing.data == b""
+    assert [(item.key, item.data, item.etag) for item in bulk.items] == [
+        ("s_1", b'{"n":1}', "7"),
+        ("s_9", b"", ""),
+    ]
+
+
+async def test_etag_conflict_reads_as_grpc_aborted(state_api):
+    """A 409 is recognised as a conflict by code shared with the gRPC client"""
+    _, client = state_api
+
+    with pytest.raises(Exception) as excinfo:
+        await client.delete_state("store", "s_1", etag="stale")
+
+    assert _is_conflict(excinfo.value)
+
+
+def test_http2_without_h2_is_a_config_error(monkeypatch):
+    """Asking for HTTP/2 without h2 installed fails as the client is built"""
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util,
+        "find_spec",
+        lambda name, *args: None if name == "h2" else find_spec(name, *args),
+    )
+
+    with pytest.raises(ValueError, match="http2 extra"):
+        DaprHttpClient("http://sidecar:3500", http2=True)
+
+
+async def test_http2_client_speaks_h2_to_plain_text_sidecars():
+    """With h2 installed, a plain-text sidecar is spoken to in HTTP/2 directly"""
+    pytest.importorskip("h2")
+    client = DaprHttpClient("http://sidecar:3500", http2=True)
+
+    pool = client._client._transport._pool
+    assert pool._http2 and not pool._http1
+    await client.aclose()
@@ -0,0 +1,224 @@
+"""
+Tests for the micro-two DaprMessageStore
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import grpc
+import pytest
+
+from app.services.dapr_message_store import ConcurrentUpdateError, DaprMessageStore
+
+
+class EtagMismatch(Exception):
+    def code(self):
+        return grpc.StatusCode.ABORTED
+
+
+class FakeStateStore:
+    """
+    Async stand-in for the Dapr state API with etag checks and transactions
+
+    Every call yields to the event loop first, so concurrent store operations
+    interleave the way they would against a real sidecar.
+    """
+
+    def __init__(self):
+        self.state = {}
+        self.transactions = 0
+        self.meta_updates = 0
+        self.conflicts = 0
+
+    async def get_state(self, store_name, key):
+        await asyncio.sleep(0)
+        value, etag = self.state.get(key, (b"", 0))
+        return SimpleNamespace(data=value, etag=str(etag) if etag else "")
+
+    async def get_bulk_state(self, store_name, keys):
+        await asyncio.sleep(0)
+        items = []
+        for key in keys:
+            value, etag = self.state.get(key, (b"", 0))
+            items.append(SimpleNamespace(key=key, data=value, etag=str(etag)))
+        return SimpleNamespace(items=items)
+
+    def check(self, key, etag=None, first_write=False):
+        current = self.state.get(key)
+        if (first_write and current is not None) or (
+            etag is not None and (current is None or str(current[1]) != etag)
+        ):
+            self.conflicts += 1
+            raise EtagMismatch(key)
+
+    def apply(self, op):
+        if op.operation_type.value == "delete":
+            self.state.pop(op.key, None)
+        else:
+            etag = self.state.get(op.key, (None, 0))[1] + 1
+            self.state[op.key] = (op.data, etag)
+        if op.key.endswith("_meta"):
+            self.meta_updates += 1
+
+    async def save_state(self, store_name, key, value, etag=None, options=None):
+        await asyncio.sleep(0)
+        self.check(key, etag, first_write=options is not None)
+        self.state[key] = (value, self.state.get(key, (None, 0))[1] + 1)
+
+    async def delete_state(self, store_name, key, etag=None):
+        await asyncio.sleep(0)
+        self.check(key, etag)
+        self.state.pop(key, None)
+
+    async def execute_state_transaction(self, store_name, operations):
+        await asyncio.sleep(0)
+        for op in operations:
+            self.check(op.key, op.etag)
+        self.transactions += 1
+        for op in operations:
+            self.apply(op)
+
+
+class NonAtomicStateStore(FakeStateStore):
+    """
+    Applies every transaction operation whose etag matches, then fails if any
+    did not, the way ``state.redis`` runs a transaction
+    """
+
+    async def execute_state_transaction(self, store_name, operations):
+        await asyncio.sleep(0)
+        failed = None
+        for op in operations:
+            try:
+                self.check(op.key, op.etag)
+            except EtagMismatch as e:
+                failed = e
+                continue
+            self.apply(op)
+        if failed is not None:
+            raise failed
+        self.transactions += 1
+
+
+def record(message_id):
+    return {"message_id": message_id, "sender": "micro-one", "message": "hello"}
+
+
+async def test_workers_sharing_the_state_store_see_the_same_records():
+    """Records added through one instance are read back through another"""
+    state = FakeStateStore()
+    first, second = DaprMessageStore(state), DaprMessageStore(state)
+    await first.start()
+    await second.start()
+
+    await first.add(record("a"))
+    await second.add(record("b"))
+
+    assert (await second.get("a"))["seq"] == 1
+    assert [r["message_id"] for r in await first.after(0, 10)] == ["a", "b"]
+    assert (await first.stats())["total_added"] == 2
+    assert await first.get("missing") is None
+
+
+async def test_concurrent_adds_get_unique_sequence_numbers():
+    """Writers that lose the etag race retry instead of reusing a seq"""
+    state = FakeStateStore()
+    stores = [DaprMessageStore(state) for _ in range(4)]
+
+    await asyncio.gather(
+        *(
+            store.add(record(f"{n}-{i}"))
+            for n, store in enumerate(stores)
+            for i in range(5)
+        )
+    )
+
+    records = await stores[0].after(0, 100)
+    assert [r["seq"] for r in records] == list(range(1, 21))
+    assert (await stores[0].stats())["size"] == 20
+    assert state.conflicts > 0
+
+
+async def test_concurrent_adds_in_one_process_share_a_transaction():
+    """Adds queued behind a commit are committed together, duplicates included"""
+    state = FakeStateStore()
+    store = DaprMessageStore(state, max_messages=3)
+
+    await asyncio.gather(*(store.add(record(i)) for i in "abcbde"))
+
+    assert state.meta_updates == 2
+    assert [r["message_id"] for r in await store.after(0, 10)] == ["b", "d", "e"]
+    assert (await store.get("b"))["seq"] == 4
+    assert "received_id_a" not in state.state
+    assert "received_id_c" not in state.state
+    assert (await store.stats())["evicted_count"] == 2
+
+
+async def test_racing_writers_never_overwrite_records_without_rollback():
+    """
+    Losing the race for the metadata writes nothing, even on a state store
+    that applies the rest of a transaction whose etag check failed
+    """
+    state = NonAtomicStateStore()
+    stores = [DaprMessageStore(state, max_messages=12) for _ in range(4)]
+
+    # Every store adds the same ids, so the index entries race as well
+    await asyncio.gather(
+        *(store.add(record(f"{i % 6}")) for i, store in enumerate(stores * 5))
+    )
+
+    records = await stores[0].after(0, 100)
+    stats = await stores[0].stats()
+    assert stats["total_added"] == 20
+    assert sorted(r["message_id"] for r in records) == [str(i) for i in range(6)]
+    assert stats["size"] == 6
+    for r in records:
+        assert (await stores[0].get(r["message_id"]))["seq"] == r["seq"]
+    # No record was written under another's seq or left behind unindexed
+    seq_keys = sorted(k for k in state.state if k.startswith("received_seq_"))
+    assert seq_keys == sorted(f"received_seq_{r['seq']}" for r in records)
+
+
+async def test_replace_and_evict_keep_the_index_consistent():
+    """Replacing moves a record to the end; eviction drops its id entry too"""
+    state = FakeStateStore()
+    store = DaprMessageStore(state, max_messages=3)
+
+    for message_id in ("a", "b", "c", "a", "d"):
+        await store.add(record(message_id))
+
+    assert [r["message_id"] for r in await store.page(0, 10)] == ["c", "a", "d"]
+    assert await store.get("b") is None
+    assert "received_id_b" not in state.state
+    stats = await store.stats()
+    assert stats["size"] == 3
+    assert stats["evicted_count"] == 1
+
+
+async def test_clear_hides_records_at_once_and_purges_their_keys():
+    """Sequence numbers keep increasing after clear and old keys are deleted"""
+    state = FakeStateStore()
+    store = DaprMessageStore(state)
+    for message_id in ("a", "b"):
+        await store.add(record(message_id))
+
+    assert await store.clear() == 2
+    await store.add(record("a"))
+
+    assert [r["seq"] for r in await store.after(0, 10)] == [3]
+    assert await store.get("b") is None
+    assert sorted(state.state) == ["received_id_a", "received_meta", "received_seq_3"]
+
+
+async def test_add_gives_up_after_max_attempts():
+    """An update that never wins the race raises instead of looping forever"""
+    state = FakeStateStore()
+    store = DaprMessageStore(state, max_attempts=2)
+    await store.start()
+
+    async def always_conflict(store_name, operations):
+        raise EtagMismatch("received_meta")
+
+    state.execute_state_transaction = always_conflict
+    with pytest.raises(ConcurrentUpdateError):
+        await store.add(record("a"))
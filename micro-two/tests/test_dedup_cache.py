@@ -0,0 +1,134 @@
+"""
+Tests for the micro-two DedupCache
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.dedup_cache import BloomFilter, DedupCache
+
+
+async def test_redeliveries_get_the_first_result():
+    """Copies arriving during or after processing never process again"""
+    cache = DedupCache(max_entries=10)
+    calls = []
+
+    async def process():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"response": "first"}
+
+    results = await asyncio.gather(*(cache.run_once("a", process) for _ in range(3)))
+    later, duplicate = await cache.run_once("a", process)
+
+    assert calls == [1]
+    assert [duplicate for _, duplicate in results].count(False) == 1
+    assert all(result == {"response": "first"} for result, _ in results)
+    assert (later, duplicate) == ({"response": "first"}, True)
+    assert cache.hits == 3
+
+
+async def test_failed_processing_is_not_remembered():
+    """A copy waiting on a failed original processes the message itself"""
+    cache = DedupCache(max_entries=10)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def succeed():
+        return {"response": "ok"}
+
+    outcomes = await asyncio.gather(
+        cache.run_once("a", fail), cache.run_once("a", succeed), return_exceptions=True
+    )
+    assert isinstance(outcomes[0], RuntimeError)
+    assert outcomes[1] == ({"response": "ok"}, False)
+
+    assert await cache.run_once("a", succeed) == ({"response": "ok"}, True)
+
+
+async def test_in_flight_ids_survive_eviction_and_cancellation():
+    """
+    An id being processed is never evicted, and a cancelled original leaves
+    its waiting copy to process the message instead of cancelling it too
+    """
+    cache = DedupCache(max_entries=1)
+    calls = []
+    started = asyncio.Event()
+
+    async def slow():
+        calls.append("slow")
+        started.set()
+        await asyncio.sleep(10)
+
+    async def process(name):
+        calls.append(name)
+        return {"response": name}
+
+    original = asyncio.create_task(cache.run_once("a", slow))
+    await started.wait()
+    # Fill the recent set past max_entries while "a" is in flight
+    for message_id in ("b", "c"):
+        await cache.run_once(message_id, lambda: process(message_id))
+    copy = asyncio.create_task(cache.run_once("a", lambda: process("copy")))
+    await asyncio.sleep(0)
+    assert calls == ["slow", "b", "c"]
+
+    original.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await original
+
+    assert await copy == ({"response": "copy"}, False)
+    assert calls == ["slow", "b", "c", "copy"]
+
+
+async def test_filter_confirms_older_ids_with_the_stored_result():
+    """Ids evicted from the recent set are checked against stored results"""
+    cache = DedupCache(max_entries=1, filter_capacity=100)
+    stored = {}
+    loads = []
+
+    def process(message_id):
+        async def run():
+            stored[message_id] = {"response": message_id}
+            return stored[message_id]
+
+        return run
+
+    def load(message_id):
+        async def run():
+            loads.append(message_id)
+            return stored.get(message_id)
+
+        return run
+
+    for message_id in ("a", "b"):
+        await cache.run_once(message_id, process(message_id), load(message_id))
+    assert loads == []
+
+    assert await cache.run_once("a", process("a"), load("a")) == (
+        {"response": "a"},
+        True,
+    )
+    assert loads == ["a"]
+    assert cache.filter_hits == 1
+
+    # Stored results that were lost are processed again
+    del stored["b"]
+    cache._entries.clear()
+    _, duplicate = await cache.run_once("b", process("b"), load("b"))
+    assert not duplicate
+    assert cache.filter_false_positives == 1
+
+
+@pytest.mark.parametrize("error_rate", [0.01, 0.001])
+def test_bloom_filter_error_rate(error_rate):
+    bloom = BloomFilter(capacity=5000, error_rate=error_rate)
+    for i in range(5000):
+        bloom.add(f"seen-{i}")
+
+    assert all(f"seen-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"new-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < error_rate * 2
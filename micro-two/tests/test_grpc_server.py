@@ -0,0 +1,150 @@
+"""
+Tests for the micro-two gRPC invocation server
+"""
+
+import json
+import socket
+from typing import Any, Dict
+
+import grpc
+import pytest
+from dapr.proto import appcallback_service_v1, appcallback_v1, common_v1
+from fastapi import FastAPI, HTTPException
+from google.protobuf import any_pb2, empty_pb2
+
+from app.grpc_server import GrpcInvokeServer
+from app.metrics import ServiceMetrics
+from app.protos import messages_pb2
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def invoke(port, data):
+    async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+        await channel.channel_ready()
+        stub = appcallback_service_v1.AppCallbackStub(channel)
+        return await stub.OnInvoke(
+            common_v1.InvokeRequest(method="receive-message", data=data)
+        )
+
+
+async def test_invocations_reach_the_handler_and_reply_is_packed():
+    """Protobuf requests reach the async handler; other payloads are rejected"""
+    received = []
+
+    async def handler(message):
+        received.append(message)
+        return messages_pb2.MessageResponse(
+            status="received", message_id=message.message_id
+        )
+
+    metrics = ServiceMetrics()
+    port = free_port()
+    server = GrpcInvokeServer(handler, port=port, metrics=metrics)
+    await server.start()
+    try:
+        data = any_pb2.Any()
+        data.Pack(messages_pb2.IncomingMessage(message="hi", message_id="msg-1"))
+        response = await invoke(port, data)
+
+        with pytest.raises(grpc.aio.AioRpcError):
+            await invoke(port, any_pb2.Any(value=b'{"message": "json"}'))
+    finally:
+        await server.stop(grace=0)
+
+    reply = messages_pb2.MessageResponse()
+    assert response.data.Unpack(reply)
+    assert reply.message_id == "msg-1"
+    assert [message.message for message in received] == ["hi"]
+    assert sum(metrics.stage_seconds.labels("grpc_handler").counts) == 1
+
+
+async def test_pubsub_and_http_invocations_are_served_for_grpc_sidecars():
+    """Subscriptions, topic events and HTTP-verb invocations all reach the app"""
+    events = []
+
+    async def on_event(data):
+        events.append(data)
+        return "DROP" if data == b"bad" else "SUCCESS"
+
+    async def handler(message):
+        return messages_pb2.MessageResponse()
+
+    http_app = FastAPI()
+
+    @http_app.post("/receive-messages")
+    async def receive_messages(body: Dict[str, Any]):
+        if not body["messages"]:
+            raise HTTPException(429, "busy", headers={"Retry-After": "2"})
+        return {"results": len(body["messages"])}
+
+    subscription = {
+        "pubsubname": "pubsub",
+        "topic": "messages",
+        "route": "/events/messages",
+        "bulkSubscribe": {
+            "enabled": True,
+            "maxMessagesCount": 10,
+            "maxAwaitDurationMs": 50,
+        },
+    }
+    port = free_port()
+    server = GrpcInvokeServer(
+        handler,
+        port=port,
+        http_app=http_app,
+        event_handler=on_event,
+        subscriptions=[subscription],
+    )
+
+    def post(body):
+        return common_v1.InvokeRequest(
+            method="receive-messages",
+            data=any_pb2.Any(value=json.dumps(body).encode()),
+            content_type="application/json",
+            http_extension=common_v1.HTTPExtension(verb=common_v1.HTTPExtension.POST),
+        )
+
+    await server.start()
+    try:
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = appcallback_service_v1.AppCallbackStub(channel)
+            listed = await stub.ListTopicSubscriptions(empty_pb2.Empty())
+            single = await stub.OnTopicEvent(
+                appcallback_v1.TopicEventRequest(data=b"one")
+            )
+            bulk = await stub.OnBulkTopicEvent(
+                appcallback_v1.TopicEventBulkRequest(
+                    entries=[
+                        appcallback_v1.TopicEventBulkRequestEntry(
+                            entry_id="1", bytes=b"two"
+                        ),
+                        appcallback_v1.TopicEventBulkRequestEntry(
+                            entry_id="2",
+                            cloud_event=appcallback_v1.TopicEventCERequest(data=b"bad"),
+                        ),
+                    ]
+                )
+            )
+            reply = await stub.OnInvoke(post({"messages": [1, 2]}))
+            with pytest.raises(grpc.aio.AioRpcError) as refused:
+                await stub.OnInvoke(post({"messages": []}))
+    finally:
+        await server.stop(grace=0)
+
+    status = appcallback_v1.TopicEventResponse.TopicEventResponseStatus
+    assert listed.subscriptions[0].topic == "messages"
+    assert listed.subscriptions[0].bulk_subscribe.max_messages_count == 10
+    assert single.status == status.SUCCESS
+    assert [(s.entry_id, s.status) for s in bulk.statuses] == [
+        ("1", status.SUCCESS),
+        ("2", status.DROP),
+    ]
+    assert events == [b"one", b"two", b"bad"]
+    assert json.loads(reply.data.value) == {"results": 2}
+    assert refused.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert ("retry-after", "2") in tuple(refused.value.trailing_metadata())
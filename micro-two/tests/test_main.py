@@ -2,11 +2,17 @@
 Tests for micro-two service
 """
 
+import json
+
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
-from app.main import app
+from app.main import _export_lines, app
+from app.services.admission import AdmissionController
+from app.services.message_processor import MessageProcessor
+from app.services.message_store import MessageStore
+from app.services.receive_queue import ReceiveQueue
 
 client = TestClient(app)
 
@@ -82,3 +88,335 @@ def test_clear_messages():
     data = response.json()
     assert data["status"] == "cleared"
     assert "messages_removed" in data
+
+
+@patch("app.main.message_processor")
+def test_received_message_is_retrievable(mock_message_processor):
+    """Test a received message can be fetched by id and shows in /healthz"""
+    mock_message_processor.process_message = AsyncMock(
+        return_value={"status": "processed", "response": "ok"}
+    )
+
+    test_message = {
+        "message": "Hello again",
+        "message_id": "lookup-123",
+        "sender": "micro-one",
+        "timestamp": "2024-01-01T00:00:00Z",
+    }
+    assert client.post("/receive-message", json=test_message).status_code == 200
+
+    response = client.get("/messages/lookup-123")
+    assert response.status_code == 200
+    assert response.json()["message"] == "Hello again"
+
+    health = client.get("/healthz").json()
+    assert health["store"]["size"] >= 1
+    assert health["messages_received"] == health["store"]["size"]
+    assert "evicted_count" in health["store"]
+
+    # The count is of messages held now; total_added keeps the running total
+    client.delete("/messages")
+    health = client.get("/healthz").json()
+    assert health["messages_received"] == 0
+    assert health["store"]["total_added"] >= 1
+
+
+def test_dapr_subscribe_enables_bulk():
+    """Test programmatic subscription requests bulk delivery"""
+    response = client.get("/dapr/subscribe")
+    assert response.status_code == 200
+    subscription = response.json()[0]
+    assert subscription["pubsubname"] == "pubsub"
+    assert subscription["bulkSubscribe"]["enabled"] is True
+
+
+@patch("app.main.message_processor")
+def test_bulk_pubsub_delivery(mock_message_processor):
+    """Test bulk events are processed with a status per entry"""
+    mock_message_processor.process_message = AsyncMock(
+        return_value={"status": "processed", "response": "ok"}
+    )
+
+    def cloud_event(message_id):
+        return {
+            "specversion": "1.0",
+            "datacontenttype": "application/json",
+            "data": {
+                "message": "Hello over pubsub",
+                "message_id": message_id,
+                "sender": "micro-one",
+                "timestamp": "2024-01-01T00:00:00Z",
+            },
+        }
+
+    body = {
+        "entries": [
+            {"entryId": "1", "event": cloud_event("bulk-1")},
+            {"entryId": "2", "event": {"data": {"unexpected": True}}},
+            {"entryId": "3", "event": cloud_event("bulk-3")},
+        ],
+        "topic": "messages",
+        "pubsubname": "pubsub",
+    }
+
+    response = client.post("/events/messages", json=body)
+    assert response.status_code == 200
+    statuses = {s["entryId"]: s["status"] for s in response.json()["statuses"]}
+    assert statuses == {"1": "SUCCESS", "2": "DROP", "3": "SUCCESS"}
+    assert client.get("/messages/bulk-3").status_code == 200
+
+
+@patch("app.main.message_processor")
+def test_pubsub_events_for_other_recipients_are_dropped(mock_message_processor):
+    """Only events without a recipient or addressed to this app are processed"""
+    mock_message_processor.process_message = AsyncMock(
+        return_value={"status": "processed", "response": "ok"}
+    )
+
+    def event(message_id, recipient):
+        return {
+            "data": {
+                "message": "Hello over pubsub",
+                "message_id": message_id,
+                "sender": "micro-one",
+                "timestamp": "2024-01-01T00:00:00Z",
+                "recipient": recipient,
+            }
+        }
+
+    response = client.post("/events/messages", json=event("mine-1", "micro-two"))
+    assert response.json()["status"] == "SUCCESS"
+    response = client.post("/events/messages", json=event("other-1", "micro-three"))
+    assert response.json()["status"] == "DROP"
+
+    processed = [
+        call.kwargs["message_id"]
+        for call in mock_message_processor.process_message.call_args_list
+    ]
+    assert "mine-1" in processed
+    assert "other-1" not in processed
+    assert client.get("/messages/other-1").status_code == 404
+
+
+def test_health_reports_state_cache_counters():
+    """Test /healthz exports state cache hit and miss counters"""
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    cache_stats = response.json()["state_cache"]
+    assert {"hits", "misses", "size"} <= set(cache_stats)
+
+
+@patch("app.main.message_processor")
+def test_metrics_endpoint(mock_message_processor):
+    """Test /metrics exposes request, stage and message metrics"""
+    mock_message_processor.process_message = AsyncMock(
+        return_value={"status": "processed", "response": "ok"}
+    )
+    test_message = {
+        "message": "Measure me",
+        "message_id": "metrics-1",
+        "sender": "micro-one",
+        "timestamp": "2024-01-01T00:00:00Z",
+    }
+    assert client.post("/receive-message", json=test_message).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert (
+        'micro_two_http_request_duration_seconds_count{method="POST",'
+        'route="/receive-message",status="200"}'
+    ) in text
+    assert 'micro_two_stage_duration_seconds_count{stage="framework"}' in text
+    assert 'micro_two_stage_duration_seconds_count{stage="handler"}' in text
+    assert 'micro_two_messages_total{source="invoke"}' in text
+
+
+@patch("app.main.message_processor")
+def test_cursor_pagination_and_export(mock_message_processor):
+    """Test cursor pages and the NDJSON export cover the same records"""
+    mock_message_processor.process_message = AsyncMock(
+        return_value={"status": "processed", "response": "ok"}
+    )
+    client.delete("/messages")
+    for i in range(5):
+        test_message = {
+            "message": f"Message {i}",
+            "message_id": f"cursor-{i}",
+            "sender": "micro-one",
+            "timestamp": "2024-01-01T00:00:00Z",
+        }
+        assert client.post("/receive-message", json=test_message).status_code == 200
+
+    first = client.get("/messages", params={"cursor": 0, "limit": 3}).json()
+    assert [m["message_id"] for m in first["messages"]] == [
+        "cursor-0",
+        "cursor-1",
+        "cursor-2",
+    ]
+    second = client.get(
+        "/messages", params={"cursor": first["next_cursor"], "limit": 3}
+    ).json()
+    assert [m["message_id"] for m in second["messages"]] == ["cursor-3", "cursor-4"]
+
+    response = client.get("/messages/export", params={"cursor": first["next_cursor"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["message_id"] for line in lines] == ["cursor-3", "cursor-4"]
+
+    limited = client.get("/messages/export", params={"limit": 2}).text
+    assert len(limited.splitlines()) == 2
+
+
+class SharedStore:
+    """Async store whose records are counted by another process"""
+
+    async def after(self, cursor=0, limit=10):
+        return []
+
+    async def stats(self):
+        return {"size": 7}
+
+
+@patch("app.main.message_store", new_callable=SharedStore)
+def test_list_counts_from_shared_store_stats(message_store):
+    """The total comes from the store's shared stats, not a cached length"""
+    response = client.get("/messages", params={"cursor": 0})
+
+    assert response.status_code == 200
+    assert response.json()["total_count"] == 7
+
+
+@patch("app.main.message_store", new_callable=MessageStore)
+async def test_export_sees_records_added_between_batches(message_store):
+    """Each export batch is read afresh, so records added meanwhile are included"""
+    for i in range(3):
+        message_store.add({"message_id": f"msg-{i}", "sender": "micro-one"})
+
+    chunks = _export_lines(cursor=0, limit=None, batch_size=2)
+    first = await chunks.__anext__()
+    message_store.add({"message_id": "msg-3", "sender": "micro-one"})
+    rest = [chunk async for chunk in chunks]
+
+    ids = [json.loads(line)["message_id"] for line in first.splitlines()]
+    assert ids == ["msg-0", "msg-1"]
+    ids = [json.loads(line)["message_id"] for b in rest for line in b.splitlines()]
+    assert ids == ["msg-2", "msg-3"]
+    assert len(rest) == 1
+
+
+@patch("app.main.message_processor")
+def test_redelivered_message_is_processed_once(mock_message_processor):
+    """Test a repeated message_id gets the first result without new work"""
+    processed_at = "2024-01-01T00:00:01"
+    mock_message_processor.process_message = AsyncMock(
+        return_value={
+            "status": "processed",
+            "message_id": "dedup-1",
+            "sender": "micro-one",
+            "processed_at": processed_at,
+            "response": MessageProcessor.response_text(
+                "micro-one", "Deliver me twice", processed_at
+            ),
+        }
+    )
+    test_message = {
+        "message": "Deliver me twice",
+        "message_id": "dedup-1",
+        "sender": "micro-one",
+        "timestamp": "2024-01-01T00:00:00Z",
+    }
+
+    first = client.post("/receive-message", json=test_message)
+    second = client.post("/receive-message", json=test_message)
+
+    assert second.status_code == 200
+    assert second.json()["response_message"] == first.json()["response_message"]
+    assert mock_message_processor.process_message.await_count == 1
+    records = client.get("/messages", params={"cursor": 0, "limit": 1000}).json()
+    assert [m["message_id"] for m in records["messages"]].count("dedup-1") == 1
+    assert client.get("/healthz").json()["dedup"]["hits"] >= 1
+    assert 'micro_two_duplicate_messages_total{source="invoke"}' in (
+        client.get("/metrics").text
+    )
+
+
+@patch("app.main.message_processor")
+def test_overloaded_service_answers_429(mock_message_processor):
+    """Test messages beyond the admission limits are refused with Retry-After"""
+    admission = AdmissionController(max_concurrency=1, max_queue=0)
+    # Every slot is taken and there is no queue
+    admission.active = 1
+    test_message = {
+        "message": "Too busy",
+        "message_id": "shed-1",
+        "sender": "micro-one",
+        "timestamp": "2024-01-01T00:00:00Z",
+    }
+
+    with patch("app.main.admission", admission):
+        response = client.post("/receive-message", json=test_message)
+        health = client.get("/healthz").json()
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert mock_message_processor.process_message.call_count == 0
+    assert health["admission"]["rejected"] == 1
+
+
+@patch("app.main.message_processor")
+def test_async_receive_mode_answers_202(mock_message_processor):
+    """Test queued messages are answered 202 and their status can be looked up"""
+    # Workers are not started, so the message stays queued
+    receive_queue = ReceiveQueue(AsyncMock(), workers=1, max_size=10)
+    test_message = {
+        "message": "Later, please",
+        "message_id": "async-1",
+        "sender": "micro-one",
+        "timestamp": "2024-01-01T00:00:00Z",
+    }
+
+    with patch("app.main.receive_queue", receive_queue):
+        response = client.post("/receive-message", json=test_message)
+        status = client.get("/messages/status/async-1")
+        health = client.get("/healthz").json()
+
+    assert response.status_code == 202
+    assert response.json()["status"] == "accepted"
+    assert status.json()["status"] == "accepted"
+    assert health["receive_queue"]["depth"] == 1
+    assert mock_message_processor.process_message.call_count == 0
+    assert client.get("/messages/status/async-1").status_code == 404
+
+
+@patch("app.main.message_processor")
+def test_receive_messages_batch(mock_message_processor):
+    """Test a batch is processed per message, each with its own result"""
+
+    async def process_message(message, message_id, sender):
+        if message_id == "batch-2":
+            raise RuntimeError("boom")
+        return {"status": "processed", "response": f"Got {message}"}
+
+    mock_message_processor.process_message = AsyncMock(side_effect=process_message)
+    messages = [
+        {
+            "message": f"Batched {i}",
+            "message_id": f"batch-{i}",
+            "sender": "micro-one",
+            "timestamp": "2024-01-01T00:00:00Z",
+        }
+        for i in range(1, 4)
+    ]
+
+    response = client.post("/receive-messages", json={"messages": messages})
+
+    assert response.status_code == 200
+    results = {r["message_id"]: r for r in response.json()["results"]}
+    assert results["batch-1"]["status"] == "received"
+    assert results["batch-1"]["response_message"] == "Got Batched 1"
+    assert results["batch-2"]["status"] == "failed"
+    assert "error" not in results["batch-3"]
+    assert client.get("/messages/batch-3").status_code == 200
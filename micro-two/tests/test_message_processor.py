@@ -0,0 +1,196 @@
+"""
+Tests for the micro-two MessageProcessor
+"""
+
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+from app.metrics import ServiceMetrics
+from app.services.message_processor import MessageProcessor
+from app.services.state_cache import TTLCache
+
+
+class FakeDaprClient:
+    """In-memory stand-in for DaprGrpcClient's state API"""
+
+    def __init__(self):
+        self.state = {}
+        self.save_calls = 0
+        self.bulk_calls = []
+
+    def save_state(self, store_name, key, value):
+        self.save_calls += 1
+        self.state[key] = value
+
+    def save_bulk_state(self, store_name, states):
+        self.bulk_calls.append(len(states))
+        for item in states:
+            self.state[item.key] = item.value
+
+    def get_state(self, store_name, key):
+        return SimpleNamespace(data=self.state.get(key, b""))
+
+    def delete_state(self, store_name, key):
+        self.state.pop(key, None)
+
+
+async def test_process_message_saves_state_immediately_by_default():
+    """Without write-behind every message is saved with its own call"""
+    client = FakeDaprClient()
+    processor = MessageProcessor(client)
+
+    await processor.process_message("hello", "msg-1", "micro-one")
+
+    assert client.save_calls == 1
+    assert json.loads(client.state["message_msg-1"])["sender"] == "micro-one"
+    await processor.close()
+
+
+async def test_write_behind_flushes_in_bulk_on_batch_size():
+    """Reaching the batch size triggers one bulk save"""
+    client = FakeDaprClient()
+    processor = MessageProcessor(
+        client, write_behind=True, flush_max_batch=5, flush_max_pending=10
+    )
+    await processor.start()
+
+    for i in range(5):
+        await processor.process_message("hello", f"msg-{i}", "micro-one")
+    await asyncio.sleep(0.05)
+
+    assert client.save_calls == 0
+    assert client.bulk_calls == [5]
+    await processor.close()
+
+
+async def test_write_behind_flushes_on_age_and_shutdown():
+    """Pending writes are flushed after max_pending and drained on close"""
+    client = FakeDaprClient()
+    processor = MessageProcessor(
+        client, write_behind=True, flush_max_batch=100, flush_max_pending=0.05
+    )
+    await processor.start()
+
+    await processor.process_message("hello", "msg-1", "micro-one")
+    # Pending writes are readable before they are flushed
+    assert (await processor.get_message_state("msg-1"))["message_id"] == "msg-1"
+    await asyncio.sleep(0.15)
+    assert "message_msg-1" in client.state
+
+    await processor.process_message("hello", "msg-2", "micro-one")
+    await processor.close()
+    assert "message_msg-2" in client.state
+
+
+async def test_write_behind_covers_writes_while_they_are_saved():
+    """Records being saved stay readable, and a delete waits for the save"""
+    client = FakeDaprClient()
+    saving = threading.Event()
+    release = threading.Event()
+    save_bulk_state = client.save_bulk_state
+
+    def slow_save_bulk_state(store_name, states):
+        saving.set()
+        release.wait(5)
+        save_bulk_state(store_name, states)
+
+    client.save_bulk_state = slow_save_bulk_state
+    processor = MessageProcessor(
+        client, write_behind=True, flush_max_batch=100, flush_max_pending=10
+    )
+    await processor.process_message("hello", "msg-1", "micro-one")
+    flush = asyncio.create_task(processor.write_buffer.flush())
+    await asyncio.get_running_loop().run_in_executor(None, saving.wait, 5)
+
+    assert (await processor.get_message_state("msg-1"))["message_id"] == "msg-1"
+    delete = asyncio.create_task(processor.delete_message_state("msg-1"))
+    await asyncio.sleep(0.05)
+    assert not delete.done()
+    assert await processor.get_message_state("msg-1") is None
+
+    release.set()
+    assert await delete
+    await flush
+    assert "message_msg-1" not in client.state
+    await processor.close()
+
+
+async def test_state_cache_serves_repeat_reads_and_tracks_writes():
+    """Repeat reads hit the cache; writes update and deletes invalidate it"""
+    client = FakeDaprClient()
+    cache = TTLCache(max_entries=10, ttl=60)
+    processor = MessageProcessor(client, state_cache=cache)
+    client.state["message_old"] = json.dumps({"message_id": "old"})
+
+    for _ in range(3):
+        assert (await processor.get_message_state("old"))["message_id"] == "old"
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    await processor.process_message("hello", "msg-1", "micro-one")
+    assert (await processor.get_message_state("msg-1"))["sender"] == "micro-one"
+    assert cache.hits == 3
+
+    await processor.delete_message_state("msg-1")
+    assert await processor.get_message_state("msg-1") is None
+    await processor.close()
+
+
+async def test_read_racing_a_delete_is_not_cached():
+    """A value read before a delete that lands first is not cached afterwards"""
+    client = FakeDaprClient()
+    cache = TTLCache(max_entries=10, ttl=60)
+    processor = MessageProcessor(client, state_cache=cache)
+    client.state["message_old"] = json.dumps({"message_id": "old"})
+    reading = threading.Event()
+    release = threading.Event()
+    get_state = client.get_state
+
+    def slow_get_state(store_name, key):
+        response = get_state(store_name, key)
+        reading.set()
+        release.wait(5)
+        return response
+
+    client.get_state = slow_get_state
+    read = asyncio.create_task(processor.get_message_state("old"))
+    await asyncio.get_running_loop().run_in_executor(None, reading.wait, 5)
+    assert await processor.delete_message_state("old")
+    release.set()
+
+    # The read that started first still sees the value it was given
+    assert (await read)["message_id"] == "old"
+    assert len(cache) == 0
+    client.get_state = get_state
+    assert await processor.get_message_state("old") is None
+    await processor.close()
+
+
+async def test_state_write_timings_are_recorded():
+    """The state write stage and the Dapr call inside it are both timed"""
+    metrics = ServiceMetrics()
+    processor = MessageProcessor(FakeDaprClient(), metrics=metrics)
+
+    await processor.process_message("hello", "msg-1", "micro-one")
+
+    assert sum(metrics.stage_seconds.labels("store_state").counts) == 1
+    assert sum(metrics.dapr_call_seconds.labels("save_state").counts) == 1
+    await processor.close()
+
+
+async def test_large_state_is_stored_compressed():
+    """State values over the threshold are compressed and read back transparently"""
+    client = FakeDaprClient()
+    processor = MessageProcessor(
+        client, compression_codec="gzip", compression_threshold=1024
+    )
+
+    await processor.process_message("x" * 5000, "big", "micro-one")
+    await processor.process_message("hello", "small", "micro-one")
+
+    assert client.state["message_big"].startswith(b"\x1f\x8b")
+    assert len(client.state["message_big"]) < 1000
+    assert json.loads(client.state["message_small"])["original_message"] == "hello"
+    assert (await processor.get_message_state("big"))["original_message"] == "x" * 5000
+    await processor.close()
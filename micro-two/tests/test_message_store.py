@@ -0,0 +1,114 @@
+"""
+Tests for the micro-two MessageStore
+"""
+
+from app.services.message_processor import MessageProcessor
+from app.services.message_record import MessageRecord
+from app.services.message_store import MessageStore
+
+
+def make_record(message_id: str, message: str = "hello") -> dict:
+    return {"message_id": message_id, "sender": "micro-one", "message": message}
+
+
+def test_lookup_and_insertion_order():
+    """Records are found by id and paged in insertion order"""
+    store = MessageStore()
+    for i in range(5):
+        store.add(make_record(f"msg-{i}"))
+
+    assert store.get("msg-3")["message_id"] == "msg-3"
+    assert store.get("missing") is None
+    assert [r["message_id"] for r in store.page(offset=1, limit=2)] == [
+        "msg-1",
+        "msg-2",
+    ]
+
+
+def test_evicts_oldest_by_count():
+    """Exceeding max_messages evicts the oldest records"""
+    store = MessageStore(max_messages=3)
+    for i in range(5):
+        store.add(make_record(f"msg-{i}"))
+
+    assert len(store) == 3
+    assert store.get("msg-0") is None
+    assert store.get("msg-4") is not None
+    stats = store.stats()
+    assert stats["evicted_count"] == 2
+    assert stats["total_added"] == 5
+
+
+def test_evicts_oldest_by_bytes():
+    """Exceeding max_bytes evicts until the store fits again"""
+    record_size = MessageRecord.from_dict(make_record("msg-0", "x" * 1000)).size()
+    store = MessageStore(max_messages=0, max_bytes=record_size * 2)
+    for i in range(4):
+        store.add(make_record(f"msg-{i}", "x" * 1000))
+
+    assert len(store) == 2
+    assert store.total_bytes <= record_size * 2
+    assert store.stats()["evicted_bytes"] == record_size * 2
+
+
+def test_clear_resets_size():
+    """Clearing removes all records and their byte accounting"""
+    store = MessageStore()
+    store.add(make_record("msg-0"))
+
+    assert store.clear() == 1
+    assert len(store) == 0
+    assert store.total_bytes == 0
+
+
+def test_cursor_reads_resume_after_last_seq():
+    """after() pages by sequence number and skips replaced and evicted records"""
+    store = MessageStore(max_messages=4)
+    for i in range(5):
+        store.add(make_record(f"msg-{i}"))
+    # Re-adding a record moves it to the end with a new seq
+    store.add(make_record("msg-2"))
+
+    first = store.after(cursor=0, limit=2)
+    assert [r["message_id"] for r in first] == ["msg-1", "msg-3"]
+    rest = store.after(cursor=first[-1]["seq"], limit=10)
+    assert [r["message_id"] for r in rest] == ["msg-4", "msg-2"]
+    assert store.after(cursor=rest[-1]["seq"]) == []
+
+
+def test_seq_keeps_increasing_after_clear_and_evictions():
+    """Cursors stay valid: seq never repeats, and the seek index is compacted"""
+    store = MessageStore(max_messages=10)
+    for i in range(1000):
+        store.add(make_record(f"msg-{i}"))
+    last_seq = store.get("msg-999")["seq"]
+
+    assert len(store._order) <= 2 * len(store) + 64
+    store.clear()
+    store.add(make_record("msg-new"))
+    assert store.get("msg-new")["seq"] == last_seq + 1
+    assert [r["message_id"] for r in store.after(cursor=last_seq)] == ["msg-new"]
+
+
+def test_compact_record_round_trip():
+    """Records come back unchanged although the response is not stored"""
+    processed_at = "2024-01-01T00:00:01.500000"
+    record = {
+        "message_id": "msg-0",
+        "sender": "micro-one",
+        "message": "hello",
+        "received_at": "2024-01-01T00:00:00",
+        "processed_at": processed_at,
+        "processed": True,
+        "response": MessageProcessor.response_text("micro-one", "hello", processed_at),
+    }
+    custom = dict(record, message_id="msg-1", response="custom", received_at=None)
+    store = MessageStore()
+    store.add(dict(record))
+    store.add(dict(custom))
+
+    compact = MessageRecord.from_dict(record)
+    assert compact.extra is None
+    assert isinstance(compact.processed_at, int)
+    assert store.get("msg-0") == dict(record, seq=1)
+    assert store.get("msg-1") == dict(custom, seq=2)
@@ -0,0 +1,84 @@
+"""
+Tests for the micro-two metrics registry
+"""
+
+import asyncio
+
+import pytest
+
+from app.metrics import (
+    MetricsMiddleware,
+    Registry,
+    ServiceMetrics,
+    timed_handler,
+)
+
+
+def test_counter_renders_labelled_samples():
+    registry = Registry(namespace="svc")
+    counter = registry.counter("events_total", "Events", ("kind",))
+    counter.labels("a").inc()
+    counter.labels("a").inc(2)
+    counter.labels('quote"d').inc()
+
+    text = registry.render()
+
+    assert "# TYPE svc_events_total counter" in text
+    assert 'svc_events_total{kind="a"} 3' in text
+    assert 'svc_events_total{kind="quote\\"d"} 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
+    assert "latency_seconds_sum 3.65" in lines
+
+
+def test_registry_rejects_duplicates_and_bad_labels():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events", ("kind",))
+
+    with pytest.raises(ValueError):
+        registry.counter("events_total", "Events")
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+
+
+def test_middleware_splits_handler_and_framework_time():
+    """Requests are timed by route, with the endpoint's own time separated"""
+    metrics = ServiceMetrics()
+
+    @timed_handler
+    async def endpoint():
+        await asyncio.sleep(0.01)
+
+    class Route:
+        path = "/items/{item_id}"
+
+    async def app(scope, receive, send):
+        scope["route"] = Route()
+        await endpoint()
+        await send({"type": "http.response.start", "status": 201})
+
+    async def send(message):
+        pass
+
+    middleware = MetricsMiddleware(app, metrics)
+    asyncio.run(middleware({"type": "http", "method": "POST"}, None, send))
+
+    request = metrics.http_request_seconds.labels("POST", "/items/{item_id}", "201")
+    handler = metrics.stage_seconds.labels("handler")
+    framework = metrics.stage_seconds.labels("framework")
+    assert sum(request.counts) == 1
+    assert handler.sum >= 0.01
+    assert sum(framework.counts) == 1
+    assert request.sum == pytest.approx(handler.sum + framework.sum)
@@ -0,0 +1,88 @@
+"""
+Tests for the micro-two ReceiveQueue
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.admission import Overloaded
+from app.services.receive_queue import ReceiveQueue
+
+
+async def test_accepted_items_are_processed_in_the_background():
+    """submit returns at once; the status moves to processed or failed"""
+    release = asyncio.Event()
+    processed = []
+
+    async def process(item):
+        await release.wait()
+        if item == "bad":
+            raise RuntimeError("boom")
+        processed.append(item)
+
+    queue = ReceiveQueue(process, workers=2, max_size=10)
+    await queue.start()
+
+    assert queue.submit("a", "good")["status"] == "accepted"
+    queue.submit("b", "bad")
+    await asyncio.sleep(0)
+    assert queue.get("a")["status"] == "processing"
+
+    release.set()
+    await queue.close()
+    assert processed == ["good"]
+    assert queue.get("a")["status"] == "processed"
+    assert queue.get("b")["status"] == "failed"
+    assert queue.get("b")["error"] == "boom"
+    assert queue.stats() == {
+        "depth": 0,
+        "workers": 2,
+        "accepted": 2,
+        "processed": 1,
+        "failed": 1,
+    }
+
+
+async def test_known_message_ids_are_not_queued_again():
+    """A redelivered id gets its existing status; only failed ids are retried"""
+    calls = []
+
+    async def process(item):
+        calls.append(item)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    queue = ReceiveQueue(process, workers=1, max_size=10)
+    queue.submit("a", 1)
+    queue.submit("a", 2)
+    assert len(queue) == 1
+
+    await queue.start()
+    await asyncio.sleep(0.01)
+    queue.submit("a", 3)
+    queue.submit("a", 4)
+    await queue.close()
+    assert calls == [1, 3]
+    assert queue.get("a")["status"] == "processed"
+
+
+async def test_full_queue_refuses_and_overloaded_items_wait():
+    """Submitting past max_size raises Overloaded; processing waits out Overloaded"""
+    attempts = []
+
+    async def process(item):
+        attempts.append(item)
+        if len(attempts) == 1:
+            raise Overloaded(retry_after=0)
+
+    queue = ReceiveQueue(process, workers=1, max_size=1)
+    queue.submit("a", "a")
+    with pytest.raises(Overloaded) as excinfo:
+        queue.submit("b", "b")
+    assert excinfo.value.retry_after >= 1
+
+    await queue.start()
+    await queue.close()
+    assert attempts == ["a", "a"]
+    assert queue.get("a")["status"] == "processed"
@@ -0,0 +1,136 @@
+"""
+Tests for the production launcher
+"""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.serve import bind_socket, cpu_quota, default_workers, worker_count
+
+APP = """
+import asyncio
+import os
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while (await receive())["type"] != "lifespan.shutdown":
+            await send({"type": "lifespan.startup.complete"})
+        await send({"type": "lifespan.shutdown.complete"})
+        return
+    if scope["path"] == "/slow":
+        await asyncio.sleep(1)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": str(os.getpid()).encode()})
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_cpu_quota_from_cgroup_v2_and_v1(tmp_path):
+    """The quota is read from cpu.max, else the v1 CFS files"""
+    assert cpu_quota(str(tmp_path)) is None
+
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("50000\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert cpu_quota(str(tmp_path)) == 0.5
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    assert cpu_quota(str(tmp_path)) is None
+
+    (tmp_path / "cpu.max").write_text("250000 100000\n")
+    assert cpu_quota(str(tmp_path)) == 2.5
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert cpu_quota(str(tmp_path)) is None
+
+
+def test_default_workers_capped_by_quota(tmp_path, monkeypatch):
+    """One worker per usable CPU, rounding a fractional quota up"""
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)), False)
+    assert default_workers(str(tmp_path)) == 8
+
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert default_workers(str(tmp_path)) == 2
+    (tmp_path / "cpu.max").write_text("20000 100000\n")
+    assert default_workers(str(tmp_path)) == 1
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="Needs SO_REUSEPORT")
+def test_memory_store_runs_one_worker(tmp_path, monkeypatch):
+    """Workers share received messages only through the Dapr store"""
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)), False)
+    settings = SimpleNamespace(server_workers=0, message_store_backend="memory")
+    assert worker_count(settings, str(tmp_path)) == 1
+    settings.server_workers = 3
+    assert worker_count(settings, str(tmp_path)) == 1
+
+    settings.message_store_backend = "dapr"
+    assert worker_count(settings, str(tmp_path)) == 3
+    settings.server_workers = 0
+    assert worker_count(settings, str(tmp_path)) == 8
+
+
+def test_sockets_share_a_port():
+    """Every worker can bind the same address"""
+    first = bind_socket("127.0.0.1", 0)
+    port = first.getsockname()[1]
+    second = bind_socket("127.0.0.1", port)
+    first.close()
+    second.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="Needs SO_REUSEPORT")
+def test_workers_serve_and_drain_on_sigterm(tmp_path):
+    """Connections are spread across workers; SIGTERM lets requests finish"""
+    (tmp_path / "tiny_app.py").write_text(textwrap.dedent(APP))
+    port = free_port()
+    launcher = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            f"import sys; from app.serve import serve; "
+            f"sys.exit(serve('tiny_app:app', '127.0.0.1', {port}, workers=2, "
+            f"graceful_timeout=5, log_level='WARNING'))",
+        ],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), *sys.path])),
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        pids = set()
+        deadline = time.monotonic() + 30
+        while len(pids) < 2 and time.monotonic() < deadline:
+            try:
+                # A new connection each time, for the kernel to place
+                pids.add(httpx.get(url).text)
+            except httpx.TransportError:
+                time.sleep(0.1)
+        assert len(pids) == 2
+
+        slow = {}
+        request = threading.Thread(
+            target=lambda: slow.update(response=httpx.get(f"{url}/slow", timeout=10))
+        )
+        request.start()
+        time.sleep(0.3)
+        launcher.send_signal(signal.SIGTERM)
+        request.join()
+
+        assert slow["response"].status_code == 200
+        assert launcher.wait(timeout=20) == 0
+    finally:
+        if launcher.poll() is None:
+            launcher.kill()
@@ -0,0 +1,48 @@
+"""
+Tests for the micro-two TTLCache
+"""
+
+from app.services.state_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_misses_and_expiry():
+    """Entries are served until their TTL passes"""
+    clock = FakeClock()
+    cache = TTLCache(max_entries=10, ttl=5, clock=clock)
+
+    assert cache.get("a") is None
+    cache.set("a", {"value": 1})
+    assert cache.get("a") == {"value": 1}
+
+    clock.now = 6
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 0, "hits": 1, "misses": 2, "evictions": 0}
+
+
+def test_evicts_least_recently_used():
+    """Reading an entry protects it from LRU eviction"""
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+
+def test_invalidate_removes_entry():
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.invalidate("a")
+
+    assert cache.get("a") is None